@@ -7,14 +7,15 @@ import os
 # Project root directory
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 
-# Data directories
-DATA_DIR = os.path.join(PROJECT_ROOT, "data")
+# Data directories (the AIR_QUALITY_*_DIR environment variables point a run
+# at another workspace, e.g. the synthetic data of benchmark.py)
+DATA_DIR = os.environ.get("AIR_QUALITY_DATA_DIR", os.path.join(PROJECT_ROOT, "data"))
 RAW_DATA_DIR = os.path.join(DATA_DIR, "raw")
 PROCESSED_DATA_DIR = os.path.join(DATA_DIR, "processed")
 
 # Output directories
-VISUALS_DIR = os.path.join(PROJECT_ROOT, "visuals")
-OUTPUT_DIR = os.path.join(PROJECT_ROOT, "output")
+VISUALS_DIR = os.environ.get("AIR_QUALITY_VISUALS_DIR", os.path.join(PROJECT_ROOT, "visuals"))
+OUTPUT_DIR = os.environ.get("AIR_QUALITY_OUTPUT_DIR", os.path.join(PROJECT_ROOT, "output"))
 SCRIPTS_DIR = os.path.join(PROJECT_ROOT, "scripts")
 NOTEBOOKS_DIR = os.path.join(PROJECT_ROOT, "notebooks")
 
@@ -31,15 +32,53 @@ STATION_DAY_CLEANED = os.path.join(PROCESSED_DATA_DIR, "station_day_cleaned.csv"
 STATION_HOUR_CLEANED = os.path.join(PROCESSED_DATA_DIR, "station_hour_cleaned.csv")
 STATIONS_CLEANED = os.path.join(PROCESSED_DATA_DIR, "stations_cleaned.csv")
 
+# Columnar processed store (Parquet datasets partitioned by year and City)
+PROCESSED_STORE_DIR = os.path.join(PROCESSED_DATA_DIR, "store")
+STORE_ROW_GROUP_ROWS = 64 * 1024  # small row groups let date filters skip most of a file
+
+# Number of processed datasets the shared loader keeps in memory
+LOADER_CACHE_SIZE = 4
+
+# Pipeline runner state (content hashes of each stage's inputs and outputs)
+PIPELINE_STATE_FILE = os.path.join(PROCESSED_DATA_DIR, ".pipeline_state.json")
+PIPELINE_JOBS = os.cpu_count() or 1
+
+# Plot rendering: worker processes, and the hashes of the last rendered figures
+RENDER_WORKERS = os.cpu_count() or 1
+RENDER_STATE_FILE = os.path.join(VISUALS_DIR, ".render_cache.json")
+
+# Parallel cleaning: worker processes, and the raw file size above which a
+# file is split into shards of whole stations that are cleaned concurrently
+CLEAN_WORKERS = os.cpu_count() or 1
+CLEAN_SHARD_MIN_MB = 200
+
+# Rows per chunk when cleaning with --stream (bounds peak memory)
+CLEAN_CHUNK_ROWS = 500_000
+
+# Incremental ingestion (clean_data.py --incremental): offsets, watermarks and
+# key index per dataset, and how much stored history new rows are cleaned with
+# (outlier bands, interpolation and AQI windows need the preceding readings)
+INGEST_STATE_DIR = os.path.join(PROCESSED_DATA_DIR, ".ingest")
+INGEST_CONTEXT = '7D'
+
 # Analysis parameters
 POLLUTANTS = ['PM2.5', 'PM10', 'NO', 'NO2', 'NOx', 'NH3', 'CO', 'SO2', 'O3', 'Benzene', 'Toluene', 'Xylene']
 DATE_COLUMNS = ["Date", "date", "timestamp", "Datetime", "DateTime", "DATE", "RecordedDate", "dt"]
+# Seasons used by the cube and every seasonal report (calendar_features.py):
+# 'meteorological' (DJF/MAM/JJA/SON) or 'imd' (Winter, Pre-monsoon, Monsoon, Post-monsoon)
+SEASON_SCHEME = 'meteorological'
 
 # Visualization parameters
 FIGURE_SIZE_TREND = (12, 6)
 FIGURE_SIZE_HEATMAP = (14, 10)
 FIGURE_SIZE_CORRELATION = (12, 10)
 
+# Interactive charts: points per trace, downsampling method ('lttb' or 'minmax')
+# and the pre-aggregated resolutions offered in the page
+PLOT_MAX_POINTS = 2000
+PLOT_DOWNSAMPLE_METHOD = 'lttb'
+PLOT_RESOLUTIONS = {'Day': 'D', 'Week': 'W', 'Month': 'M'}
+
 # AQI categories and colors
 AQI_CATEGORIES = {
     'Good': {'range': (0, 50), 'color': 'green'},
@@ -50,22 +89,82 @@ AQI_CATEGORIES = {
     'Severe': {'range': (401, float('inf')), 'color': 'maroon'}
 }
 
+# Recompute AQI and AQI_Bucket from pollutant concentrations (CPCB breakpoints) when cleaning
+RECOMPUTE_AQI = True
+
 # Logging configuration
 LOG_LEVEL = 'INFO'
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 
+# Step instrumentation (instrument.py): per-run timelines of the load, clean,
+# aggregate, plot and save steps, and an optional profiler ('cprofile' or
+# 'pyinstrument', also set with AIR_QUALITY_PROFILE) for every outermost step
+INSTRUMENT = True
+TIMELINE_DIR = os.path.join(OUTPUT_DIR, "timelines")
+PROFILE = os.environ.get("AIR_QUALITY_PROFILE") or None
+
+# National Ambient Air Quality Standards (CPCB, 2009) used by exceedance.py:
+# averaging window in hours and limit in µg/m3 (CO in mg/m3)
+NAAQS_LIMITS = {
+    'PM2.5': {'hours': 24, 'limit': 60},
+    'PM10': {'hours': 24, 'limit': 100},
+    'NO2': {'hours': 24, 'limit': 80},
+    'SO2': {'hours': 24, 'limit': 80},
+    'NH3': {'hours': 24, 'limit': 400},
+    'O3': {'hours': 8, 'limit': 100},
+    'CO': {'hours': 8, 'limit': 2},
+}
+
 # Forecasting parameters
 FORECAST_PERIOD = 365  # days
 FORECAST_CONFIDENCE = 0.95
+# forecast.py: days of history fitted, minimum valid days per series, Fourier
+# harmonics of the yearly cycle, optimizer iterations for cold / warm-started
+# fits and the seconds all fits may take before the rest fall back to climatology
+FORECAST_HISTORY_DAYS = 5 * 365
+FORECAST_MIN_DAYS = 180
+FORECAST_FOURIER_TERMS = 3
+FORECAST_MAXITER = 50
+FORECAST_WARM_MAXITER = 10
+FORECAST_TIME_BUDGET = 300  # seconds
+FORECAST_WORKERS = os.cpu_count() or 1
+FORECAST_CACHE_FILE = os.path.join(PROCESSED_DATA_DIR, ".forecast_cache.json")
 
 # Statistical test parameters
 ANOVA_SIGNIFICANCE_LEVEL = 0.05
+POSTHOC_METHOD = 'tukey'  # or 'games-howell' when group variances differ
+
+# Station clustering (station_clustering.py): K values tried, rows sampled for
+# the silhouette sweep, PCA variance kept and the saved model
+CLUSTER_K_RANGE = (2, 12)
+CLUSTER_SAMPLE_SIZE = 10000
+CLUSTER_BATCH_SIZE = 4096
+CLUSTER_PCA_VARIANCE = 0.95
+CLUSTER_WORKERS = os.cpu_count() or 1
+CLUSTER_MODEL_FILE = os.path.join(OUTPUT_DIR, "models", "station_clusters.joblib")
 
-# Outlier detection parameters
+# Outlier detection parameters (outliers.py): Tukey fences per group, pollutant
+# and month ('iqr') or a rolling median band ('mad'), per data resolution.
+# Outliers are masked to NaN and imputed, or kept and flagged in <pollutant>_outlier.
 IQR_MULTIPLIER = 1.5
+OUTLIER_METHODS = {'day': 'iqr', 'hour': 'mad'}  # None keeps every value
+OUTLIER_ACTION = 'mask'  # or 'flag'
+OUTLIER_GROUP_COLUMNS = ['City', 'Station']
+OUTLIER_MIN_COUNT = 20  # readings a group needs before it gets fences
+OUTLIER_MAD_WINDOW = 7 * 24 + 1  # readings in the centred rolling window
+OUTLIER_MAD_THRESHOLD = 3.5  # scaled MADs from the rolling median
+
+# Rollups (rollup.py): valid hours a station-day needs, stations a city value
+# needs, and whether a rollup may replace a dataset cleaned from a raw file
+# (otherwise it is written as <dataset>_rollup)
+ROLLUP_MIN_HOURS = 18
+ROLLUP_MIN_STATIONS = 1
+ROLLUP_REPLACE_RAW = False
 
 # Missing value imputation methods
 IMPUTATION_METHODS = {
-    'numeric': 'interpolate',  # linear interpolation for time series
+    'numeric': 'interpolate',  # linear interpolation for time series ('ffill', 'seasonal_median', 'median')
     'categorical': 'mode'
 }
+IMPUTATION_GROUP_COLUMNS = ['City', 'Station']  # each group is imputed as its own time series
+IMPUTATION_MAX_GAP = '3D'  # longer gaps are left missing by 'interpolate' and 'ffill'
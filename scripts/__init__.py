@@ -0,0 +1 @@
+"""Analysis scripts and shared helpers for the Air Quality Data Analysis Project."""
@@ -0,0 +1,8 @@
+# Lets the package run as `python -m scripts <command>` (see cli.py).
+import sys
+
+from scripts.cli import main
+from scripts.instrument import start_run
+
+start_run()
+sys.exit(main())
@@ -0,0 +1,172 @@
+# I wrote this module so the reports stop re-aggregating raw rows. After
+# cleaning, every time-series dataset gets a small "cube": one row per
+# (City, Station, year, month, season) holding count, sum, sum of squares,
+# min and max of each pollutant and AQI. Means and standard deviations for
+# any coarser grouping (per city, per city-year, per season, per year-month)
+# are derived from those moments, and cubes built from new rows can be merged
+# into an existing cube without touching the old rows again.
+
+import numpy as np
+import pandas as pd
+
+import config
+from scripts import loader, processed_store
+from scripts.calendar_features import calendar_features, season_labels
+from scripts.instrument import instrumented
+from scripts.query import load
+
+VALUE_COLUMNS = config.POLLUTANTS + ["AQI"]
+KEY_COLUMNS = ["City", "Station", "year", "month", "season"]
+STATS = ["count", "sum", "sumsq", "min", "max"]
+
+
+def cube_name(name):
+    """Store name of the cube built from a dataset."""
+    return f"{name}_cube"
+
+
+def _stat_col(col, stat):
+    return f"{col}__{stat}"
+
+
+def value_columns(cube):
+    """Pollutant/AQI columns summarized in a cube, in their original order."""
+    return [c for c in VALUE_COLUMNS if _stat_col(c, "count") in cube.columns]
+
+
+@instrumented("aggregate")
+def build_cube(df):
+    """Aggregate cleaned rows into the cube layout (one row per key combination)."""
+    date_col = processed_store.find_date_col(df)
+    if date_col is None:
+        raise ValueError("A cube needs a dataset with a date column")
+
+    keys = pd.DataFrame({c: df[c] for c in ("City", "Station") if c in df.columns})
+    calendar = calendar_features(df[date_col], ["year", "month", "season"])
+    keys = pd.concat([keys, calendar], axis=1)
+    key_cols = list(keys.columns)
+
+    cols = [c for c in VALUE_COLUMNS if c in df.columns]
+    values = df[cols].astype(np.float64)
+    frame = pd.concat([keys, values, (values ** 2).add_suffix("__sq")], axis=1)
+    grouped = frame.groupby(key_cols, observed=True, sort=True)
+
+    parts = {
+        "count": grouped[cols].count(),
+        "sum": grouped[cols].sum(),
+        "sumsq": grouped[[c + "__sq" for c in cols]].sum().set_axis(cols, axis=1),
+        "min": grouped[cols].min(),
+        "max": grouped[cols].max(),
+    }
+    cube = pd.concat({stat: parts[stat] for stat in STATS}, axis=1)
+    cube.columns = [_stat_col(col, stat) for stat, col in cube.columns]
+    cube = cube[[_stat_col(c, s) for c in cols for s in STATS]]
+    return cube.reset_index()
+
+
+def _rollup_agg(columns):
+    """How each stored statistic combines when rows of the cube are grouped together."""
+    agg = {}
+    for col in columns:
+        agg.update({_stat_col(col, "count"): "sum", _stat_col(col, "sum"): "sum",
+                    _stat_col(col, "sumsq"): "sum", _stat_col(col, "min"): "min",
+                    _stat_col(col, "max"): "max"})
+    return agg
+
+
+def merge_cubes(*cubes):
+    """Combine cubes (e.g. the stored cube and one built from new rows)."""
+    combined = pd.concat(cubes, ignore_index=True)
+    key_cols = [c for c in KEY_COLUMNS if c in combined.columns]
+    for col in ("City", "Station", "season"):
+        if col in combined.columns:
+            combined[col] = combined[col].astype("category")
+    agg = _rollup_agg(value_columns(combined))
+    return combined.groupby(key_cols, observed=True, sort=True).agg(agg).reset_index()
+
+
+@instrumented("save")
+def write_cube(cube, name):
+    """Store the cube of a dataset next to it in the processed store."""
+    return processed_store.write_dataset(cube, cube_name(name))
+
+
+def append_rows(name, new_rows):
+    """Fold newly cleaned rows into the stored cube of a dataset."""
+    new_cube = build_cube(new_rows)
+    if processed_store.dataset_exists(cube_name(name)):
+        new_cube = merge_cubes(loader.load_dataset(cube_name(name)), new_cube)
+    write_cube(new_cube, name)
+    return new_cube
+
+
+def refresh_cube(name, partitions):
+    """
+    Rebuild the cube rows of the given (year, City) partitions after their
+    rows were replaced (see processed_store.upsert_dataset); other rows are kept.
+    """
+    if not processed_store.dataset_exists(cube_name(name)):
+        return load_cube(name)
+    cube = loader.load_dataset(cube_name(name))
+    touched = pd.MultiIndex.from_tuples([(int(y), str(c)) for y, c in partitions])
+    stale = pd.MultiIndex.from_arrays([cube["year"].astype(int), cube["City"].astype(str)]).isin(touched)
+    parts = [cube[~stale]]
+    for city in sorted(set(c for _, c in touched)):
+        years = [y for y, c in touched if c == city]
+        rows = load(name, cities=[city], start=f"{min(years)}-01-01", end=f"{max(years) + 1}-01-01")
+        rows = rows[rows[processed_store.find_date_col(rows)].dt.year.isin(years)]
+        if len(rows):
+            parts.append(build_cube(rows))
+    new_cube = merge_cubes(*parts)
+    write_cube(new_cube, name)
+    return new_cube
+
+
+def load_cube(name):
+    """
+    Load the cube of a dataset, building and storing it first if it is
+    missing or was built with another config.SEASON_SCHEME.
+    """
+    if processed_store.dataset_exists(cube_name(name)):
+        cube = loader.load_dataset(cube_name(name))
+        if set(cube["season"].astype(str).unique()) <= set(season_labels()):
+            return cube
+    write_cube(build_cube(loader.load_dataset(name)), name)
+    return loader.load_dataset(cube_name(name))
+
+
+def summarize(cube, by, columns=None, stats=("mean",)):
+    """
+    Roll the cube up to the `by` columns and derive statistics per value column.
+    stats can include mean, std, count, min and max. With a single statistic
+    the result has one column per pollutant (like groupby(...).mean()),
+    otherwise the columns are (pollutant, statistic) pairs.
+    """
+    columns = [c for c in (columns or value_columns(cube)) if _stat_col(c, "count") in cube.columns]
+    by = [by] if isinstance(by, str) else list(by)
+    agg = _rollup_agg(columns)
+    rolled = cube.groupby(by, observed=True).agg(agg) if by else cube[list(agg)].agg(agg).to_frame().T
+
+    result = {}
+    for col in columns:
+        n = rolled[_stat_col(col, "count")]
+        total = rolled[_stat_col(col, "sum")]
+        derived = {
+            "count": n,
+            "mean": (total / n).where(n > 0),
+            "std": np.sqrt(((rolled[_stat_col(col, "sumsq")] - total ** 2 / n) / (n - 1)).clip(lower=0)).where(n > 1),
+            "min": rolled[_stat_col(col, "min")],
+            "max": rolled[_stat_col(col, "max")],
+        }
+        for stat in stats:
+            result[(col, stat)] = derived[stat]
+
+    out = pd.DataFrame(result)
+    if len(stats) == 1:
+        out.columns = [col for col, _ in out.columns]
+    return out
+
+
+def means(name, by, columns=None):
+    """Shortcut: per-group means of a dataset, answered from its cube."""
+    return summarize(load_cube(name), by, columns)
@@ -1,82 +1,70 @@
 # I wrote this script to analyze cleaned air quality data files.
 # It generates PM2.5 trend plots for each dataset that has PM2.5 data.
 
-import pandas as pd
-import matplotlib.pyplot as plt
 import os
-
-# Paths to cleaned data and visuals directories
-CLEAN_PATH = "../data/processed/"
-VIS_PATH = "../visuals/"
-
-# List of cleaned files to analyze
-FILES = [
-    "city_day_cleaned.csv",
-    "city_hour_cleaned.csv",
-    "station_day_cleaned.csv",
-    "station_hour_cleaned.csv",
-    "stations_cleaned.csv"
-]
-
-# Possible date column names to detect
-POSSIBLE_DATE_COLUMNS = [
-    "Date", "date", "timestamp", "Datetime", "DateTime", 
-    "DATE", "RecordedDate", "dt"
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from scripts.instrument import start_run
+from scripts.loader import load_dataset
+from scripts.processed_store import find_date_col
+from scripts.render import plot_job, render_jobs
+
+# Path to visuals directory
+VIS_PATH = os.path.join(config.VISUALS_DIR, "")
+
+# List of cleaned datasets to analyze
+DATASETS = [
+    "city_day",
+    "city_hour",
+    "station_day",
+    "station_hour",
+    "stations"
 ]
 
-def detect_date_column(df):
-    """Find the date column in the dataframe."""
-    for col in POSSIBLE_DATE_COLUMNS:
-        if col in df.columns:
-            return col
-    return None
-
-def analyze_file(filename):
-    """Analyze a single cleaned file and generate PM2.5 trend plot if possible."""
-    print(f"\nAnalyzing: {filename}")
+def analyze_file(name):
+    """
+    Analyze a single cleaned dataset and return the PM2.5 trend plot job if possible
+    (main() renders the jobs of all datasets together).
+    """
+    print(f"\nAnalyzing: {name}")
 
-    df = pd.read_csv(CLEAN_PATH + filename)
+    try:
+        df = load_dataset(name, columns=config.DATE_COLUMNS + ["PM2.5"])
+    except FileNotFoundError as e:
+        print(e)
+        return None
 
-    print("Columns found:", df.columns.tolist())
+    print("Columns loaded:", df.columns.tolist())
 
-    date_col = detect_date_column(df)
+    date_col = find_date_col(df)
 
     if not date_col:
         print("No date column found. Skipping time-based analysis.")
-        return
+        return None
 
     print(f"Date column detected: {date_col}")
 
-    # Convert to datetime
-    df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
-    df = df.dropna(subset=[date_col])
-
     # Generate PM2.5 trend plot if PM2.5 column exists
     if "PM2.5" in df.columns:
         print("Plotting PM2.5 trend...")
 
         daily_pm25 = df.groupby(date_col)["PM2.5"].mean()
 
-        plt.figure(figsize=(10, 5))
-        daily_pm25.plot()
-
-        plt.title(f"Average PM2.5 Over Time ({filename})")
-        plt.xlabel("Date")
-        plt.ylabel("PM2.5")
-        plt.tight_layout()
+        out_path = VIS_PATH + f"{name}_cleaned_pm25_trend.png"
+        return plot_job("line", daily_pm25, out_path, title=f"Average PM2.5 Over Time ({name})",
+                        xlabel="Date", ylabel="PM2.5", figsize=(10, 5))
 
-        out_path = VIS_PATH + filename.replace(".csv", "_pm25_trend.png")
-        plt.savefig(out_path)
-        plt.close()
-
-        print(f"Saved: {out_path}")
-    else:
-        print("No PM2.5 column. Skipping PM2.5 analysis.")
+    print("No PM2.5 column. Skipping PM2.5 analysis.")
+    return None
 
 def main():
     """Main function to analyze all files."""
-    for f in FILES:
-        analyze_file(f)
+    jobs = [analyze_file(name) for name in DATASETS]
+    render_jobs([job for job in jobs if job is not None])
 
 if __name__ == "__main__":
+    start_run()
     main()
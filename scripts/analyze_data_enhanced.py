@@ -1,137 +1,149 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
-import logging
-from scipy import stats
-from statsmodels.stats.multicomp import pairwise_tukeyhsd
+import sys
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-CLEAN_PATH = "../data/processed/"
-VIS_PATH = "../visuals/"
+import pandas as pd
+import logging
 
-FILES = [
-    "city_day_cleaned.csv",
-    "city_hour_cleaned.csv",
-    "station_day_cleaned.csv",
-    "station_hour_cleaned.csv",
-    "stations_cleaned.csv"
-]
+import config
+from scripts.aggregate_cube import load_cube
+from scripts.correlation import OVERALL, stream_correlations, to_long
+from scripts.group_stats import anova, cube_moments, posthoc
+from scripts.instrument import setup_logging, start_run
+from scripts.loader import load_dataset
+from scripts.processed_store import find_date_col
+from scripts.render import plot_job, render_jobs
 
-# Auto-detect date column names
-POSSIBLE_DATE_COLUMNS = [
-    "Date", "date", "timestamp", "Datetime", "DateTime",
-    "DATE", "RecordedDate", "dt"
+# Set up logging
+setup_logging()
+
+VIS_PATH = os.path.join(config.VISUALS_DIR, "")
+OUTPUT_PATH = os.path.join(config.OUTPUT_DIR, "")
+os.makedirs(OUTPUT_PATH, exist_ok=True)
+
+DATASETS = [
+    "city_day",
+    "city_hour",
+    "station_day",
+    "station_hour",
+    "stations"
 ]
 
-def detect_date_column(df):
-    for col in POSSIBLE_DATE_COLUMNS:
-        if col in df.columns:
-            return col
-    return None
-
-def seasonal_anova_test(df, date_col, value_col, filename):
-    """Perform ANOVA test for seasonal differences."""
-    if date_col not in df.columns or value_col not in df.columns:
-        logging.warning(f"Columns {date_col} or {value_col} not found. Skipping ANOVA.")
-        return
-
-    df = df.copy()
-    df[date_col] = pd.to_datetime(df[date_col])
-    df['Season'] = df[date_col].dt.month % 12 // 3 + 1  # 1: Winter, 2: Spring, 3: Summer, 4: Fall
-    df['Season'] = df['Season'].map({1: 'Winter', 2: 'Spring', 3: 'Summer', 4: 'Fall'})
-
-    seasons = df['Season'].unique()
-    if len(seasons) < 2:
+def seasonal_anova_test(name):
+    """
+    ANOVA for seasonal differences of every pollutant, per city and for all
+    cities together, with a post-hoc test where the ANOVA is significant.
+    Group counts, means and variances come from the dataset's cube, so no raw
+    rows are touched (see group_stats.py).
+    """
+    cube = load_cube(name)
+    pollutants = [p for p in config.POLLUTANTS if f"{p}__count" in cube.columns]
+    if cube["season"].nunique() < 2 or not pollutants:
         logging.info("Not enough seasons for ANOVA test.")
         return
 
-    groups = [df[df['Season'] == season][value_col].dropna() for season in seasons]
-
-    # ANOVA
-    f_stat, p_value = stats.f_oneway(*groups)
-    logging.info(f"ANOVA for {value_col} across seasons: F={f_stat:.2f}, p={p_value:.4f}")
-
-    if p_value < 0.05:
-        logging.info("Significant seasonal differences found.")
-        # Post-hoc Tukey test
-        tukey = pairwise_tukeyhsd(df[value_col], df['Season'])
-        logging.info(f"Tukey HSD results:\n{tukey}")
-    else:
+    overall = cube_moments(cube, [], "season", pollutants)
+    overall.insert(0, "City", "All")
+    per_city = cube_moments(cube, "City", "season", pollutants)
+    per_city["City"] = per_city["City"].astype(str)
+    long = pd.concat([overall, per_city], ignore_index=True)
+
+    keys = ["City", "pollutant"]
+    results = anova(long, keys, "season")
+    alpha = config.ANOVA_SIGNIFICANCE_LEVEL
+    significant = results[results["p_value"] < alpha]
+    logging.info(f"ANOVA across seasons: {len(significant)} of {len(results)} City x pollutant tests significant (p<{alpha})")
+    for _, row in results[results["City"] == "All"].iterrows():
+        logging.info(f"ANOVA for {row['pollutant']} across seasons: F={row['F']:.2f}, p={row['p_value']:.4f}")
+
+    out_path = OUTPUT_PATH + f"{name}_seasonal_anova.csv"
+    results.to_csv(out_path, index=False)
+    logging.info(f"Saved: {out_path}")
+
+    # Post-hoc test only for the significant ones
+    if significant.empty:
         logging.info("No significant seasonal differences.")
-
-def correlation_analysis(df, filename):
-    """Perform correlation analysis on pollutants."""
-    pollutants = ['PM2.5', 'PM10', 'NO', 'NO2', 'NOx', 'NH3', 'CO', 'SO2', 'O3', 'Benzene', 'Toluene', 'Xylene']
-    available_pollutants = [p for p in pollutants if p in df.columns]
-
-    if len(available_pollutants) < 2:
-        logging.warning("Not enough pollutants for correlation analysis.")
         return
+    tested = long.merge(significant[keys], on=keys)
+    pairs = posthoc(tested, keys, "season", method=config.POSTHOC_METHOD, alpha=alpha)
+    out_path = OUTPUT_PATH + f"{name}_seasonal_posthoc.csv"
+    pairs.to_csv(out_path, index=False)
+    logging.info(f"Saved {config.POSTHOC_METHOD} results: {out_path}")
+
+def correlation_analysis(name):
+    """
+    Perform correlation analysis on pollutants: overall, per city and per
+    season, in one streaming pass over the stored dataset (see correlation.py).
+    Returns the heatmap plot job.
+    """
+    results = stream_correlations(name, by=[("City",), ("season",)])
+    overall = results[((), OVERALL)]
+
+    if len(overall.columns) < 2:
+        logging.warning("Not enough pollutants for correlation analysis.")
+        return None
+
+    out_path = OUTPUT_PATH + f"{name}_pollutant_correlations.csv"
+    to_long(results).to_csv(out_path, index=False)
+    logging.info(f"Saved correlations by city and season: {out_path}")
 
-    corr_matrix = df[available_pollutants].corr()
+    corr_matrix = overall.corr()
 
-    plt.figure(figsize=(12, 10))
-    sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', center=0)
-    plt.title(f"Pollutant Correlation Matrix ({filename})")
-    plt.tight_layout()
-    out_path = VIS_PATH + filename.replace(".csv", "_correlation.png")
-    plt.savefig(out_path)
-    plt.close()
-    logging.info(f"Saved correlation heatmap: {out_path}")
+    out_path = VIS_PATH + f"{name}_cleaned_correlation.png"
+    return plot_job("heatmap", corr_matrix, out_path, title=f"Pollutant Correlation Matrix ({name})",
+                    figsize=(12, 10), annot=True, cmap='coolwarm', center=0)
 
-def analyze_file(filename):
-    logging.info(f"Analyzing: {filename}")
+def analyze_file(name):
+    """Run the analyses of one dataset and return its plot jobs."""
+    logging.info(f"Analyzing: {name}")
+    jobs = []
 
-    df = pd.read_csv(CLEAN_PATH + filename)
+    try:
+        df = load_dataset(name, columns=config.DATE_COLUMNS + ["PM2.5"])
+    except FileNotFoundError as e:
+        logging.warning(str(e))
+        return jobs
 
-    logging.info(f"Columns found: {df.columns.tolist()}")
+    logging.info(f"Columns loaded: {df.columns.tolist()}")
 
-    date_col = detect_date_column(df)
+    date_col = find_date_col(df)
 
     if not date_col:
         logging.warning("No date column found. Skipping time-based analysis.")
-        return
+        return jobs
 
     logging.info(f"Date column detected: {date_col}")
 
-    # Convert date column
-    df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
-    df = df.dropna(subset=[date_col])
-
     # PM2.5 trend
     if "PM2.5" in df.columns:
         logging.info("Plotting PM2.5 trend…")
 
         daily_pm25 = df.groupby(date_col)["PM2.5"].mean()
 
-        plt.figure(figsize=(10, 5))
-        daily_pm25.plot()
-        plt.title(f"Average PM2.5 Over Time ({filename})")
-        plt.xlabel("Date")
-        plt.ylabel("PM2.5")
-        plt.tight_layout()
-
-        out_path = VIS_PATH + filename.replace(".csv", "_pm25_trend.png")
-        plt.savefig(out_path)
-        plt.close()
-
-        logging.info(f"Saved: {out_path}")
-
-        # Seasonal ANOVA for PM2.5
-        seasonal_anova_test(df, date_col, "PM2.5", filename)
+        out_path = VIS_PATH + f"{name}_cleaned_pm25_trend.png"
+        jobs.append(plot_job("line", daily_pm25, out_path, title=f"Average PM2.5 Over Time ({name})",
+                             xlabel="Date", ylabel="PM2.5", figsize=(10, 5)))
 
     else:
         logging.warning("No PM2.5 column. Skipping PM2.5 analysis.")
 
+    # Seasonal ANOVA for every pollutant, per city
+    seasonal_anova_test(name)
+
     # Correlation analysis
-    correlation_analysis(df, filename)
+    heatmap = correlation_analysis(name)
+    if heatmap is not None:
+        jobs.append(heatmap)
+    return jobs
 
 def main():
-    for f in FILES:
-        analyze_file(f)
+    # Plots of every dataset are rendered together on a process pool
+    jobs = []
+    for name in DATASETS:
+        jobs.extend(analyze_file(name))
+    render_jobs(jobs)
 
 if __name__ == "__main__":
+    start_run()
     main()
@@ -1,20 +1,22 @@
-import pandas as pd
-import matplotlib.pyplot as plt
 import os
+import sys
 
-PROCESSED_PATH = "../data/processed/"
-OUTPUT_PATH = "../output/"
-VISUALS_PATH = "../visuals/"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from scripts.instrument import start_run
+from scripts.loader import load_dataset
+
+OUTPUT_PATH = os.path.join(config.OUTPUT_DIR, "")
+VISUALS_PATH = os.path.join(config.VISUALS_DIR, "")
 
 # Create folders if missing
 os.makedirs(OUTPUT_PATH, exist_ok=True)
 os.makedirs(VISUALS_PATH, exist_ok=True)
 
 def analyze_stations():
-    file_path = PROCESSED_PATH + "stations_cleaned.csv"
-
-    print(f"📌 Loading: {file_path}")
-    df = pd.read_csv(file_path)
+    print("📌 Loading: stations")
+    df = load_dataset("stations")
 
     print("Columns found:", df.columns.tolist())
 
@@ -24,7 +26,7 @@ def analyze_stations():
         return
 
     # Count stations per city
-    station_counts = df.groupby("City")["Station"].count().sort_values(ascending=False)
+    station_counts = df.groupby("City", observed=True)["Station"].count().sort_values(ascending=False)
 
     print("\n🏙️ Stations per city:")
     print(station_counts)
@@ -35,6 +37,7 @@ def analyze_stations():
     print(f"✅ Saved station summary: {summary_file}")
 
     # Plot
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(12, 6))
     station_counts.plot(kind="bar")
     plt.title("Number of Monitoring Stations per City")
@@ -51,4 +54,5 @@ def main():
     analyze_stations()
 
 if __name__ == "__main__":
+    start_run()
     main()
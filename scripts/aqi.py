@@ -0,0 +1,133 @@
+# I wrote this module to compute the Indian National AQI from pollutant
+# concentrations instead of trusting the AQI/AQI_Bucket columns in the raw
+# files, which often disagree with each other.
+#
+# Sub-indices use the CPCB breakpoint tables with linear interpolation
+# between breakpoints (np.interp over whole columns). For hourly data the
+# concentrations are first averaged over the CPCB windows: 24 hours for
+# PM2.5, PM10, NO2, SO2 and NH3 and 8 hours for CO and O3, per station.
+
+import numpy as np
+import pandas as pd
+
+import config
+from scripts.schema import find_date_col
+
+# Concentration breakpoints (µg/m3, CO in mg/m3) matching AQI_BREAKPOINTS.
+# The last breakpoint is where the "Severe" band reaches 500.
+CONCENTRATION_BREAKPOINTS = {
+    'PM2.5': [0, 30, 60, 90, 120, 250, 380],
+    'PM10': [0, 50, 100, 250, 350, 430, 510],
+    'NO2': [0, 40, 80, 180, 280, 400, 520],
+    'SO2': [0, 40, 80, 380, 800, 1600, 2400],
+    'CO': [0, 1.0, 2.0, 10, 17, 34, 51],
+    'O3': [0, 50, 100, 168, 208, 748, 1028],
+    'NH3': [0, 200, 400, 800, 1200, 1800, 2400],
+}
+AQI_BREAKPOINTS = [0, 50, 100, 200, 300, 400, 500]
+
+# Averaging window (hours) for hourly data
+AVERAGING_HOURS = {'PM2.5': 24, 'PM10': 24, 'NO2': 24, 'SO2': 24, 'NH3': 24, 'CO': 8, 'O3': 8}
+
+# CPCB needs at least this many readings in a window, and at least this many
+# sub-indices (one of them PM2.5 or PM10) for a valid AQI
+MIN_COVERAGE = {24: 16, 8: 6}
+MIN_SUB_INDICES = 3
+
+# Buckets in order of their upper AQI bound, taken from config.AQI_CATEGORIES
+BUCKETS = sorted(config.AQI_CATEGORIES, key=lambda name: config.AQI_CATEGORIES[name]['range'][0])
+BUCKET_UPPER = [config.AQI_CATEGORIES[name]['range'][1] for name in BUCKETS[:-1]]
+
+
+def sub_index(pollutant, concentration):
+    """Vectorized CPCB sub-index for one pollutant (NaN stays NaN)."""
+    values = np.asarray(concentration, dtype=np.float64)
+    index = np.interp(values, CONCENTRATION_BREAKPOINTS[pollutant], AQI_BREAKPOINTS)
+    index[np.isnan(values)] = np.nan
+    return index
+
+
+def rolling_means(df, hours, columns, group_cols=('City', 'Station')):
+    """
+    Trailing time-window means per station, e.g. the 24h mean ending at each
+    hourly reading. Rows are sorted once by (station, time); each window's
+    start is found with np.searchsorted and its sum/count come from cumulative
+    sums, so every column is processed in a few array operations.
+    Returns a frame aligned with `df` holding NaN where coverage is too low.
+    """
+    date_col = find_date_col(df)
+    group_cols = [c for c in group_cols if c in df.columns]
+    codes = (df.groupby(group_cols, observed=True, sort=False).ngroup().to_numpy()
+             if group_cols else np.zeros(len(df), dtype=np.int64))
+    seconds = df[date_col].to_numpy().astype('datetime64[s]').astype(np.int64)
+    seconds = seconds - (seconds.min() if len(seconds) else 0)
+
+    order = np.lexsort((seconds, codes))
+    key = codes[order].astype(np.int64) * (1 << 32) + seconds[order]
+    start = np.searchsorted(key, key - hours * 3600, side='right')
+    min_count = MIN_COVERAGE.get(hours, 1)
+
+    result = pd.DataFrame(index=df.index)
+    for col in columns:
+        values = df[col].to_numpy(dtype=np.float64)[order]
+        valid = ~np.isnan(values)
+        csum = np.r_[0.0, np.cumsum(np.where(valid, values, 0.0))]
+        ccount = np.r_[0, np.cumsum(valid)]
+        end = np.arange(1, len(values) + 1)
+        total, count = csum[end] - csum[start], ccount[end] - ccount[start]
+        mean = np.where(count >= min_count, total / np.maximum(count, 1), np.nan)
+        out = np.empty(len(values))
+        out[order] = mean
+        result[col] = out
+    return result
+
+
+def is_hourly(df):
+    """True if the date column carries times of day (hourly data)."""
+    date_col = find_date_col(df)
+    if date_col is None:
+        return False
+    dates = df[date_col]
+    return bool((dates != dates.dt.normalize()).any())
+
+
+def sub_indices(df, hourly=None):
+    """Return a frame of CPCB sub-indices, one column per available pollutant."""
+    pollutants = [p for p in CONCENTRATION_BREAKPOINTS if p in df.columns]
+    hourly = is_hourly(df) if hourly is None else hourly
+
+    concentrations = df[pollutants]
+    if hourly:
+        windows = {}
+        for hours in sorted(set(AVERAGING_HOURS[p] for p in pollutants)):
+            cols = [p for p in pollutants if AVERAGING_HOURS[p] == hours]
+            windows[hours] = rolling_means(df, hours, cols)
+        concentrations = pd.concat(list(windows.values()), axis=1)[pollutants]
+
+    return pd.DataFrame({p: sub_index(p, concentrations[p]) for p in pollutants}, index=df.index)
+
+
+def aqi_from_sub_indices(indices):
+    """AQI is the largest sub-index where CPCB's minimum-data rule is met."""
+    values = indices.to_numpy(dtype=np.float64)
+    available = (~np.isnan(values)).sum(axis=1)
+    has_pm = indices[[c for c in ('PM2.5', 'PM10') if c in indices.columns]].notna().any(axis=1).to_numpy()
+    aqi = np.fmax.reduce(values, axis=1, initial=-np.inf) if values.shape[1] else np.full(len(values), np.nan)
+    return np.where((available >= MIN_SUB_INDICES) & has_pm, aqi, np.nan)
+
+
+def aqi_bucket(aqi):
+    """Map AQI values to the categories in config.AQI_CATEGORIES."""
+    aqi = np.asarray(aqi, dtype=np.float64)
+    codes = np.searchsorted(BUCKET_UPPER, aqi, side='left')
+    codes[np.isnan(aqi)] = -1
+    return pd.Categorical.from_codes(codes, categories=BUCKETS)
+
+
+def add_aqi(df, hourly=None):
+    """Return a copy of `df` with AQI and AQI_Bucket recomputed from concentrations."""
+    df = df.copy()
+    aqi = aqi_from_sub_indices(sub_indices(df, hourly=hourly))
+    df['AQI'] = np.round(aqi, 1)
+    df['AQI_Bucket'] = aqi_bucket(df['AQI'].to_numpy())
+    return df
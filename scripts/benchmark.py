@@ -0,0 +1,215 @@
+# scripts/benchmark.py
+# I wrote this script to see how the pipeline scales past the small sample in
+# data/raw. It generates a synthetic station_hour.csv (see synthetic_data.py)
+# in a scratch workspace and runs each stage on it in its own process, so a
+# stage's peak memory (max RSS) is its own. The stages run in order:
+#
+#   clean        clean_data.clean_file("station_hour.csv")
+#   rollup       station_hour -> station_day, city_hour, city_day
+#   seasonal     seasonal_trends.py
+#   top_cities   top_polluted_cities.py --by aqi
+#   hotspots     pollution_hotspots.py
+#   correlation  streamed correlations of station_hour by City and season
+#   report       generate_report.py
+#
+# Timings, peak memory, the scale and the git commit are written to a JSON
+# results file; --compare prints the change against an earlier results file
+# so regressions between versions stand out.
+import argparse
+import importlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from scripts.instrument import load_records, start_run, summarize
+from scripts.synthetic_data import SCALES, generate
+
+OUTPUT = os.path.join(config.OUTPUT_DIR, "benchmarks", "")
+
+# "needs" lists the stages whose outputs a stage reads; they are run first
+STAGES = [
+    {"name": "clean", "module": "scripts.clean_data", "function": "clean_file", "args": ["station_hour.csv"],
+     "needs": []},
+    {"name": "rollup", "module": "scripts.rollup", "function": "main", "args": [[]], "needs": ["clean"]},
+    {"name": "seasonal", "module": "scripts.seasonal_trends", "function": "main", "args": [], "needs": ["rollup"]},
+    {"name": "top_cities", "module": "scripts.top_polluted_cities", "function": "main", "args": [["--by", "aqi"]],
+     "needs": ["rollup"]},
+    {"name": "hotspots", "module": "scripts.pollution_hotspots", "function": "main", "args": [[]],
+     "needs": ["rollup"]},
+    {"name": "correlation", "module": "scripts.correlation", "function": "stream_correlations",
+     "args": ["station_hour"], "kwargs": {"by": [("City",), ("season",)]}, "needs": ["clean"]},
+    {"name": "report", "module": "scripts.generate_report", "function": "main", "args": [], "needs": []},
+]
+STAGE_NAMES = [stage["name"] for stage in STAGES]
+# A stage this much slower (or hungrier) than in the compared run is flagged,
+# if it also lost at least MIN_SLOWDOWN seconds (short stages are noisy)
+REGRESSION_RATIO = 1.2
+MIN_SLOWDOWN = 0.5
+
+
+def with_prerequisites(names):
+    """The given stages plus every stage they need, in STAGES order."""
+    wanted = set()
+    todo = list(names)
+    while todo:
+        name = todo.pop()
+        if name not in wanted:
+            wanted.add(name)
+            todo.extend(STAGES[STAGE_NAMES.index(name)]["needs"])
+    return [name for name in STAGE_NAMES if name in wanted]
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_stage(name, result_file):
+    """Run one stage in this process and write its time and peak memory (the child side)."""
+    start_run()
+    stage = STAGES[STAGE_NAMES.index(name)]
+    module = importlib.import_module(stage["module"])
+    start_rss = peak_rss_mb()
+    start = time.perf_counter()
+    getattr(module, stage["function"])(*stage["args"], **stage.get("kwargs", {}))
+    result = {"stage": name, "seconds": round(time.perf_counter() - start, 3),
+              "peak_rss_mb": round(peak_rss_mb(), 1), "import_rss_mb": round(start_rss, 1)}
+    # Per-step breakdown recorded by the instrumented steps (see instrument.py)
+    result["steps"] = summarize(load_records())
+    with open(result_file, "w") as fh:
+        json.dump(result, fh)
+
+
+def workspace_env(workspace):
+    """Environment that points config at the workspace (see config.py)."""
+    env = dict(os.environ)
+    env["AIR_QUALITY_DATA_DIR"] = os.path.join(workspace, "data")
+    env["AIR_QUALITY_OUTPUT_DIR"] = os.path.join(workspace, "output")
+    env["AIR_QUALITY_VISUALS_DIR"] = os.path.join(workspace, "visuals")
+    env["MPLBACKEND"] = "Agg"
+    # Every stage is a run of its own, with its timeline in the workspace
+    env.pop("AIR_QUALITY_RUN_ID", None)
+    return env
+
+
+def run_in_workspace(name, workspace):
+    """Run a stage in a child process; its output goes to <workspace>/logs/<stage>.log."""
+    logs = os.path.join(workspace, "logs")
+    os.makedirs(logs, exist_ok=True)
+    result_file = os.path.join(logs, f"{name}.json")
+    with open(os.path.join(logs, f"{name}.log"), "w") as log:
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-stage", name,
+                               "--result-file", result_file],
+                              env=workspace_env(workspace), stdout=log, stderr=subprocess.STDOUT)
+    if proc.returncode != 0 or not os.path.exists(result_file):
+        return {"stage": name, "status": f"failed (exit {proc.returncode}, see {log.name})"}
+    with open(result_file) as fh:
+        return dict(json.load(fh), status="ok")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=config.PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous):
+    """Print each stage's time and memory next to an earlier results file."""
+    before = {r["stage"]: r for r in previous["stages"] if r.get("status") == "ok"}
+    same_size = previous["rows"] == results["rows"]
+    print(f"\nCompared with {previous.get('commit')} ({previous.get('timestamp')}, {previous['rows']} rows):")
+    print(f"{'Stage':<12} {'Seconds':>9} {'Before':>9} {'Ratio':>6} {'Peak MB':>9} {'Before':>9} {'Ratio':>6}")
+    for r in results["stages"]:
+        old = before.get(r["stage"])
+        if r.get("status") != "ok" or old is None:
+            continue
+        time_ratio = r["seconds"] / max(old["seconds"], 1e-3)
+        rss_ratio = r["peak_rss_mb"] / max(old["peak_rss_mb"], 1e-3)
+        slower = time_ratio > REGRESSION_RATIO and r["seconds"] - old["seconds"] > MIN_SLOWDOWN
+        regressed = same_size and (slower or rss_ratio > REGRESSION_RATIO)
+        flag = "  <- regression" if regressed else ""
+        print(f"{r['stage']:<12} {r['seconds']:>9.2f} {old['seconds']:>9.2f} {time_ratio:>6.2f} "
+              f"{r['peak_rss_mb']:>9.0f} {old['peak_rss_mb']:>9.0f} {rss_ratio:>6.2f}{flag}")
+    if not same_size:
+        print("The runs used different numbers of rows, so no stage is flagged.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time and memory-profile the pipeline on synthetic data.")
+    parser.add_argument("stages", nargs="*", help=f"stages to run: {', '.join(STAGE_NAMES)} (default: all)")
+    parser.add_argument("--scale", choices=SCALES, default="small",
+                        help="preset number of stations and days (default: %(default)s)")
+    parser.add_argument("--stations", type=int, help="number of stations (overrides --scale)")
+    parser.add_argument("--days", type=int, help="number of days (overrides --scale)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the generator (default: %(default)s)")
+    parser.add_argument("--workspace", help="directory for the synthetic data and outputs (default: a temporary one)")
+    parser.add_argument("--keep", action="store_true", help="keep the workspace after the run")
+    parser.add_argument("--out", help="results file (default: output/benchmarks/<scale>_<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare with")
+    parser.add_argument("--run-stage", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_stage:
+        run_stage(args.run_stage, args.result_file)
+        return
+    unknown = sorted(set(args.stages) - set(STAGE_NAMES))
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+    stages = with_prerequisites(args.stages or STAGE_NAMES)
+
+    n_stations, days = SCALES[args.scale]
+    n_stations, days = args.stations or n_stations, args.days or days
+    workspace = args.workspace or tempfile.mkdtemp(prefix="aq_benchmark_")
+    raw_file = os.path.join(workspace, "data", "raw", "station_hour.csv")
+
+    print(f"Generating {n_stations} stations x {days} days in {workspace}...")
+    start = time.perf_counter()
+    rows = generate(raw_file, n_stations, days, seed=args.seed)
+    generate_seconds = time.perf_counter() - start
+    print(f"{rows} rows, {os.path.getsize(raw_file) / 1024 ** 2:.0f} MB in {generate_seconds:.1f}s")
+
+    results = {"timestamp": datetime.now().isoformat(timespec="seconds"), "commit": git_commit(),
+               "python": platform.python_version(), "platform": platform.platform(),
+               "cpus": os.cpu_count(), "scale": args.scale, "stations": n_stations, "days": days,
+               "rows": rows, "seed": args.seed, "raw_mb": round(os.path.getsize(raw_file) / 1024 ** 2, 1),
+               "generate_seconds": round(generate_seconds, 3), "stages": []}
+    print(f"\n{'Stage':<12} {'Seconds':>9} {'Peak MB':>9}  Status")
+    for name in stages:
+        result = run_in_workspace(name, workspace)
+        results["stages"].append(result)
+        if result["status"] == "ok":
+            print(f"{name:<12} {result['seconds']:>9.2f} {result['peak_rss_mb']:>9.0f}  ok")
+        else:
+            print(f"{name:<12} {'':>9} {'':>9}  {result['status']}")
+
+    out = args.out or OUTPUT + f"{args.scale}_{datetime.now():%Y%m%d_%H%M%S}.json"
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as fh:
+        json.dump(results, fh, indent=2)
+    print("Saved:", out)
+
+    if args.compare:
+        with open(args.compare) as fh:
+            compare(results, json.load(fh))
+    if args.keep or args.workspace:
+        print("Workspace kept:", workspace)
+    else:
+        shutil.rmtree(workspace)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# I wrote this module so every script derives calendar fields the same way.
+# Every datetime64 value is turned into a day number with one integer
+# division; year, month and day of month are then lookups into a table with
+# one entry per day of the data's span, hour and weekday are integer
+# arithmetic, and the season is a lookup into a 13-entry array indexed by
+# month, so nothing runs per row. Two season definitions are available,
+# picked with config.SEASON_SCHEME:
+#
+#   'meteorological'  Winter (DJF), Spring (MAM), Summer (JJA), Autumn (SON)
+#   'imd'             the India Meteorological Department seasons: Winter
+#                     (Jan-Feb), Pre-monsoon (Mar-May), Monsoon (Jun-Sep)
+#                     and Post-monsoon (Oct-Dec)
+#
+# The cube (aggregate_cube.py) stores year, month and season of every row
+# group, so reports that only need those read them from there.
+
+import numpy as np
+import pandas as pd
+
+import config
+
+# Season labels and the season code of every month number (index 0 unused)
+SEASON_SCHEMES = {
+    "meteorological": (["Winter (DJF)", "Spring (MAM)", "Summer (JJA)", "Autumn (SON)"],
+                       np.array([-1, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0], dtype=np.int8)),
+    "imd": (["Winter (JF)", "Pre-monsoon (MAM)", "Monsoon (JJAS)", "Post-monsoon (OND)"],
+            np.array([-1, 0, 0, 1, 1, 1, 2, 2, 2, 2, 3, 3, 3], dtype=np.int8)),
+}
+FEATURES = ("year", "month", "day", "hour", "weekday", "season")
+WEEKDAY_LABELS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+# 1970-01-01, day 0 of datetime64[D], was a Thursday (weekday 3)
+EPOCH_WEEKDAY = 3
+NS_PER_HOUR = 3_600_000_000_000
+NS_PER_DAY = 24 * NS_PER_HOUR
+
+
+def _scheme(scheme=None):
+    scheme = scheme or config.SEASON_SCHEME
+    if scheme not in SEASON_SCHEMES:
+        raise ValueError(f"Unknown season scheme '{scheme}'. Choose from: {', '.join(SEASON_SCHEMES)}")
+    return SEASON_SCHEMES[scheme]
+
+
+def season_labels(scheme=None):
+    """Season labels of a scheme (default config.SEASON_SCHEME) in calendar order."""
+    return list(_scheme(scheme)[0])
+
+
+def season_of_month(month, scheme=None):
+    """Season of each month number (1-12) as a categorical."""
+    labels, lookup = _scheme(scheme)
+    return pd.Categorical.from_codes(lookup[np.asarray(month, dtype=np.intp)], categories=labels)
+
+
+def _datetime64(dates):
+    values = np.asarray(dates)
+    if values.dtype.kind != "M":
+        values = pd.to_datetime(values).to_numpy()
+    return values.astype("datetime64[ns]")
+
+
+def _day_numbers(values):
+    """Days since 1970-01-01 of datetime64[ns] values (floored, so earlier dates work too)."""
+    return values.view(np.int64) // NS_PER_DAY
+
+
+def _day_table(days):
+    """
+    Year, month and day of month of every day number from days.min() to
+    days.max(). Ten years of data span a few thousand days, so the table is
+    small and each feature is one indexing operation over the rows.
+    """
+    first = int(days.min())
+    span = pd.date_range(pd.Timestamp(first, unit="D"), periods=int(days.max()) - first + 1, freq="D")
+    table = {"year": span.year.to_numpy(np.int16), "month": span.month.to_numpy(np.int8),
+             "day": span.day.to_numpy(np.int8)}
+    return first, table
+
+
+def calendar_features(dates, features=FEATURES, scheme=None):
+    """
+    Frame of calendar features (any of FEATURES) for a date column or array,
+    indexed like `dates` when it is a Series. Dates must not be NaT (the
+    cleaned store never has missing dates).
+    """
+    unknown = sorted(set(features) - set(FEATURES))
+    if unknown:
+        raise ValueError(f"Unknown calendar feature(s): {', '.join(unknown)}")
+    values = _datetime64(dates)
+    days = _day_numbers(values)
+    result = {}
+    if len(values) and set(features) & {"year", "month", "day", "season"}:
+        first, table = _day_table(days)
+        positions = days - first
+        for feature in ("year", "month", "day"):
+            if feature in features or (feature == "month" and "season" in features):
+                result[feature] = table[feature][positions]
+    if "hour" in features:
+        result["hour"] = (values.view(np.int64) // NS_PER_HOUR - days * 24).astype(np.int8)
+    if "weekday" in features:
+        result["weekday"] = ((days + EPOCH_WEEKDAY) % 7).astype(np.int8)
+    if "season" in features:
+        result["season"] = season_of_month(result["month"] if len(values) else [], scheme)
+    index = dates.index if isinstance(dates, pd.Series) else None
+    return pd.DataFrame({f: result.get(f, np.empty(0, dtype=np.int8)) for f in features}, index=index)
+
+
+def months(dates):
+    """Month number (1-12) of each date as int8."""
+    return calendar_features(dates, ["month"])["month"].to_numpy()
+
+
+def years(dates):
+    """Calendar year of each date as int16."""
+    return calendar_features(dates, ["year"])["year"].to_numpy()
+
+
+def hours(dates):
+    """Hour of day (0-23) of each date as int8."""
+    return calendar_features(dates, ["hour"])["hour"].to_numpy()
@@ -1,45 +1,48 @@
 # scripts/city_comparison_dashboard.py
-import pandas as pd
-import plotly.express as px
 import os
+import sys
 
-PROCESSED = "../data/processed/"
-VISUALS = "../visuals/"
-os.makedirs(VISUALS, exist_ok=True)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def detect_date_col(df):
-    for c in ["Date","date","Datetime","datetime","timestamp","Timestamp","DateTime"]:
-        if c in df.columns:
-            return c
-    return None
+import config
+from scripts.aggregate_cube import load_cube, summarize
+from scripts.exceedance import rank_cities
+from scripts.downsample import multi_resolution_figure, write_html
+from scripts.instrument import start_run
+from scripts.processed_store import find_date_col
+from scripts.query import load
 
-def main():
-    file = PROCESSED + "city_day_cleaned.csv"
-    print("Loading:", file)
-    df = pd.read_csv(file)
-    date_col = detect_date_col(df)
-    if not date_col:
-        print("No date column. Exiting.")
-        return
-    df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
-    df = df.dropna(subset=[date_col])
+VISUALS = os.path.join(config.VISUALS_DIR, "")
+os.makedirs(VISUALS, exist_ok=True)
 
-    metric = "PM2.5" if "PM2.5" in df.columns else ("AQI" if "AQI" in df.columns else None)
+def main():
+    print("Loading: city_day")
+    cube = load_cube("city_day")
+    metric = "PM2.5" if "PM2.5__count" in cube.columns else ("AQI" if "AQI__count" in cube.columns else None)
     if not metric:
         print("No PM2.5 or AQI. Exiting.")
         return
 
-    # choose top 6 cities
-    top = df.groupby("City")[metric].mean().nlargest(6).index.tolist()
-    dash_df = df[df["City"].isin(top)].copy()
+    # choose top 6 cities (most NAAQS exceedance days, else highest mean), then read only their rows
+    ranking = rank_cities()
+    if ranking is None:
+        ranking = summarize(cube, "City", [metric])[metric].sort_values(ascending=False)
+    top = ranking.head(6).index.astype(str).tolist()
+    dash_df = load("city_day", cities=top, columns=["City", metric] + config.DATE_COLUMNS)
+    date_col = find_date_col(dash_df)
+    if not date_col:
+        print("No date column. Exiting.")
+        return
+    dash_df["City"] = dash_df["City"].astype(str)
 
-    # simple interactive figure
-    fig = px.line(dash_df, x=date_col, y=metric, color="City",
-                  title=f"{metric} over time — Top 6 cities",
-                  labels={date_col:"Date", metric:metric})
+    # day/week/month means, each trace downsampled to config.PLOT_MAX_POINTS
+    fig = multi_resolution_figure(dash_df, date_col, metric, "City",
+                                  title=f"{metric} over time — Top 6 cities")
+    fig.update_layout(xaxis_title="Date", yaxis_title=metric)
     out_html = VISUALS + "city_comparison_dashboard.html"
-    fig.write_html(out_html)
+    write_html(fig, out_html)
     print("Saved interactive dashboard:", out_html)
 
 if __name__ == "__main__":
+    start_run()
     main()
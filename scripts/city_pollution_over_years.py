@@ -1,46 +1,38 @@
 # scripts/city_pollution_over_years.py
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
+import sys
 
-PROCESSED = "../data/processed/"
-VISUALS = "../visuals/"
-OUTPUT = "../output/"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from scripts.aggregate_cube import load_cube, summarize, value_columns
+from scripts.instrument import start_run
+
+VISUALS = os.path.join(config.VISUALS_DIR, "")
+OUTPUT = os.path.join(config.OUTPUT_DIR, "")
 os.makedirs(VISUALS, exist_ok=True)
 os.makedirs(OUTPUT, exist_ok=True)
 
-def detect_date_col(df):
-    for c in ["Date","date","Datetime","datetime","timestamp","Timestamp","DateTime"]:
-        if c in df.columns:
-            return c
-    return None
-
 def main():
-    file = PROCESSED + "city_day_cleaned.csv"
-    print("Loading:", file)
-    df = pd.read_csv(file)
-    date_col = detect_date_col(df)
-    if not date_col:
-        print("No date column. Exiting.")
-        return
-    df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
-    df = df.dropna(subset=[date_col])
-    df["year"] = df[date_col].dt.year
+    print("Loading: city_day cube")
+    cube = load_cube("city_day")
+    columns = value_columns(cube)
 
     # prefer AQI if available, otherwise PM2.5
-    metric = "AQI" if "AQI" in df.columns else ("PM2.5" if "PM2.5" in df.columns else None)
+    metric = "AQI" if "AQI" in columns else ("PM2.5" if "PM2.5" in columns else None)
     if not metric:
         print("No AQI or PM2.5 column. Exiting.")
         return
 
     # compute yearly average per city
-    city_year = df.groupby(["City","year"])[metric].mean().reset_index()
+    city_year = summarize(cube, ["City","year"], [metric]).reset_index()
 
     # pick top 6 cities by overall avg
-    top_cities = df.groupby("City")[metric].mean().nlargest(6).index.tolist()
+    top_cities = summarize(cube, "City", [metric])[metric].nlargest(6).index.tolist()
     print("Top cities:", top_cities)
 
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     plot_df = city_year[city_year["City"].isin(top_cities)]
     plt.figure(figsize=(12,6))
     sns.lineplot(data=plot_df, x="year", y=metric, hue="City", marker="o")
@@ -60,4 +52,5 @@ def main():
     print("Saved:", OUTPUT + "city_yearly_avg.csv")
 
 if __name__ == "__main__":
+    start_run()
     main()
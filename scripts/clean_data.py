@@ -1,14 +1,40 @@
 # I created this script to clean the raw air quality data files.
-# It handles duplicates, missing values, data types, and saves cleaned versions.
+# It handles duplicates, missing values, data types, and saves cleaned versions
+# to the columnar processed store (see processed_store.py).
+# Files are independent, so with --workers N they are cleaned in parallel, and
+# very large files are split into shards of whole stations that are cleaned concurrently.
+# With --stream, files are read in chunks so memory is bounded by the chunk size.
+# Sensor spikes are masked (or flagged) per station, pollutant and month before
+# imputation, see outliers.py.
+# With --incremental, only the rows appended to a raw file since the last run
+# are cleaned and appended to the store (see ingestion.py).
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import pandas as pd
 import numpy as np
-import os
-from datetime import datetime
+
+import config
+from scripts import ingestion, outliers, rollup
+from scripts.aggregate_cube import append_rows, build_cube, merge_cubes, write_cube
+from scripts.aqi import add_aqi
+from scripts.imputation import impute, missing_counts
+from scripts.instrument import instrumented, start_run
+from scripts.processed_store import DatasetWriter, append_dataset, dataset_exists, write_dataset
+from scripts.query import load
+from scripts.schema import CSV_DTYPES, apply_schema, find_date_col, parse_dates, read_csv
+from scripts.streaming_stats import KeySet, QuantileSketch
 
 # Paths to raw and processed data directories
-RAW_PATH = "data/raw/"
-PROCESSED_PATH = "data/processed/"
+RAW_PATH = config.RAW_DATA_DIR
+PROCESSED_PATH = config.PROCESSED_DATA_DIR
+OUTPUT = os.path.join(config.OUTPUT_DIR, "")
 
 # List of files I need to clean
 files = [
@@ -19,68 +45,555 @@ files = [
     "stations.csv"
 ]
 
-def clean_file(filename):
+POLLUTANT_COLS = ['PM2.5', 'PM10', 'NO', 'NO2', 'NOx', 'NH3', 'CO', 'SO2', 'O3', 'Benzene', 'Toluene', 'Xylene']
+
+@instrumented("clean")
+def clean_frame(df):
     """
-    Clean a single CSV file by handling duplicates, dates, numerics, and categories.
-    I designed this function to standardize the data for analysis.
+    Apply every row-local cleaning step: duplicates, empty rows, dates, numerics,
+    categories and AQI range. Missing pollutant values are filled separately by
+    fill_missing() because imputation needs every reading of a station.
     """
-    print(f"Cleaning {filename}...")
-    df = pd.read_csv(RAW_PATH + filename)
-
     # Remove duplicate rows and empty rows
     df = df.drop_duplicates()
     df = df.dropna(how='all')
 
-    # Convert date columns to datetime and standardize format
-    date_cols = ['Date', 'Datetime']
-    for col in date_cols:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors='coerce')
-            df = df.dropna(subset=[col])
-            df[col] = df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
-            break
-
-    # Convert pollutant columns to numeric and fill missing values with median
-    numeric_cols = ['PM2.5', 'PM10', 'NO', 'NO2', 'NOx', 'NH3', 'CO', 'SO2', 'O3', 'Benzene', 'Toluene', 'Xylene', 'AQI']
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-            # For pollutants, I fill missing values with median to avoid skewing data
-            if col in ['PM2.5', 'PM10', 'NO', 'NO2', 'NOx', 'NH3', 'CO', 'SO2', 'O3', 'Benzene', 'Toluene', 'Xylene']:
-                df[col] = df[col].fillna(df[col].median())
+    df = normalize_types(df)
+
+    # Sort data by date for chronological order
+    date_col = find_date_col(df)
+    if date_col is not None:
+        df = df.sort_values(date_col).reset_index(drop=True)
+    return df
+
+def parse_date_col(values, date_col):
+    """Parse a raw date column and report the values that did not parse (their rows are dropped)."""
+    parsed, failures = parse_dates(values, date_col)
+    if failures:
+        print(f"Dropped {failures} rows with unparseable {date_col} values")
+    return parsed
 
-    # Convert AQI bucket to category type
-    if 'AQI_Bucket' in df.columns:
-        df['AQI_Bucket'] = df['AQI_Bucket'].astype('category')
+def normalize_types(df):
+    """Apply the dtype schema (dates, float32 pollutants, categories) and clip AQI."""
+    # Parse dates with their sniffed format, coerce numerics to float32 and
+    # text keys to categories (see schema.py)
+    date_col = find_date_col(df)
+    if date_col is not None:
+        df[date_col] = parse_date_col(df[date_col], date_col)
+    df = apply_schema(df)
+    if date_col is not None:
+        df = df.dropna(subset=[date_col])
 
     # Ensure AQI values are within valid range (0-500)
     if 'AQI' in df.columns:
         df['AQI'] = df['AQI'].clip(0, 500)
+    return df
 
-    # Sort data by date for chronological order
-    if 'Date' in df.columns:
-        df = df.sort_values('Date').reset_index(drop=True)
-    elif 'Datetime' in df.columns:
-        df = df.sort_values('Datetime').reset_index(drop=True)
+@instrumented("clean")
+def fill_missing(df):
+    """
+    Fill missing pollutant values per City/Station with the method from
+    config.IMPUTATION_METHODS (see imputation.py). Gaps longer than
+    config.IMPUTATION_MAX_GAP are left missing rather than invented.
+    """
+    before = int(missing_counts(df).sum())
+    df = impute(df)
+    if before:
+        print(f"Imputed {before - int(missing_counts(df).sum())} of {before} missing pollutant values "
+              f"({config.IMPUTATION_METHODS['numeric']})")
+    return df
+
+def outlier_method(filename):
+    """Outlier method configured for the file's resolution (hourly or daily), or None."""
+    return config.OUTLIER_METHODS.get('hour' if '_hour' in filename else 'day')
+
+def save_outlier_report(counts, fence_frames, filename, method):
+    """Write output/<dataset>_outliers.csv and print the totals."""
+    if counts is None or counts.empty:
+        return
+    report = outliers.outlier_report(counts, fence_frames)
+    path = OUTPUT + filename.replace(".csv", "_outliers.csv")
+    os.makedirs(OUTPUT, exist_ok=True)
+    report.to_csv(path, index=False)
+    action = 'masked' if config.OUTLIER_ACTION == 'mask' else 'flagged'
+    print(f"Outliers ({method}): {int(report['outliers'].sum())} of {int(report['n'].sum())} readings {action}, "
+          f"report: {path}")
 
-    # Save the cleaned file with "_cleaned" suffix
-    output_name = filename.replace(".csv", "_cleaned.csv")
-    df.to_csv(PROCESSED_PATH + output_name, index=False)
-    print(f"Saved cleaned file: {output_name}")
+def find_outliers(df, filename):
+    """
+    Mask or flag the outliers of a frame; returns (frame, per-group counts,
+    IQR fences). Counts are None when the file is not checked for outliers.
+    """
+    method = outlier_method(filename)
+    if method is None or find_date_col(df) is None:
+        return df, None, None
+    columns = [c for c in POLLUTANT_COLS if c in df.columns]
+    fence_frames = None
+    if method == 'iqr':
+        fence_frames = outliers.fences(*outliers.iqr_quartiles(df, outliers.group_keys(df), columns))
+    mask = outliers.detect(df, method, columns, fence_frames)
+    return outliers.apply(df, mask), outliers.count_outliers(df, mask), fence_frames
+
+@instrumented("clean")
+def handle_outliers(df, filename):
+    """
+    Find values outside their group's IQR fences (or rolling MAD band for
+    hourly data), mask or flag them per config.OUTLIER_ACTION and write the
+    per-group outlier counts. Runs before imputation so masked values are filled.
+    Returns the frame and the IQR fences used (None for other methods).
+    """
+    df, counts, fence_frames = find_outliers(df, filename)
+    save_outlier_report(counts, fence_frames, filename, outlier_method(filename))
+    return df, fence_frames
+
+def recompute_aqi(df):
+    """Recompute AQI (see derive_aqi); returns (frame, buckets changed or None)."""
+    if not config.RECOMPUTE_AQI or not any(p in df.columns for p in ('PM2.5', 'PM10')):
+        return df, None
+    old_bucket = df['AQI_Bucket'].astype(str) if 'AQI_Bucket' in df.columns else None
+    df = add_aqi(df)
+    if old_bucket is None:
+        return df, None
+    return df, int((df['AQI_Bucket'].astype(str) != old_bucket).sum())
+
+@instrumented("clean")
+def derive_aqi(df):
+    """
+    Recompute AQI and AQI_Bucket from the pollutant concentrations (CPCB
+    breakpoints, see aqi.py) when config.RECOMPUTE_AQI is set. The raw
+    AQI_Bucket column often disagrees with the raw AQI value.
+    """
+    df, changed = recompute_aqi(df)
+    if changed is not None:
+        print(f"Recomputed AQI: {changed} of {len(df)} buckets changed")
+    return df
+
+def save_cleaned(df, filename, export_csv=False):
+    """Write a cleaned frame to the processed store (and optionally to CSV)."""
+    name = filename.replace(".csv", "")
+    path = write_dataset(df, name)
+    print(f"Saved cleaned dataset: {path}")
+
+    # Pre-aggregate the moments the reports need (see aggregate_cube.py)
+    if find_date_col(df) is not None:
+        write_cube(build_cube(df), name)
+
+    # Optional CSV export for people who want to open the data in a spreadsheet
+    if export_csv:
+        output_name = filename.replace(".csv", "_cleaned.csv")
+        df.to_csv(os.path.join(PROCESSED_PATH, output_name), index=False)
+        print(f"Exported CSV: {output_name}")
 
     # Print a summary of the cleaned data
+    date_col = find_date_col(df)
     summary = {
-        'filename': output_name,
+        'dataset': name,
         'rows': len(df),
         'columns': len(df.columns),
-        'date_range': f"{df.iloc[0]['Date'] if 'Date' in df.columns else df.iloc[0]['Datetime']} to {df.iloc[-1]['Date'] if 'Date' in df.columns else df.iloc[-1]['Datetime']}" if len(df) > 0 else 'N/A'
+        'date_range': f"{df[date_col].iloc[0]} to {df[date_col].iloc[-1]}" if date_col is not None and len(df) > 0 else 'N/A'
     }
     print(f"Summary: {summary}")
 
-def main():
+def raw_offset(filename):
+    """Position up to which a raw file is about to be read (see ingestion.py)."""
+    raw_file = os.path.join(RAW_PATH, filename)
+    return ingestion.complete_size(raw_file) if os.path.exists(raw_file) else 0
+
+def record_ingest_state(filename, df, offset, fence_frames=None):
+    """Start a fresh ingest state (offset, watermarks, key index, fences) after a full clean."""
+    if find_date_col(df) is None:
+        return
+    state = ingestion.IngestState.reset(filename.replace(".csv", ""))
+    state.fences = fence_frames
+    state.update(df)
+    state.save(os.path.join(RAW_PATH, filename), offset)
+
+@instrumented("load")
+def read_raw(filename):
+    """Read a raw CSV, or return None if it does not exist."""
+    raw_file = os.path.join(RAW_PATH, filename)
+    if not os.path.exists(raw_file):
+        print(f"Skipping {filename}: not found in {RAW_PATH}")
+        return None
+    print(f"Cleaning {filename}...")
+    return read_csv(raw_file)
+
+@instrumented("clean")
+def clean_file(filename, export_csv=False):
+    """
+    Clean a single CSV file by handling duplicates, dates, numerics, and categories.
+    I designed this function to standardize the data for analysis.
+    Returns a timing summary dict, or None if the file is missing.
+    """
+    start = time.perf_counter()
+    offset = raw_offset(filename)
+    df = read_raw(filename)
+    if df is None:
+        return None
+    rows_in = len(df)
+
+    df, fence_frames = handle_outliers(clean_frame(df), filename)
+    df = derive_aqi(fill_missing(df))
+    save_cleaned(df, filename, export_csv)
+    record_ingest_state(filename, df, offset, fence_frames)
+    return {'file': filename, 'rows_in': rows_in, 'rows_out': len(df), 'parts': 1,
+            'seconds': time.perf_counter() - start}
+
+def shard_columns(df):
+    """
+    Columns whose groups hold every reading the outlier and imputation steps
+    compare, so a shard of whole groups cleans exactly like the whole file.
+    """
+    return [c for c in config.OUTLIER_GROUP_COLUMNS
+            if c in config.IMPUTATION_GROUP_COLUMNS and c in df.columns]
+
+def station_shards(df, group_cols, shards):
+    """Split df into up to `shards` frames of whole groups with similar row counts."""
+    codes = df.groupby(group_cols, observed=True, sort=False, dropna=False).ngroup().to_numpy()
+    sizes = np.bincount(codes)
+    # Largest groups first, each to the shard with the fewest rows so far
+    rows = np.zeros(shards, dtype=np.int64)
+    shard_of = np.empty(len(sizes), dtype=np.int64)
+    for group in np.argsort(-sizes, kind='stable'):
+        shard_of[group] = rows.argmin()
+        rows[shard_of[group]] += sizes[group]
+    ids = shard_of[codes]
+    return [df[ids == i] for i in range(shards) if rows[i] > 0]
+
+@instrumented("clean")
+def mask_shard(df, filename):
+    """clean_frame() and outliers for one shard; returns (frame, outlier counts, fences)."""
+    return find_outliers(clean_frame(df), filename)
+
+@instrumented("clean")
+def fill_shard(df, medians=None):
+    """Impute and derive AQI for one shard; returns (frame, missing before, after, AQI buckets changed)."""
+    before = int(missing_counts(df).sum())
+    df = impute(df, medians=medians)
+    after = int(missing_counts(df).sum())
+    df, changed = recompute_aqi(df)
+    return df, before, after, changed
+
+def clean_shard(df, filename):
+    """The whole cleaning chain for one shard of whole stations (runs in a worker)."""
+    df, counts, fence_frames = mask_shard(df, filename)
+    df, before, after, changed = fill_shard(df)
+    return df, counts, fence_frames, before, after, changed
+
+@instrumented("clean")
+def clean_file_sharded(filename, pool, shards, export_csv=False):
+    """
+    Clean one large file by splitting it into shards of whole stations and
+    running the whole chain (clean_frame, outliers, imputation, AQI) on the
+    pool. Outlier fences, rolling MAD bands and imputation all work per
+    station group (shard_columns), so every group sees all of its readings
+    and the result matches clean_file(). Only the 'median' imputation needs
+    whole-file values: then the shards come back after outlier masking, the
+    medians are taken over all of them and the rest runs on the pool again.
+    """
+    start = time.perf_counter()
+    offset = raw_offset(filename)
+    df = read_raw(filename)
+    if df is None:
+        return None
+    rows_in = len(df)
+
+    group_cols = shard_columns(df)
+    if find_date_col(df) is None or not group_cols or shards < 2:
+        shards = 1
+        df, fence_frames = handle_outliers(clean_frame(df), filename)
+        df = derive_aqi(fill_missing(df))
+    else:
+        parts = station_shards(df, group_cols, shards)
+        del df
+        shards, names = len(parts), [filename] * len(parts)
+        if config.IMPUTATION_METHODS['numeric'] == 'median':
+            masked = list(pool.map(mask_shard, parts, names))
+            frames = [m[0] for m in masked]
+            columns = [c for c in POLLUTANT_COLS if c in frames[0].columns]
+            medians = pd.concat([f[columns] for f in frames], ignore_index=True).median().to_dict()
+            filled = list(pool.map(fill_shard, frames, [medians] * shards))
+            results = [(f[0], m[1], m[2]) + f[1:] for m, f in zip(masked, filled)]
+            del masked, frames, filled
+        else:
+            results = list(pool.map(clean_shard, parts, names))
+        del parts
+
+        # Categories can differ per shard, so restore the schema dtypes
+        df = apply_schema(pd.concat([r[0] for r in results], ignore_index=True))
+        date_col = find_date_col(df)
+        df = df.iloc[np.argsort(df[date_col].to_numpy(), kind='stable')].reset_index(drop=True)
+
+        counts = None
+        for r in results:
+            counts = outliers.merge_counts(counts, r[1])
+        fence_frames = None
+        if results[0][2] is not None:
+            fence_frames = tuple(pd.concat([r[2][i] for r in results]) for i in (0, 1))
+        save_outlier_report(counts, fence_frames, filename, outlier_method(filename))
+        before, after = sum(r[3] for r in results), sum(r[4] for r in results)
+        if before:
+            print(f"Imputed {before - after} of {before} missing pollutant values "
+                  f"({config.IMPUTATION_METHODS['numeric']})")
+        if results[0][5] is not None:
+            print(f"Recomputed AQI: {sum(r[5] for r in results)} of {len(df)} buckets changed")
+
+    save_cleaned(df, filename, export_csv)
+    record_ingest_state(filename, df, offset, fence_frames)
+    return {'file': filename, 'rows_in': rows_in, 'rows_out': len(df), 'parts': shards,
+            'seconds': time.perf_counter() - start}
+
+def row_keys(df):
+    """Columns that identify a reading: (City, Station, date) where present, else the whole row."""
+    keys = [c for c in ['City', 'Station', find_date_col(df)] if c is not None and c in df.columns]
+    return keys if find_date_col(df) is not None else list(df.columns)
+
+def fill_grouped_medians(df, medians):
+    """Fill missing pollutant values with the {pollutant: median per (group, month)} of their row."""
+    keys = outliers.group_keys(df, config.IMPUTATION_GROUP_COLUMNS)
+    index = pd.MultiIndex.from_frame(keys) if keys.shape[1] > 1 else pd.Index(keys.iloc[:, 0])
+    df = df.copy()
+    for col, median in medians.items():
+        if col in df.columns:
+            df[col] = df[col].fillna(pd.Series(median.reindex(index).to_numpy(), index=df.index))
+    return df
+
+@instrumented("clean")
+def clean_file_streaming(filename, chunksize, export_csv=False):
+    """
+    Clean one file in chunks so peak memory depends on `chunksize`, not file size.
+    Pass 1 drops duplicates with a set of (City, Station, date) key hashes and
+    feeds a quantile sketch per pollutant to get the medians (and grouped
+    sketches for the outlier fences). Pass 2 re-reads the chunks, keeps the
+    same rows, handles outliers, imputes and appends each chunk to the
+    processed store. The rolling MAD outlier band restarts at each chunk.
+    'interpolate' and 'ffill' work within a chunk (gaps that straddle a chunk
+    boundary stay missing); 'seasonal_median' uses whole-file medians sketched
+    per group and month, 'median' whole-file medians per pollutant. Medians are
+    sketched before outliers are masked. AQI averaging windows also restart at
+    each chunk. Rows are sorted by date within each chunk; readers restore the
+    global order.
+    """
+    start = time.perf_counter()
+    raw_file = os.path.join(RAW_PATH, filename)
+    if not os.path.exists(raw_file):
+        print(f"Skipping {filename}: not found in {RAW_PATH}")
+        return None
+    print(f"Cleaning {filename} in chunks of {chunksize} rows...")
+    offset = raw_offset(filename)
+
+    # Pass 1: de-duplicate and sketch the pollutant distributions
+    seen = KeySet()
+    sketches = {}
+    method = outlier_method(filename)
+    group_sketches = {}
+    numeric = config.IMPUTATION_METHODS['numeric']
+    median_sketches = {}
+    keep_masks = []
+    rows_in = 0
+    for chunk in pd.read_csv(raw_file, chunksize=chunksize, dtype=CSV_DTYPES):
+        rows_in += len(chunk)
+        chunk = normalize_types(chunk.dropna(how='all'))
+        keep = seen.first_seen(chunk[row_keys(chunk)])
+        # One bit per raw row is enough to replay the same selection in pass 2
+        keep_masks.append(np.packbits(keep))
+        for col in POLLUTANT_COLS:
+            if col in chunk.columns:
+                sketches.setdefault(col, QuantileSketch()).add(chunk.loc[keep, col].to_numpy())
+        if method == 'iqr' and find_date_col(chunk) is not None:
+            outliers.add_to_sketches(group_sketches, chunk[keep])
+        if numeric == 'seasonal_median' and find_date_col(chunk) is not None:
+            outliers.add_to_sketches(median_sketches, chunk[keep], group_cols=config.IMPUTATION_GROUP_COLUMNS)
+    del seen
+    medians = {col: sketch.median() for col, sketch in sketches.items()}
+    seasonal_medians = {col: sketch.quantiles([0.5])[0.5] for col, sketch in median_sketches.items()}
+    fence_frames = outliers.fences(*outliers.sketch_quartiles(group_sketches)) if group_sketches else None
+    outlier_counts = None
+
+    # Pass 2: keep the same rows, fill missing values and write chunk by chunk
+    writer = DatasetWriter(filename.replace(".csv", ""))
+    state = ingestion.IngestState.reset(filename.replace(".csv", ""))
+    state.fences = fence_frames
+    cube = None
+    csv_path = os.path.join(PROCESSED_PATH, filename.replace(".csv", "_cleaned.csv"))
+    rows_out = 0
+    for i, chunk in enumerate(pd.read_csv(raw_file, chunksize=chunksize, dtype=CSV_DTYPES)):
+        chunk = normalize_types(chunk.dropna(how='all'))
+        keep = np.unpackbits(keep_masks[i], count=len(chunk)).astype(bool)
+        chunk = chunk[keep]
+        if method is not None and find_date_col(chunk) is not None:
+            mask = outliers.detect(chunk, method, fence_frames=fence_frames)
+            outlier_counts = outliers.merge_counts(outlier_counts, outliers.count_outliers(chunk, mask))
+            chunk = outliers.apply(chunk, mask)
+        if numeric in ('interpolate', 'ffill'):
+            chunk = impute(chunk)
+        elif seasonal_medians:
+            chunk = fill_grouped_medians(chunk, seasonal_medians)
+        else:
+            chunk = chunk.fillna(medians)
+        chunk = derive_aqi(chunk)
+        date_col = find_date_col(chunk)
+        if date_col is not None:
+            chunk = chunk.sort_values(date_col)
+        writer.write(chunk)
+        if date_col is not None:
+            cube = build_cube(chunk) if cube is None else merge_cubes(cube, build_cube(chunk))
+            state.update(chunk)
+        if export_csv:
+            chunk.to_csv(csv_path, index=False, mode='w' if i == 0 else 'a', header=i == 0)
+        rows_out += len(chunk)
+    path = writer.close()
+    save_outlier_report(outlier_counts, fence_frames, filename, method)
+    if cube is not None:
+        write_cube(cube, filename.replace(".csv", ""))
+        state.save(raw_file, offset)
+    print(f"Saved cleaned dataset: {path}")
+    print(f"Summary: {{'dataset': '{filename.replace('.csv', '')}', 'rows': {rows_out}, 'chunks': {len(keep_masks)}}}")
+
+    return {'file': filename, 'rows_in': rows_in, 'rows_out': rows_out, 'parts': len(keep_masks),
+            'seconds': time.perf_counter() - start}
+
+def clean_with_context(new, filename, fence_frames=None):
+    """
+    Clean newly ingested rows together with the config.INGEST_CONTEXT of
+    stored history before them, so rolling outlier bands, interpolation and
+    AQI windows see the preceding readings, and return just the new rows.
+    IQR fences are the `fence_frames` of the last full clean (kept in the
+    ingest state); stored rows are already clean, so only new values are masked.
+    """
+    name = filename.replace(".csv", "")
+    date_col = find_date_col(new)
+    stations = sorted(new['Station'].astype(str).unique()) if 'Station' in new.columns else None
+    context = load(name, cities=sorted(new['City'].astype(str).unique()), stations=stations,
+                   start=new[date_col].min() - pd.Timedelta(config.INGEST_CONTEXT))
+    combined = pd.concat([f for f in (context, new) if len(f)], ignore_index=True)
+    is_new = np.r_[np.zeros(len(context), dtype=bool), np.ones(len(new), dtype=bool)]
+    combined = apply_schema(combined)
+
+    method = outlier_method(filename)
+    if method is not None:
+        mask = outliers.detect(combined, method, fence_frames=fence_frames)
+        mask.loc[~is_new] = False
+        print(f"Outliers ({method}): {int(mask.to_numpy().sum())} new readings "
+              f"{'masked' if config.OUTLIER_ACTION == 'mask' else 'flagged'}")
+        combined = outliers.apply(combined, mask)
+
+    order = np.argsort(combined[date_col].to_numpy(), kind='stable')
+    combined, is_new = combined.iloc[order].reset_index(drop=True), is_new[order]
+    combined = derive_aqi(fill_missing(combined))
+    return combined[is_new].reset_index(drop=True)
+
+@instrumented("clean")
+def clean_file_incremental(filename, export_csv=False):
+    """
+    Clean only the rows appended to a raw file since the last run and append
+    them to the store, the cube and the rollups fed by the dataset. Rows at or
+    before their station's watermark or already in the key index are skipped
+    (see ingestion.py). Files without ingest state are cleaned in full.
+    """
+    start = time.perf_counter()
+    name = filename.replace(".csv", "")
+    raw_file = os.path.join(RAW_PATH, filename)
+    if not os.path.exists(raw_file):
+        print(f"Skipping {filename}: not found in {RAW_PATH}")
+        return None
+    state = ingestion.IngestState.load(name)
+    if state is None or not dataset_exists(name):
+        print(f"No ingest state for {filename}, cleaning it in full")
+        return clean_file(filename, export_csv)
+    if outlier_method(filename) == 'iqr' and state.fences is None:
+        print(f"No outlier fences for {filename}, cleaning it in full")
+        return clean_file(filename, export_csv)
+
+    frames, offset = ingestion.read_new_rows(raw_file, state)
+    rows_in, late, repeated, parts = 0, 0, 0, []
+    for chunk in frames:
+        rows_in += len(chunk)
+        chunk = normalize_types(chunk.dropna(how='all'))
+        past = state.past_watermark(chunk)
+        fresh = state.keys.first_seen(chunk[past])
+        late += int((~past).sum())
+        repeated += int((~fresh).sum())
+        parts.append(chunk[past][fresh])
+    parts = [p for p in parts if len(p)]
+    if late or repeated:
+        print(f"{filename}: skipped {late} rows at or before their station's watermark, "
+              f"{repeated} already stored")
+    if not parts:
+        state.save(raw_file, offset)
+        print(f"{filename}: no new rows")
+        return {'file': filename, 'rows_in': rows_in, 'rows_out': 0, 'parts': 0,
+                'seconds': time.perf_counter() - start}
+
+    print(f"Ingesting {filename}...")
+    new = clean_with_context(pd.concat(parts, ignore_index=True), filename, state.fences)
+    partitions = append_dataset(new, name)
+    append_rows(name, new)
+    print(f"Appended {len(new)} rows to {name} ({len(partitions)} partitions)")
+    targets = rollup.targets_fed_by(name)
+    if targets:
+        for target, count in rollup.refresh(rollup.touched_days(new), targets).items():
+            print(f"Updated {target}: {count} rows")
+    if export_csv:
+        csv_path = os.path.join(PROCESSED_PATH, filename.replace(".csv", "_cleaned.csv"))
+        new.to_csv(csv_path, index=False, mode='a', header=not os.path.exists(csv_path))
+
+    state.update(new)
+    state.save(raw_file, offset)
+    return {'file': filename, 'rows_in': rows_in, 'rows_out': len(new), 'parts': len(parts),
+            'seconds': time.perf_counter() - start}
+
+def print_timings(results):
+    """Print the per-file timing and row-count summary."""
+    print("\nFile                 Rows in    Rows out   Parts  Seconds")
+    for r in results:
+        print(f"{r['file']:<18} {r['rows_in']:>9} {r['rows_out']:>11} {r['parts']:>7} {r['seconds']:>8.2f}")
+
+def main(argv=None):
     """Main function to clean all files in the list."""
-    for f in files:
-        clean_file(f)
+    parser = argparse.ArgumentParser(description="Clean raw air quality files into the processed store.")
+    parser.add_argument("--csv", action="store_true", help="also export *_cleaned.csv files")
+    parser.add_argument("--workers", type=int, default=config.CLEAN_WORKERS,
+                        help="worker processes; 1 cleans files one after another (default: %(default)s)")
+    parser.add_argument("--shards", type=int, default=None,
+                        help="shards of whole stations per large file (default: number of workers)")
+    parser.add_argument("--stream", action="store_true",
+                        help="clean files one chunk at a time to bound memory use")
+    parser.add_argument("--chunksize", type=int, default=config.CLEAN_CHUNK_ROWS,
+                        help="rows per chunk in --stream mode (default: %(default)s)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only clean rows appended to the raw files since the last run")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    results = []
+    if args.incremental:
+        for f in files:
+            results.append(clean_file_incremental(f, export_csv=args.csv))
+    elif args.stream:
+        for f in files:
+            results.append(clean_file_streaming(f, args.chunksize, export_csv=args.csv))
+    elif args.workers <= 1:
+        for f in files:
+            results.append(clean_file(f, export_csv=args.csv))
+    else:
+        shards = args.shards or args.workers
+        min_bytes = config.CLEAN_SHARD_MIN_MB * 1024 * 1024
+        large = [f for f in files if os.path.exists(os.path.join(RAW_PATH, f))
+                 and os.path.getsize(os.path.join(RAW_PATH, f)) >= min_bytes]
+
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            # Small files are cleaned whole on the pool while I shard the large ones here
+            futures = [pool.submit(clean_file, f, args.csv) for f in files if f not in large]
+            for f in large:
+                results.append(clean_file_sharded(f, pool, shards, export_csv=args.csv))
+            results.extend(fut.result() for fut in futures)
+
+    results = [r for r in results if r is not None]
+    results.sort(key=lambda r: files.index(r['file']))
+    print_timings(results)
+    print(f"Total: {time.perf_counter() - start:.2f}s")
 
 if __name__ == "__main__":
+    start_run()
     main()
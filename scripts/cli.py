@@ -0,0 +1,119 @@
+# I wrote this as the one entry point for every script:
+#
+#   python -m scripts top_cities --by aqi
+#   python -m scripts clean --incremental
+#   python -m scripts run seasonal report     (run_all.py)
+#   python -m scripts shell                   (read commands from stdin)
+#
+# Commands are the pipeline stage names (pipeline.py) plus run, benchmark and
+# synthetic; dashes and underscores are interchangeable. Only the module of the
+# chosen command is imported, and the scripts import sklearn, scipy,
+# statsmodels, plotly, seaborn and PIL inside the functions that use them, so
+# a command never pays for libraries it does not touch. `shell` keeps one
+# process alive across commands, so imports and the loader cache are shared.
+import argparse
+import os
+import shlex
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.instrument import stage, start_run
+from scripts.pipeline import STAGES, call_main
+
+COMMANDS = {stage["name"]: stage["module"] for stage in STAGES}
+COMMANDS.update({"run": "run_all", "benchmark": "benchmark", "synthetic": "synthetic_data"})
+
+DESCRIPTIONS = {
+    "clean": "clean raw files into the processed store",
+    "rollup": "derive station_day, city_hour and city_day from station_hour",
+    "trends": "PM2.5 trend per dataset",
+    "trends_enhanced": "trends, seasonal ANOVA and correlations",
+    "stations": "monitoring stations per city",
+    "seasonal": "seasonal means per pollutant",
+    "exceedance": "NAAQS averages and exceedance days",
+    "dashboard": "interactive comparison of the top cities",
+    "city_years": "yearly AQI of the top cities",
+    "top_cities": "rank the most polluted cities",
+    "hotspots": "cluster cities by pollution",
+    "station_clusters": "cluster stations by pollution profile",
+    "forecast": "forecast daily AQI and PM2.5",
+    "missing_values": "missing value summary and heatmap",
+    "interactive": "interactive HTML charts",
+    "memory": "memory use of every dataset",
+    "report": "PDF of the generated figures",
+    "run": "run the pipeline (run_all.py)",
+    "benchmark": "time the pipeline on synthetic data",
+    "synthetic": "generate a synthetic station_hour.csv",
+}
+
+
+def command_module(name):
+    """Module of a command name (dashes or underscores), or None if unknown."""
+    return COMMANDS.get(name.replace("-", "_"))
+
+
+def run_command(argv):
+    """Run one command line (command name and its options); returns an exit code."""
+    name, args = argv[0], argv[1:]
+    module = command_module(name)
+    if module is None:
+        print(f"Unknown command '{name}'. Choose from: {', '.join(COMMANDS)}")
+        return 2
+    # The script's own parser and the timeline then name it as if it was run directly
+    saved_argv, sys.argv = sys.argv, [os.path.join(os.path.dirname(__file__), module + ".py")] + args
+    try:
+        with stage(module, "stage", script=module):
+            result = call_main(module, args)
+    except SystemExit as e:
+        # argparse exits on --help and bad options
+        if isinstance(e.code, str):
+            print(e.code)
+            return 2
+        return e.code or 0
+    finally:
+        sys.argv = saved_argv
+    return result if isinstance(result, int) else 0
+
+
+def shell(stream=sys.stdin):
+    """Run one command per line until end of input, 'exit' or 'quit'."""
+    interactive = stream.isatty()
+    status = 0
+    while True:
+        if interactive:
+            print("aq> ", end="", flush=True)
+        line = stream.readline()
+        if not line:
+            break
+        argv = shlex.split(line, comments=True)
+        if not argv:
+            continue
+        if argv[0] in ("exit", "quit"):
+            break
+        start = time.perf_counter()
+        status = run_command(argv)
+        print(f"[{argv[0]}: exit {status}, {time.perf_counter() - start:.2f}s]")
+    return status
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    commands = "\n".join(f"  {name:<17} {DESCRIPTIONS.get(name, '')}" for name in COMMANDS)
+    parser = argparse.ArgumentParser(
+        prog="python -m scripts", description="Air quality analysis commands.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=f"commands:\n{commands}\n  {'shell':<17} read commands from stdin, one per line\n\n"
+               "Options after the command go to it, e.g. python -m scripts top_cities --help")
+    parser.add_argument("command", help="command to run (see below)")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.command == "shell":
+        return shell()
+    return run_command([args.command] + args.args)
+
+if __name__ == "__main__":
+    start_run()
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# I wrote this module to get pollutant correlation matrices without loading a
+# whole dataset. The processed store is read batch by batch and every batch is
+# folded into CorrelationAccumulator objects (see streaming_stats.py), one for
+# the whole dataset and one per group (City, Station, season ...), all in the
+# same pass. With workers > 1 the files are split between processes and the
+# partial accumulators are merged at the end.
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import config
+from scripts import processed_store
+from scripts.calendar_features import calendar_features
+from scripts.schema import CSV_DTYPES, apply_schema
+from scripts.streaming_stats import CorrelationAccumulator
+
+OVERALL = ("All",)
+
+
+def _batches(name, columns, files=None):
+    if processed_store.dataset_exists(name):
+        yield from processed_store.iter_batches(name, columns, files=files)
+        return
+    # Datasets only available as a cleaned CSV are read in chunks too
+    path = processed_store.legacy_csv_path(name)
+    for chunk in pd.read_csv(path, usecols=lambda c: c in columns, chunksize=config.CLEAN_CHUNK_ROWS,
+                             dtype=CSV_DTYPES):
+        yield apply_schema(chunk)
+
+
+def _available_columns(name):
+    if processed_store.dataset_exists(name):
+        return processed_store.read_metadata(name)["columns"]
+    return list(pd.read_csv(processed_store.legacy_csv_path(name), nrows=0).columns)
+
+
+def _add_season(batch, date_col):
+    batch["season"] = calendar_features(batch[date_col], ["season"])["season"]
+    return batch
+
+
+def _accumulate(name, columns, groupings, files=None):
+    """Fold the batches of a dataset into {(grouping, key): accumulator}."""
+    needed = set(c for grouping in groupings for c in grouping if c != "season")
+    seasonal = any("season" in grouping for grouping in groupings)
+    date_col = next((c for c in config.DATE_COLUMNS if c in _available_columns(name)), None)
+    if seasonal:
+        if date_col is None:
+            raise ValueError(f"Dataset '{name}' has no date column to derive seasons from")
+        needed.add(date_col)
+    results = {}
+    for batch in _batches(name, list(columns) + sorted(needed), files):
+        if seasonal:
+            batch = _add_season(batch, date_col)
+        for grouping in groupings:
+            if not grouping:
+                results.setdefault(((), OVERALL), CorrelationAccumulator(columns)).add(batch)
+                continue
+            for key, part in batch.groupby(list(grouping), observed=True):
+                key = key if isinstance(key, tuple) else (key,)
+                results.setdefault((grouping, key), CorrelationAccumulator(columns)).add(part)
+    return results
+
+
+def _merge(partials):
+    merged = {}
+    for part in partials:
+        for key, acc in part.items():
+            if key in merged:
+                merged[key].merge(acc)
+            else:
+                merged[key] = acc
+    return merged
+
+
+def stream_correlations(name, by=(), columns=None, workers=1):
+    """
+    Pairwise-complete Pearson correlations of the pollutants of a dataset.
+    `by` lists groupings, e.g. [("City",), ("season",)]; the overall matrix is
+    always included. Returns {(grouping, key): accumulator}, where the overall
+    entry is ((), ("All",)). Call .corr() on an accumulator for the matrix.
+    """
+    available = _available_columns(name)
+    columns = [c for c in (columns or config.POLLUTANTS) if c in available]
+    groupings = [()] + [tuple([g] if isinstance(g, str) else g) for g in by]
+
+    if workers <= 1 or not processed_store.dataset_exists(name):
+        return _accumulate(name, columns, groupings)
+
+    files = processed_store.dataset_files(name)
+    chunks = [list(part) for part in np.array_split(np.array(files, dtype=object), min(workers, len(files)))]
+    with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+        partials = pool.map(_accumulate, [name] * len(chunks), [columns] * len(chunks),
+                            [groupings] * len(chunks), chunks)
+        return _merge(partials)
+
+
+def overall_corr(name, columns=None, workers=1):
+    """Overall pollutant correlation matrix of a dataset, computed in one streaming pass."""
+    return stream_correlations(name, columns=columns, workers=workers)[((), OVERALL)].corr()
+
+
+def to_long(results):
+    """Flatten {(grouping, key): accumulator} into one row per group and pollutant pair."""
+    rows = []
+    for (grouping, key), acc in results.items():
+        group = "overall" if not grouping else ", ".join(grouping)
+        label = ", ".join(str(k) for k in key)
+        r = acc.corr().to_numpy()
+        i, j = np.triu_indices(len(acc.columns), k=1)
+        for a, b in zip(i, j):
+            rows.append({"grouping": group, "group": label, "pollutant1": acc.columns[a],
+                         "pollutant2": acc.columns[b], "n": int(acc.n[a, b]), "r": r[a, b]})
+    return pd.DataFrame(rows)
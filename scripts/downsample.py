@@ -0,0 +1,130 @@
+# I wrote this module to keep the interactive HTML files small. A browser does
+# not need more points per line than the screen has pixels, so every trace is
+# reduced to config.PLOT_MAX_POINTS points with Largest-Triangle-Three-Buckets
+# (keeps the visual shape) or min/max per bucket (keeps every peak). Time
+# series are also pre-aggregated to day/week/month means, and the page gets
+# buttons to switch between those resolutions. plotly.js is written once as
+# visuals/plotly.min.js and shared by all pages instead of being embedded.
+
+import numpy as np
+import pandas as pd
+
+import config
+
+METHODS = ("lttb", "minmax")
+
+
+def _as_float(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ns]").astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+
+def lttb(x, y, n_out):
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets.
+    The first and last points are always kept; from every bucket in between
+    the point forming the largest triangle with the previously kept point and
+    the mean of the next bucket is chosen.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    xf, yf = _as_float(x), np.asarray(y, dtype=np.float64)
+    edges = np.floor(np.linspace(1, n - 1, n_out - 1)).astype(np.int64)
+    # Mean of each bucket (the last one is the final point itself)
+    starts, ends = edges[:-1], edges[1:]
+    sums_x = np.add.reduceat(xf[:n - 1], starts)
+    sums_y = np.add.reduceat(yf[:n - 1], starts)
+    counts = (ends - starts).clip(min=1)
+    avg_x = np.r_[sums_x / counts, xf[-1]]
+    avg_y = np.r_[sums_y / counts, yf[-1]]
+
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for b in range(len(starts)):
+        lo, hi = starts[b], max(ends[b], starts[b] + 1)
+        cx, cy = avg_x[b + 1], avg_y[b + 1]
+        area = np.abs((xf[a] - cx) * (yf[lo:hi] - yf[a]) - (xf[a] - xf[lo:hi]) * (cy - yf[a]))
+        a = lo + int(np.argmax(area))
+        kept[b + 1] = a
+    return kept
+
+
+def minmax(y, n_out):
+    """Indices of the smallest and largest point of each of n_out / 2 buckets, in order."""
+    n = len(y)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+    buckets = n_out // 2
+    bucket = np.arange(n) * buckets // n
+    frame = pd.DataFrame({"y": np.asarray(y, dtype=np.float64), "bucket": bucket})
+    lows = frame.groupby("bucket")["y"].idxmin().dropna()
+    highs = frame.groupby("bucket")["y"].idxmax().dropna()
+    return np.unique(np.r_[lows.to_numpy(), highs.to_numpy()].astype(np.int64))
+
+
+def downsample(x, y, n_out=None, method=None):
+    """Reduce one trace to at most n_out points; NaN values are dropped first."""
+    n_out = n_out or config.PLOT_MAX_POINTS
+    method = method or config.PLOT_DOWNSAMPLE_METHOD
+    if method not in METHODS:
+        raise ValueError(f"Unknown downsampling method '{method}'. Choose from: {', '.join(METHODS)}")
+    x, y = np.asarray(x), np.asarray(y, dtype=np.float64)
+    valid = ~np.isnan(y)
+    x, y = x[valid], y[valid]
+    idx = lttb(x, y, n_out) if method == "lttb" else minmax(y, n_out)
+    return x[idx], y[idx]
+
+
+def resample_levels(df, date_col, value_col, group_col=None, levels=None):
+    """
+    Mean of `value_col` per group at every resolution in `levels`
+    ({label: pandas frequency}, default config.PLOT_RESOLUTIONS).
+    Returns {label: frame with date_col, group_col and value_col}.
+    """
+    levels = levels or config.PLOT_RESOLUTIONS
+    keys = [group_col] if group_col else []
+    result = {}
+    for label, freq in levels.items():
+        period = df[date_col].dt.to_period(freq).dt.start_time
+        grouped = df.groupby(keys + [period], observed=True)[value_col].mean().dropna().reset_index()
+        result[label] = grouped.sort_values(keys + [date_col], kind="stable")
+    return result
+
+
+def multi_resolution_figure(df, date_col, value_col, group_col=None, title=None, n_out=None, method=None):
+    """
+    Line chart with one trace per group and resolution, each downsampled to
+    the point budget, and buttons to show one resolution at a time.
+    """
+    import plotly.graph_objects as go
+    levels = resample_levels(df, date_col, value_col, group_col)
+    labels = list(levels)
+    fig = go.Figure()
+    trace_level = []
+    for i, label in enumerate(labels):
+        frame = levels[label]
+        groups = frame.groupby(group_col, observed=True) if group_col else [(value_col, frame)]
+        for group, part in groups:
+            x, y = downsample(part[date_col].to_numpy(), part[value_col].to_numpy(), n_out, method)
+            fig.add_trace(go.Scattergl(x=x, y=y, mode="lines", name=str(group), legendgroup=str(group),
+                                       visible=i == 0))
+            trace_level.append(label)
+
+    buttons = [dict(label=label, method="update",
+                    args=[{"visible": [lvl == label for lvl in trace_level]},
+                          {"title": f"{title} — {label.lower()} means" if title else label}])
+               for label in labels]
+    fig.update_layout(title=f"{title} — {labels[0].lower()} means" if title else None,
+                      updatemenus=[dict(type="buttons", direction="right", buttons=buttons,
+                                        x=1, xanchor="right", y=1.15, yanchor="top")])
+    return fig
+
+
+def write_html(fig, path):
+    """Write a figure that loads plotly.js from a shared plotly.min.js next to it."""
+    fig.write_html(path, include_plotlyjs="directory", full_html=True)
+    return path
@@ -0,0 +1,179 @@
+# scripts/exceedance.py
+# I wrote this script to compute the metrics regulators actually look at
+# instead of plain means: 24-hour averages of PM2.5, PM10, NO2, SO2 and NH3,
+# daily maxima of 8-hour O3 and CO averages, and the number of days per city
+# (and station) and year above the NAAQS limits in config.NAAQS_LIMITS.
+#
+# Rolling windows are computed per station over station_hour with the sorted
+# cumulative-sum windows of aqi.rolling_means. City days without hourly data fall
+# back to the daily means in city_day (24-hour pollutants only, an 8-hour
+# maximum cannot be recovered from a daily mean). Everything is written to
+# the processed store:
+#   station_hour_rolling     trailing 24h / 8h means per station and hour
+#   station_daily_metrics    NAAQS metric per station and day
+#   city_daily_metrics       the same per city and day (mean over stations)
+#   station_exceedance_days  days and exceedance days per station, year, pollutant
+#   city_exceedance_days     the same per city; pollutant "any" counts days
+#                            on which at least one pollutant exceeded its limit
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import config
+from scripts import processed_store
+from scripts.aqi import MIN_COVERAGE, rolling_means
+from scripts.calendar_features import calendar_features
+from scripts.instrument import start_run
+from scripts.loader import load_dataset
+
+ANY = "any"
+STATION_KEYS = ["City", "Station"]
+CITY_KEYS = ["City"]
+
+
+def limits():
+    """{pollutant: limit} of config.NAAQS_LIMITS."""
+    return pd.Series({p: spec["limit"] for p, spec in config.NAAQS_LIMITS.items()}, dtype=np.float64)
+
+
+def window_columns(df):
+    """{hours: [pollutants]} for the NAAQS pollutants present in df."""
+    windows = {}
+    for pollutant, spec in config.NAAQS_LIMITS.items():
+        if pollutant in df.columns:
+            windows.setdefault(spec["hours"], []).append(pollutant)
+    return windows
+
+
+def rolling_metrics(hourly):
+    """Trailing NAAQS-window means per station, one <pollutant>_<hours>h column each."""
+    date_col = processed_store.find_date_col(hourly)
+    keys = [c for c in STATION_KEYS if c in hourly.columns]
+    result = hourly[keys + [date_col]].copy()
+    for hours, cols in window_columns(hourly).items():
+        means = rolling_means(hourly, hours, cols, group_cols=keys)
+        for col in cols:
+            result[f"{col}_{hours}h"] = means[col].astype(np.float32)
+    return result
+
+
+def daily_metrics(hourly, rolling):
+    """
+    NAAQS metric per station and calendar day: the day's mean for 24-hour
+    pollutants (with at least MIN_COVERAGE[24] readings) and the highest
+    8-hour rolling mean for 8-hour pollutants.
+    """
+    date_col = processed_store.find_date_col(hourly)
+    keys = [c for c in STATION_KEYS if c in hourly.columns]
+    by = [hourly[k] for k in keys] + [hourly[date_col].dt.normalize()]
+    parts = []
+    for hours, cols in window_columns(hourly).items():
+        if hours == 24:
+            grouped = hourly[cols].groupby(by, observed=True)
+            parts.append(grouped.mean().where(grouped.count() >= MIN_COVERAGE[24]))
+        else:
+            window = rolling[[f"{c}_{hours}h" for c in cols]].groupby(by, observed=True).max()
+            parts.append(window.set_axis(cols, axis=1))
+    daily = pd.concat(parts, axis=1)
+    return daily[[p for p in config.NAAQS_LIMITS if p in daily.columns]].astype(np.float32).reset_index()
+
+
+def city_daily_metrics(station_daily, city_day=None):
+    """
+    City value per day: the mean over the city's stations, and for days
+    without hourly data the 24-hour pollutants of city_day.
+    """
+    frames, date_col = [], None
+    if len(station_daily):
+        date_col = processed_store.find_date_col(station_daily)
+        cols = [p for p in config.NAAQS_LIMITS if p in station_daily.columns]
+        frames.append(station_daily.groupby(["City", date_col], observed=True)[cols].mean().reset_index())
+    if city_day is not None and len(city_day):
+        day_col = processed_store.find_date_col(city_day)
+        fallback = city_day[["City", day_col] + window_columns(city_day).get(24, [])].copy()
+        fallback[day_col] = fallback[day_col].dt.normalize()
+        date_col = date_col or day_col
+        frames.append(fallback.rename(columns={day_col: date_col}))
+    if not frames:
+        return pd.DataFrame()
+    # Days covered by hourly data keep the station-based value
+    combined = pd.concat(frames, ignore_index=True).drop_duplicates(["City", date_col], keep="first")
+    combined["City"] = combined["City"].astype("category")
+    return combined.sort_values(date_col, kind="stable").reset_index(drop=True)
+
+
+def exceedance_days(daily, keys):
+    """
+    Days with a valid metric and days above the limit per key, year and
+    pollutant; pollutant "any" counts days on which any pollutant exceeded.
+    """
+    date_col = processed_store.find_date_col(daily)
+    cols = [p for p in config.NAAQS_LIMITS if p in daily.columns]
+    values = daily[cols]
+    valid = values.notna()
+    exceeded = values.gt(limits()[cols], axis=1)
+    valid[ANY] = valid.any(axis=1)
+    exceeded[ANY] = exceeded.any(axis=1)
+
+    by = [daily[k] for k in keys] + [calendar_features(daily[date_col], ["year"])["year"]]
+    counts = pd.concat({"days": valid.groupby(by, observed=True).sum().stack(),
+                        "exceedance_days": exceeded.groupby(by, observed=True).sum().stack()}, axis=1)
+    counts.index = counts.index.set_names(keys + ["year", "pollutant"])
+    counts = counts.astype("int32").reset_index()
+    counts["share"] = counts["exceedance_days"] / counts["days"].where(counts["days"] > 0)
+    return counts[counts["days"] > 0].reset_index(drop=True)
+
+
+def rank_cities(pollutant=ANY, name="city_exceedance_days"):
+    """
+    Mean exceedance days per year for every city, most polluted first, or
+    None when the exceedance table has not been built yet.
+    """
+    if not processed_store.dataset_exists(name):
+        return None
+    table = processed_store.read_dataset(name)
+    table = table[table["pollutant"] == pollutant]
+    if table.empty:
+        return None
+    ranking = table.groupby("City", observed=True)["exceedance_days"].mean()
+    return ranking.rename("exceedance_days_per_year").sort_values(ascending=False)
+
+
+def main():
+    wanted = list(config.NAAQS_LIMITS)
+    station_daily = pd.DataFrame()
+    if processed_store.dataset_exists("station_hour"):
+        print("Loading: station_hour")
+        hourly = load_dataset("station_hour", columns=STATION_KEYS + config.DATE_COLUMNS + wanted)
+        rolling = rolling_metrics(hourly)
+        print("Saved:", processed_store.write_dataset(rolling, "station_hour_rolling"))
+        station_daily = daily_metrics(hourly, rolling)
+        del hourly, rolling
+        print("Saved:", processed_store.write_dataset(station_daily, "station_daily_metrics"))
+        station_table = exceedance_days(station_daily, STATION_KEYS)
+        print("Saved:", processed_store.write_dataset(station_table, "station_exceedance_days"))
+
+    city_day = None
+    if processed_store.dataset_exists("city_day") or os.path.exists(processed_store.legacy_csv_path("city_day")):
+        print("Loading: city_day")
+        city_day = load_dataset("city_day", columns=CITY_KEYS + config.DATE_COLUMNS + wanted)
+    city_daily = city_daily_metrics(station_daily, city_day)
+    if city_daily.empty:
+        print("No station_hour or city_day data. Exiting.")
+        return
+    print("Saved:", processed_store.write_dataset(city_daily, "city_daily_metrics"))
+    city_table = exceedance_days(city_daily, CITY_KEYS)
+    print("Saved:", processed_store.write_dataset(city_table, "city_exceedance_days"))
+
+    ranking = rank_cities()
+    if ranking is not None:
+        print("\nMost NAAQS exceedance days per year (any pollutant):")
+        print(ranking.head(10).round(1).to_string())
+
+if __name__ == "__main__":
+    start_run()
+    main()
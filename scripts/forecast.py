@@ -0,0 +1,244 @@
+# scripts/forecast.py
+# I wrote this script to forecast daily AQI and PM2.5 for every city (and with
+# --stations, every station) config.FORECAST_PERIOD days ahead.
+#
+# Each series is a SARIMAX(1,0,1) model with a constant and Fourier terms of the
+# yearly cycle as regressors, which captures the seasonal shape without a
+# 365-day seasonal ARIMA. Series are fitted on a process pool. A fit is cached
+# with a hash of the last days it saw; when those days are unchanged the
+# next fit starts from the cached parameters and needs a few iterations. Fits
+# are checked against config.FORECAST_TIME_BUDGET after every optimizer
+# iteration; series whose fit has not finished when it runs out fall back to a
+# day-of-year climatology so every series still gets a forecast. Forecasts and
+# their confidence intervals are written to the processed store as "forecasts".
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import config
+from scripts.instrument import start_run
+from scripts.loader import load_dataset
+from scripts.processed_store import find_date_col, write_dataset
+
+OUTPUT = os.path.join(config.OUTPUT_DIR, "")
+os.makedirs(OUTPUT, exist_ok=True)
+
+CACHE_FILE = config.FORECAST_CACHE_FILE
+TARGETS = ["AQI", "PM2.5"]
+ORDER = (1, 0, 1)
+YEAR_DAYS = 365.25
+# Days before the cached last date that must be unchanged to warm-start
+OVERLAP_DAYS = 90
+
+
+class OutOfTime(Exception):
+    """Raised from the optimizer callback once the forecast deadline has passed."""
+
+
+def fourier_terms(dates, harmonics=None):
+    """sin/cos of the yearly cycle for each date (one column pair per harmonic)."""
+    harmonics = harmonics or config.FORECAST_FOURIER_TERMS
+    t = (pd.DatetimeIndex(dates) - pd.Timestamp("2000-01-01")).days.to_numpy(dtype=np.float64)
+    return np.column_stack([f(2 * np.pi * k * t / YEAR_DAYS) for k in range(1, harmonics + 1)
+                            for f in (np.sin, np.cos)])
+
+
+def daily_series(df, keys, target, date_col):
+    """{key tuple: daily series of `target`} over the last config.FORECAST_HISTORY_DAYS days."""
+    series = {}
+    grouped = df.groupby(keys + [pd.Grouper(key=date_col, freq="D")], observed=True)[target].mean()
+    for key, s in grouped.groupby(level=keys if len(keys) > 1 else keys[0], observed=True):
+        s = s.droplevel(keys).asfreq("D").astype(np.float64)
+        s = s.iloc[-config.FORECAST_HISTORY_DAYS:]
+        if s.notna().sum() >= config.FORECAST_MIN_DAYS:
+            series[key if isinstance(key, tuple) else (key,)] = s
+    return series
+
+
+def history_hash(series, last=None):
+    """sha256 of the OVERLAP_DAYS days up to `last` (default: the end of the series)."""
+    series = series.loc[:last].iloc[-OVERLAP_DAYS:]
+    h = hashlib.sha256()
+    h.update(series.index.asi8.tobytes())
+    h.update(np.nan_to_num(series.to_numpy(), nan=-1e300).tobytes())
+    return h.hexdigest()
+
+
+def climatology(series, horizon, confidence):
+    """Fallback forecast: mean and spread of the same day of year in the history."""
+    from scipy import stats
+    future = pd.date_range(series.index[-1] + pd.Timedelta(days=1), periods=horizon, freq="D")
+    doy = series.groupby(series.index.dayofyear)
+    mean = doy.mean().reindex(future.dayofyear).to_numpy()
+    mean = np.where(np.isnan(mean), series.mean(), mean)
+    z = stats.norm.ppf(0.5 + confidence / 2)
+    spread = z * series.std()
+    return future, mean, mean - spread, mean + spread
+
+
+def fit_series(job):
+    """
+    Fit (or warm-start) one SARIMAX model and forecast. Runs in a worker.
+    Returns a dict with the forecast arrays and the parameters to cache.
+    """
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    start = time.perf_counter()
+    series, horizon, confidence = job["series"], job["horizon"], job["confidence"]
+    if time.time() > job["deadline"]:
+        return {"key": job["key"], "status": "out of time", "seconds": 0.0}
+
+    exog = fourier_terms(series.index)
+    future = pd.date_range(series.index[-1] + pd.Timedelta(days=1), periods=horizon, freq="D")
+    model = SARIMAX(series.to_numpy(), exog=exog, order=ORDER, trend="c")
+    warm = job["start_params"] is not None
+
+    def check_deadline(params):
+        if time.time() > job["deadline"]:
+            raise OutOfTime()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            fitted = model.fit(disp=False, start_params=job["start_params"], callback=check_deadline,
+                               maxiter=config.FORECAST_WARM_MAXITER if warm else config.FORECAST_MAXITER)
+        except OutOfTime:
+            return {"key": job["key"], "status": "out of time", "seconds": time.perf_counter() - start}
+        except Exception as e:
+            return {"key": job["key"], "status": f"failed: {type(e).__name__}: {e}",
+                    "seconds": time.perf_counter() - start}
+        forecast = fitted.get_forecast(horizon, exog=fourier_terms(future))
+        interval = forecast.conf_int(alpha=1 - confidence)
+
+    return {"key": job["key"], "status": "warm" if warm else "fitted", "seconds": time.perf_counter() - start,
+            "dates": future, "mean": forecast.predicted_mean, "lower": interval[:, 0], "upper": interval[:, 1],
+            "params": fitted.params.tolist(), "aic": float(fitted.aic)}
+
+
+def load_cache():
+    if os.path.exists(CACHE_FILE):
+        with open(CACHE_FILE) as fh:
+            return json.load(fh)
+    return {}
+
+
+def save_cache(cache):
+    os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+    tmp = CACHE_FILE + ".tmp"
+    with open(tmp, "w") as fh:
+        json.dump(cache, fh, indent=1, sort_keys=True)
+    os.replace(tmp, CACHE_FILE)
+
+
+def _cache_key(level, key, target):
+    return "|".join([level, *map(str, key), target])
+
+
+def _start_params(entry, series):
+    """Cached parameters if the days they were last fitted up to are unchanged."""
+    if not entry:
+        return None
+    last = pd.Timestamp(entry["last_date"])
+    if last not in series.index or history_hash(series, last) != entry["history_hash"]:
+        return None
+    return np.asarray(entry["params"])
+
+
+def run_forecasts(level="City", targets=TARGETS, workers=None, budget=None, horizon=None, confidence=None):
+    """
+    Forecast every series of the given level ('City' or 'Station').
+    Returns (forecast frame, per-series summary frame).
+    """
+    workers = workers or config.FORECAST_WORKERS
+    budget = config.FORECAST_TIME_BUDGET if budget is None else budget
+    horizon = horizon or config.FORECAST_PERIOD
+    confidence = confidence or config.FORECAST_CONFIDENCE
+    dataset = "city_day" if level == "City" else "station_day"
+    keys = ["City"] if level == "City" else ["City", "Station"]
+
+    df = load_dataset(dataset, columns=keys + config.DATE_COLUMNS + targets)
+    date_col = find_date_col(df)
+    targets = [t for t in targets if t in df.columns] if date_col is not None else []
+    cache = load_cache()
+    deadline = time.time() + budget
+
+    jobs, series_by_key = [], {}
+    for target in targets:
+        for key, series in daily_series(df, keys, target, date_col).items():
+            ck = _cache_key(level, key, target)
+            series_by_key[ck] = (key, target, series)
+            jobs.append({"key": ck, "series": series, "horizon": horizon, "confidence": confidence,
+                         "deadline": deadline, "start_params": _start_params(cache.get(ck), series)})
+    # Cold fits first: they take longest
+    jobs.sort(key=lambda job: job["start_params"] is not None)
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            results = list(pool.map(fit_series, jobs))
+    else:
+        results = [fit_series(job) for job in jobs]
+
+    frames, summary = [], []
+    for result in results:
+        key, target, series = series_by_key[result["key"]]
+        if "mean" in result:
+            dates, mean, lower, upper = result["dates"], result["mean"], result["lower"], result["upper"]
+            model_name = "sarimax"
+            cache[result["key"]] = {"params": result["params"], "last_date": str(series.index[-1]),
+                                    "history_hash": history_hash(series)}
+        else:
+            dates, mean, lower, upper = climatology(series, horizon, confidence)
+            model_name = "climatology"
+        frame = pd.DataFrame({"Datetime": dates, "target": target, "forecast": mean,
+                              "lower": lower, "upper": upper, "model": model_name})
+        for col, value in zip(keys, key):
+            frame.insert(0, col, value)
+        frames.append(frame)
+        summary.append(dict(zip(keys, key), target=target, model=model_name, status=result["status"],
+                            days=int(series.notna().sum()), last_date=series.index[-1].date(),
+                            seconds=round(result["seconds"], 2)))
+    save_cache(cache)
+
+    forecasts = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    return forecasts, pd.DataFrame(summary)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Forecast daily AQI and PM2.5 per city (or station).")
+    parser.add_argument("--stations", action="store_true", help="forecast every station instead of every city")
+    parser.add_argument("--workers", type=int, default=config.FORECAST_WORKERS,
+                        help="worker processes (default: %(default)s)")
+    parser.add_argument("--budget", type=float, default=config.FORECAST_TIME_BUDGET,
+                        help="seconds for all fits; unfinished fits fall back to climatology (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    level = "Station" if args.stations else "City"
+    start = time.perf_counter()
+    forecasts, summary = run_forecasts(level, workers=args.workers, budget=args.budget)
+    if forecasts.empty:
+        print("Not enough data to forecast.")
+        return
+
+    name = "forecasts" if level == "City" else "station_forecasts"
+    path = write_dataset(forecasts, name)
+    print(f"Saved {len(forecasts)} forecast rows ({config.FORECAST_PERIOD} days, "
+          f"{config.FORECAST_CONFIDENCE:.0%} intervals): {path}")
+    out = OUTPUT + f"{name}_summary.csv"
+    summary.to_csv(out, index=False)
+    print("Saved:", out)
+    print(summary["status"].value_counts().to_string())
+    print(f"Total: {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    start_run()
+    main()
@@ -1,10 +1,14 @@
 # scripts/generate_report.py
 import os
-from matplotlib.backends.backend_pdf import PdfPages
-from PIL import Image
+import sys
 
-VISUALS = "../visuals/"
-OUTPUT = "../output/"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from scripts.instrument import start_run
+
+VISUALS = os.path.join(config.VISUALS_DIR, "")
+OUTPUT = os.path.join(config.OUTPUT_DIR, "")
 os.makedirs(OUTPUT, exist_ok=True)
 
 # list of images to include (common outputs from other scripts)
@@ -37,6 +41,9 @@ def make_pdf(out_pdf="air_quality_report.pdf"):
     if not img_paths:
         print("No images found in visuals/. Run analysis scripts first.")
         return
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+    from PIL import Image
     out_path = os.path.join(OUTPUT, out_pdf)
     print("Creating PDF:", out_path)
     with PdfPages(out_path) as pdf:
@@ -57,6 +64,9 @@ def make_pdf(out_pdf="air_quality_report.pdf"):
                 print("Skipping:", p, "due to", e)
     print("Saved PDF:", out_path)
 
-if __name__ == "__main__":
-    import matplotlib.pyplot as plt
+def main():
     make_pdf()
+
+if __name__ == "__main__":
+    start_run()
+    main()
@@ -0,0 +1,130 @@
+# I wrote this module so the seasonal tests do not need the raw rows. One-way
+# ANOVA, Tukey HSD (Tukey-Kramer for unequal group sizes) and Games-Howell only
+# depend on the count, mean and variance of each group, so they are computed
+# from those aggregates: either one grouped pass over a frame (moments()) or
+# straight from an aggregate cube (cube_moments()). Many tests, e.g. every
+# City x pollutant pair, are run at once as arrays of shape (tests, groups).
+
+import numpy as np
+import pandas as pd
+
+from scripts.aggregate_cube import summarize
+
+# The studentized range distribution is slow to evaluate for finite degrees of
+# freedom; above this it is within 1e-3 of its limit, which is used instead
+LARGE_DF = 1000
+
+
+def moments(df, by, group, columns):
+    """
+    Count, mean and variance of each column per (by..., group), in long form:
+    one row per test key, group and column with columns n, mean, var.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    grouped = df.groupby(by + [group], observed=True)[columns]
+    agg = pd.concat({"n": grouped.count(), "mean": grouped.mean(), "var": grouped.var()}, axis=1)
+    long = agg.stack(level=1, future_stack=True).reset_index()
+    return long.rename(columns={f"level_{len(by) + 1}": "pollutant"})
+
+
+def cube_moments(cube, by, group, columns):
+    """Same layout as moments(), answered from an aggregate cube (aggregate_cube.py)."""
+    by = [by] if isinstance(by, str) else list(by)
+    summary = summarize(cube, by + [group], columns, stats=("count", "mean", "std"))
+    long = summary.stack(level=0, future_stack=True).reset_index()
+    long = long.rename(columns={f"level_{len(by) + 1}": "pollutant", "count": "n", "std": "var"})
+    long["var"] = long["var"] ** 2
+    return long[by + [group, "pollutant", "n", "mean", "var"]]
+
+
+def _to_arrays(long, keys, group):
+    """Pivot long moments into (tests, groups) arrays; missing groups get n=0."""
+    wide = long.pivot_table(index=keys, columns=group, values=["n", "mean", "var"], observed=True, aggfunc="first")
+    groups = list(wide["n"].columns)
+    n = wide["n"].fillna(0).to_numpy(dtype=np.float64)
+    mean = wide["mean"].to_numpy(dtype=np.float64)
+    var = wide["var"].to_numpy(dtype=np.float64)
+    # A group with fewer than 2 readings has no variance and is left out
+    n[~(n >= 2) | np.isnan(var)] = 0
+    return wide.index, groups, n, np.where(n > 0, mean, 0.0), np.where(n > 0, var, 0.0)
+
+
+def _range_sf(q, k, df):
+    """Survival function of the studentized range for arrays of q, k and df."""
+    from scipy import stats
+    q, k, df = np.broadcast_arrays(np.asarray(q, float), np.asarray(k, float), np.asarray(df, float))
+    out = np.full(q.shape, np.nan)
+    ok = np.isfinite(q) & (k >= 2) & (df > 0)
+    large = ok & (df >= LARGE_DF)
+    small = ok & ~large
+    if large.any():
+        out[large] = stats.studentized_range.sf(q[large], k[large], np.inf)
+    if small.any():
+        out[small] = stats.studentized_range.sf(q[small], k[small], df[small])
+    return np.clip(out, 0, 1)
+
+
+def anova(long, keys, group):
+    """
+    One-way ANOVA of `group` for every test key (e.g. City and pollutant).
+    Returns one row per test with k (groups), N, F and p_value.
+    """
+    from scipy import stats
+    index, _, n, mean, var = _to_arrays(long, keys, group)
+    k = (n > 0).sum(axis=1)
+    total = n.sum(axis=1)
+    grand = np.divide((n * mean).sum(axis=1), total, out=np.full(len(n), np.nan), where=total > 0)
+
+    ss_between = (n * (mean - grand[:, None]) ** 2).sum(axis=1)
+    ss_within = ((n - 1).clip(min=0) * var).sum(axis=1)
+    df_between, df_within = k - 1, total - k
+    valid = (k >= 2) & (df_within > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        f_stat = np.where(valid, (ss_between / df_between) / (ss_within / df_within), np.nan)
+    p_value = np.where(valid, stats.f.sf(f_stat, df_between, df_within), np.nan)
+
+    result = pd.DataFrame({"k": k, "N": total.astype(np.int64), "F": f_stat, "p_value": p_value},
+                          index=index).reset_index()
+    return result
+
+
+def posthoc(long, keys, group, method="tukey", alpha=0.05):
+    """
+    Pairwise comparisons between the groups of every test.
+    method 'tukey'         Tukey-Kramer HSD with the pooled within-group variance.
+           'games-howell'  no equal-variance assumption (Welch degrees of freedom).
+    Returns one row per test key and pair with meandiff (group2 - group1),
+    p_adj and reject, like statsmodels' pairwise_tukeyhsd summary.
+    """
+    if method not in ("tukey", "games-howell"):
+        raise ValueError(f"Unknown post-hoc method '{method}'. Choose 'tukey' or 'games-howell'.")
+    index, groups, n, mean, var = _to_arrays(long, keys, group)
+    k = (n > 0).sum(axis=1)
+    df_within = n.sum(axis=1) - k
+    ms_within = np.divide(((n - 1).clip(min=0) * var).sum(axis=1), df_within,
+                          out=np.full(len(n), np.nan), where=df_within > 0)
+
+    i, j = np.triu_indices(len(groups), k=1)
+    present = (n[:, i] > 0) & (n[:, j] > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        diff = mean[:, j] - mean[:, i]
+        if method == "tukey":
+            se = np.sqrt(ms_within[:, None] / 2 * (1 / n[:, i] + 1 / n[:, j]))
+            dof = np.broadcast_to(df_within[:, None], diff.shape)
+        else:
+            a, b = var[:, i] / n[:, i], var[:, j] / n[:, j]
+            se = np.sqrt((a + b) / 2)
+            dof = (a + b) ** 2 / (a ** 2 / (n[:, i] - 1) + b ** 2 / (n[:, j] - 1))
+        q = np.abs(diff) / se
+    p_adj = np.where(present, _range_sf(q, k[:, None], dof), np.nan)
+
+    result = pd.DataFrame({
+        "group1": np.tile(np.asarray(groups, dtype=object)[i], len(n)),
+        "group2": np.tile(np.asarray(groups, dtype=object)[j], len(n)),
+        "meandiff": diff.ravel(),
+        "p_adj": p_adj.ravel(),
+    })
+    result["reject"] = result["p_adj"] < alpha
+    keys_frame = index.to_frame(index=False).loc[np.repeat(np.arange(len(n)), len(i))].reset_index(drop=True)
+    result = pd.concat([keys_frame, result], axis=1)
+    return result[present.ravel()].reset_index(drop=True)
@@ -0,0 +1,143 @@
+# I wrote this module to fill missing pollutant readings the way
+# config.IMPUTATION_METHODS asks, per City/Station and along time, instead of
+# using one global median for every city and year.
+#
+# Rows are sorted once by (group, time). After that every method is a handful
+# of whole-column NumPy operations: the position of the previous/next valid
+# reading within the same group comes from running max/min accumulations, so
+# there is no Python loop over groups.
+
+import numpy as np
+import pandas as pd
+
+import config
+from scripts.calendar_features import calendar_features
+from scripts.schema import find_date_col
+
+POLLUTANT_COLS = config.POLLUTANTS
+NUMERIC_METHODS = ("interpolate", "ffill", "seasonal_median", "median")
+
+
+def _group_codes(df, group_cols):
+    if not group_cols:
+        return np.zeros(len(df), dtype=np.int64)
+    return df.groupby(group_cols, observed=True, sort=False).ngroup().to_numpy()
+
+
+def _neighbours(valid, group_start, group_end):
+    """
+    For sorted rows, return the index of the previous and next valid reading
+    (or -1 where there is none inside the same group).
+    """
+    n = len(valid)
+    idx = np.arange(n)
+    prev = np.maximum.accumulate(np.where(valid, idx, -1))
+    nxt = np.minimum.accumulate(np.where(valid, idx, n)[::-1])[::-1]
+    prev = np.where(prev >= group_start, prev, -1)
+    nxt = np.where(nxt <= group_end, nxt, -1)
+    return prev, nxt
+
+
+def _fill_along_time(values, times, prev, nxt, method, max_gap):
+    missing = np.isnan(values)
+    out = values.copy()
+    has_prev = prev >= 0
+    p = np.where(has_prev, prev, 0)
+
+    if method == "ffill":
+        fill = missing & has_prev & (times - times[p] <= max_gap)
+        out[fill] = values[p[fill]]
+        return out
+
+    # Linear in time between the surrounding readings, if they are close enough
+    has_next = nxt >= 0
+    q = np.where(has_next, nxt, 0)
+    span = times[q] - times[p]
+    fill = missing & has_prev & has_next & (span <= max_gap)
+    weight = np.divide(times - times[p], span, out=np.zeros(len(values)), where=span > 0)
+    out[fill] = values[p[fill]] + (values[q[fill]] - values[p[fill]]) * weight[fill]
+    return out
+
+
+def impute(df, method=None, max_gap=None, group_cols=None, columns=None, categorical=None, medians=None):
+    """
+    Fill missing pollutant values in `df` (returns a new frame).
+
+    method       'interpolate' (linear in time), 'ffill' (carry last reading
+                 forward), 'seasonal_median' (median of the same group and
+                 calendar month) or 'median' (global column median).
+                 Defaults to config.IMPUTATION_METHODS['numeric'].
+    max_gap      longest gap (pandas Timedelta string) bridged by interpolate
+                 and ffill; readings further from valid data stay NaN.
+    group_cols   columns that identify one time series, e.g. City/Station.
+    categorical  'mode' fills AQI_Bucket with the most common bucket of the group.
+    medians      {column: value} used by 'median' instead of the medians of df
+                 (e.g. whole-file medians when df is one shard of a file).
+    """
+    method = method or config.IMPUTATION_METHODS.get("numeric", "interpolate")
+    categorical = categorical if categorical is not None else config.IMPUTATION_METHODS.get("categorical")
+    if method not in NUMERIC_METHODS:
+        raise ValueError(f"Unknown imputation method '{method}'. Choose from: {', '.join(NUMERIC_METHODS)}")
+
+    group_cols = [c for c in (group_cols or config.IMPUTATION_GROUP_COLUMNS) if c in df.columns]
+    columns = [c for c in (columns or POLLUTANT_COLS) if c in df.columns]
+    date_col = find_date_col(df)
+    df = df.copy()
+    if df.empty:
+        return df
+
+    if method == "median" or (date_col is None and method != "seasonal_median"):
+        for col in columns:
+            median = medians[col] if medians is not None and col in medians else df[col].median()
+            df[col] = df[col].fillna(median)
+    elif method == "seasonal_median":
+        keys = [df[c] for c in group_cols]
+        if date_col is not None:
+            keys.append(calendar_features(df[date_col], ["month"])["month"])
+        for col in columns:
+            if keys:
+                df[col] = df[col].fillna(df.groupby(keys, observed=True)[col].transform("median"))
+            else:
+                df[col] = df[col].fillna(df[col].median())
+    else:
+        codes = _group_codes(df, group_cols)
+        times = df[date_col].to_numpy().astype("datetime64[ns]").astype(np.int64)
+        order = np.lexsort((times, codes))
+        codes_s, times_s = codes[order], times[order]
+
+        # First and last sorted position of each row's group
+        n = len(df)
+        idx = np.arange(n)
+        changes = codes_s[1:] != codes_s[:-1]
+        group_start = np.maximum.accumulate(np.where(np.r_[True, changes], idx, 0))
+        group_end = np.minimum.accumulate(np.where(np.r_[changes, True], idx, n - 1)[::-1])[::-1]
+        gap = pd.Timedelta(max_gap or config.IMPUTATION_MAX_GAP).value
+
+        for col in columns:
+            values = df[col].to_numpy(dtype=np.float64)[order]
+            valid = ~np.isnan(values)
+            prev, nxt = _neighbours(valid, group_start, group_end)
+            filled = np.empty(n)
+            filled[order] = _fill_along_time(values, times_s, prev, nxt, method, gap)
+            df[col] = filled.astype(df[col].dtype) if df[col].dtype.kind == "f" else filled
+
+    if categorical == "mode" and "AQI_Bucket" in df.columns and df["AQI_Bucket"].isna().any():
+        df["AQI_Bucket"] = _fill_mode(df, "AQI_Bucket", group_cols)
+    return df
+
+
+def _fill_mode(df, col, group_cols):
+    """Fill a categorical column with the most frequent value of each group."""
+    if not group_cols:
+        modes = df[col].mode()
+        return df[col].fillna(modes.iloc[0]) if len(modes) else df[col]
+    counts = df.groupby(group_cols + [col], observed=True).size().rename("n").reset_index()
+    top = counts.sort_values("n", ascending=False, kind="stable").drop_duplicates(group_cols)
+    mode = df[group_cols].merge(top[group_cols + [col]], on=group_cols, how="left")[col]
+    return df[col].fillna(pd.Series(mode.to_numpy(), index=df.index))
+
+
+def missing_counts(df, columns=None):
+    """Number of missing values per pollutant column."""
+    columns = [c for c in (columns or POLLUTANT_COLS) if c in df.columns]
+    return df[columns].isna().sum()
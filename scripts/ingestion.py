@@ -0,0 +1,243 @@
+# I wrote this module so clean_data.py --incremental only has to look at the
+# rows appended to a raw file since the last run. For every dataset it keeps,
+# under config.INGEST_STATE_DIR/<dataset>/:
+#
+#   state.json   the byte offset up to which the raw file has been consumed
+#                (with a hash of the bytes just before it, to notice files
+#                that were rewritten rather than appended to) and a
+#                watermark: the last Datetime ingested per City/Station
+#   keys/*.npy   a key index: sorted 64-bit hashes of the (City, Station,
+#                date) keys already in the store, one file per month, so
+#                checking new rows only loads the months they fall in
+#   fences.parquet  the IQR outlier fences per group, month and pollutant of
+#                the full clean, so new rows are judged against the whole
+#                history rather than the few days of context loaded with them
+#
+# A full clean records this state; an incremental run reads from the offset,
+# drops rows at or before their station's watermark and rows whose key is
+# already indexed, and moves the offset and watermarks forward.
+
+import hashlib
+import io
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import config
+from scripts.processed_store import find_date_col
+from scripts.schema import CSV_DTYPES
+from scripts.streaming_stats import KeySet
+
+STATE_DIR = config.INGEST_STATE_DIR
+WATERMARK_KEYS = ["City", "Station"]
+# Bytes before the offset that must be unchanged for the offset to be trusted
+TAIL_BYTES = 4096
+
+
+def state_path(name):
+    return os.path.join(STATE_DIR, name)
+
+
+def _tail_hash(path, offset):
+    with open(path, "rb") as fh:
+        fh.seek(max(0, offset - TAIL_BYTES))
+        return hashlib.sha256(fh.read(min(offset, TAIL_BYTES))).hexdigest()
+
+
+def row_keys(df):
+    """Key frame (City, Station, date) with stable dtypes, so hashes match between runs."""
+    date_col = find_date_col(df)
+    keys = pd.DataFrame({c: df[c].astype(str).to_numpy() for c in WATERMARK_KEYS if c in df.columns})
+    keys[date_col] = df[date_col].to_numpy().astype("datetime64[ns]")
+    return keys
+
+
+def _watermark_groups(keys):
+    """
+    Group code of every row and the City|Station label of each group (just
+    City for city-level datasets). Columns are factorized and their codes
+    combined, so labels are only built once per group, not per row.
+    """
+    cols = [c for c in WATERMARK_KEYS if c in keys.columns]
+    codes = np.zeros(len(keys), dtype=np.int64)
+    uniques = []
+    for col in cols:
+        col_codes, col_uniques = pd.factorize(keys[col])
+        codes = codes * len(col_uniques) + col_codes
+        uniques.append(np.asarray(col_uniques, dtype=str))
+    groups, row_groups = np.unique(codes, return_inverse=True)
+    labels = []
+    for group in groups:
+        parts = []
+        for col_uniques in reversed(uniques):
+            group, code = divmod(group, len(col_uniques))
+            parts.append(col_uniques[code])
+        labels.append("|".join(reversed(parts)))
+    return row_groups, labels
+
+
+class KeyIndex:
+    """On-disk key index split by month; months are loaded when first needed."""
+
+    def __init__(self, name):
+        self.dir = os.path.join(state_path(name), "keys")
+        self.months = {}
+        self.dirty = set()
+
+    def _month(self, month):
+        if month not in self.months:
+            keyset = KeySet()
+            path = os.path.join(self.dir, f"{month}.npy")
+            if os.path.exists(path):
+                keyset.keys = np.load(path)
+            self.months[month] = keyset
+        return self.months[month]
+
+    def first_seen(self, df):
+        """Mask of rows whose key is neither indexed nor repeated earlier in df; adds them."""
+        keys = row_keys(df)
+        date_col = find_date_col(keys)
+        hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+        # Rows grouped by calendar month; only the month names are formatted
+        months = keys[date_col].to_numpy().astype("datetime64[M]")
+        unique_months, row_months = np.unique(months, return_inverse=True)
+        order = np.argsort(row_months, kind="stable")
+        bounds = np.searchsorted(row_months[order], np.arange(len(unique_months) + 1))
+        mask = np.zeros(len(df), dtype=bool)
+        for i, month in enumerate(unique_months):
+            rows = order[bounds[i]:bounds[i + 1]]
+            month = str(month)
+            seen = self._month(month)
+            before = len(seen)
+            mask[rows] = seen.first_seen_hashes(hashes[rows])
+            if len(seen) != before:
+                self.dirty.add(month)
+        return mask
+
+    def save(self):
+        os.makedirs(self.dir, exist_ok=True)
+        for month in self.dirty:
+            path = os.path.join(self.dir, f"{month}.npy")
+            tmp = path + ".tmp.npy"
+            np.save(tmp, self.months[month].keys)
+            os.replace(tmp, path)
+        self.dirty = set()
+
+
+def _save_fences(path, fence_frames):
+    lower, upper = fence_frames
+    names = list(lower.index.names) + ["pollutant"]
+    long = pd.concat({"lower": lower.stack(), "upper": upper.stack()}, axis=1).rename_axis(names)
+    long.reset_index().to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+
+
+def _load_fences(path):
+    """(lower, upper) frames as outliers.fences() returns them, or None if none were saved."""
+    if not os.path.exists(path):
+        return None
+    long = pd.read_parquet(path)
+    keys = [c for c in long.columns if c not in ("pollutant", "lower", "upper")]
+    fence_frames = long.set_index(keys + ["pollutant"])[["lower", "upper"]].unstack("pollutant")
+    return fence_frames["lower"], fence_frames["upper"]
+
+
+class IngestState:
+    """Offset, watermarks, key index and IQR outlier fences of one dataset."""
+
+    def __init__(self, name, offset=0, tail_hash=None, watermarks=None, fences=None):
+        self.name = name
+        self.offset = offset
+        self.tail_hash = tail_hash
+        self.watermarks = watermarks or {}
+        self.fences = fences
+        self.keys = KeyIndex(name)
+
+    @classmethod
+    def load(cls, name):
+        """Stored state of a dataset, or None if it has never been cleaned with state."""
+        path = os.path.join(state_path(name), "state.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as fh:
+            state = json.load(fh)
+        return cls(name, state["offset"], state["tail_hash"], state["watermarks"],
+                   _load_fences(os.path.join(state_path(name), "fences.parquet")))
+
+    @classmethod
+    def reset(cls, name):
+        """Empty state for a full clean (drops the old key index)."""
+        if os.path.exists(state_path(name)):
+            shutil.rmtree(state_path(name))
+        return cls(name)
+
+    def past_watermark(self, df):
+        """Mask of rows later than the watermark of their station."""
+        keys = row_keys(df)
+        date_col = find_date_col(keys)
+        row_groups, labels = _watermark_groups(keys)
+        marks = pd.to_datetime(pd.Series([self.watermarks.get(label) for label in labels], dtype=object))
+        marks = marks.to_numpy()[row_groups]
+        return np.isnat(marks) | (keys[date_col].to_numpy() > marks)
+
+    def update(self, df):
+        """Record ingested rows: add their keys and move the watermarks forward."""
+        if df.empty:
+            return
+        self.keys.first_seen(df)
+        keys = row_keys(df)
+        date_col = find_date_col(keys)
+        row_groups, labels = _watermark_groups(keys)
+        latest = keys[date_col].groupby(row_groups).max()
+        for group, value in latest.items():
+            key = labels[group]
+            if key not in self.watermarks or pd.Timestamp(self.watermarks[key]) < value:
+                self.watermarks[key] = value.isoformat()
+
+    def save(self, raw_file, offset):
+        """Write the state, with `offset` the raw-file position consumed so far."""
+        self.offset = offset
+        self.tail_hash = _tail_hash(raw_file, offset)
+        self.keys.save()
+        os.makedirs(state_path(self.name), exist_ok=True)
+        if self.fences is not None:
+            _save_fences(os.path.join(state_path(self.name), "fences.parquet"), self.fences)
+        path = os.path.join(state_path(self.name), "state.json")
+        with open(path + ".tmp", "w") as fh:
+            json.dump({"offset": self.offset, "tail_hash": self.tail_hash, "watermarks": self.watermarks},
+                      fh, indent=1, sort_keys=True)
+        os.replace(path + ".tmp", path)
+
+
+def complete_size(raw_file):
+    """Size of the raw file up to its last complete line (a partly written line is left for later)."""
+    size = os.path.getsize(raw_file)
+    with open(raw_file, "rb") as fh:
+        fh.seek(max(0, size - TAIL_BYTES))
+        tail = fh.read()
+    return size - len(tail) + tail.rfind(b"\n") + 1
+
+
+def read_new_rows(raw_file, state, chunksize=None):
+    """
+    Return (frames, offset): the raw rows appended since the stored offset and
+    the offset to store once they are ingested. If the file was rewritten
+    instead of appended to, frames are chunks of the whole file and the
+    watermarks and key index decide which rows are new.
+    """
+    end = complete_size(raw_file)
+    appended = 0 < state.offset <= end and _tail_hash(raw_file, state.offset) == state.tail_hash
+    if not appended:
+        print(f"{os.path.basename(raw_file)} was rewritten, scanning it against the watermarks")
+        return pd.read_csv(raw_file, chunksize=chunksize or config.CLEAN_CHUNK_ROWS, dtype=CSV_DTYPES), end
+    if end == state.offset:
+        return [], end
+
+    header = list(pd.read_csv(raw_file, nrows=0).columns)
+    with open(raw_file, "rb") as fh:
+        fh.seek(state.offset)
+        data = fh.read(end - state.offset)
+    return [pd.read_csv(io.BytesIO(data), names=header, header=None, dtype=CSV_DTYPES)], end
@@ -0,0 +1,389 @@
+# I wrote this module to see which script and which step dominates a run.
+# The load, clean, aggregate, plot and save steps are wrapped with the
+# `instrumented` decorator or the `stage` context manager, which record per call:
+#
+#   wall_s, cpu_s        perf_counter and process_time (all threads of the process)
+#   peak_rss_mb          highest resident memory during the step (VmHWM, reset at
+#                        each step start on Linux; else the process peak so far)
+#   rows_in, rows_out    length of the first DataFrame argument and of the result
+#   read_mb, written_mb  bytes read and written by the process (/proc/self/io)
+#
+# Nothing is recorded until an entry point (run_all.py, cli.py or a script run
+# directly) calls start_run(), so importing these modules as a library has no
+# side effects. Records are then appended as they finish to
+# <TIMELINE_DIR>/<run id>/events-<pid>.jsonl, so steps run in pool workers are
+# kept too. Child processes inherit the run id through AIR_QUALITY_RUN_ID; the
+# process that started the run writes timeline.json and summary.csv next to
+# them on exit and prints the summary.
+# With config.PROFILE set to 'cprofile' or 'pyinstrument' every outermost step
+# is also profiled into the run's profiles/ directory.
+#
+#   @instrumented("clean")
+#   def clean_frame(df): ...
+#
+#   with stage("render_jobs", "plot", jobs=len(jobs)) as record:
+#       ...
+#       record["rows_out"] = rendered
+#
+#   if __name__ == "__main__":
+#       start_run()
+#       main()
+
+import atexit
+import csv
+import functools
+import json
+import logging
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import config
+
+RUN_ENV = "AIR_QUALITY_RUN_ID"
+SUMMARY_COLUMNS = ["script", "step", "kind", "calls", "wall_s", "cpu_s", "peak_rss_mb",
+                   "rows_in", "rows_out", "read_mb", "written_mb"]
+MB = 1024 * 1024
+
+# Open steps of this process, innermost last
+_stack = []
+_stack_pid = os.getpid()
+# (script, step, depth) a forked worker was started in, so its steps nest under it
+_forked_from = None
+
+
+def _script_name():
+    path = sys.argv[0] if sys.argv and sys.argv[0] else "python"
+    name = os.path.splitext(os.path.basename(path))[0]
+    if name == "__main__":
+        # python -m scripts: name the run after the package
+        name = os.path.basename(os.path.dirname(path))
+    return name if name not in ("", "-c") else "python"
+
+
+def _new_run_id():
+    return f"{datetime.now():%Y%m%d_%H%M%S}_{_script_name()}_{os.getpid()}"
+
+
+# The process that started the run owns it and writes the report when it exits
+_owner_pid = None
+
+
+def start_run():
+    """
+    Record the steps of this process (and of the processes it starts) and
+    report them at exit. Only entry points call this; inside a run that was
+    started by a parent process it does nothing.
+    """
+    global _owner_pid
+    if not config.INSTRUMENT or RUN_ENV in os.environ:
+        return
+    os.environ[RUN_ENV] = _new_run_id()
+    _owner_pid = os.getpid()
+    atexit.register(_report_at_exit)
+
+
+def recording():
+    """True inside a run started with start_run()."""
+    return config.INSTRUMENT and RUN_ENV in os.environ
+
+
+def run_id():
+    return os.environ.get(RUN_ENV)
+
+
+def run_dir(run=None):
+    """Directory holding the events, timeline and profiles of a run (default: this one)."""
+    return os.path.join(config.TIMELINE_DIR, run or run_id())
+
+
+def setup_logging():
+    """Configure the root logger with config.LOG_LEVEL and config.LOG_FORMAT."""
+    logging.basicConfig(level=getattr(logging, config.LOG_LEVEL, logging.INFO), format=config.LOG_FORMAT)
+
+
+def _read_proc(path, fields):
+    """Integer values of `fields` in a /proc key: value file, or None off Linux."""
+    try:
+        with open(path) as fh:
+            lines = fh.read().splitlines()
+    except OSError:
+        return None
+    values = {}
+    for line in lines:
+        key, _, value = line.partition(":")
+        if key in fields:
+            values[key] = int(value.split()[0])
+    return values
+
+
+def _io_bytes():
+    values = _read_proc("/proc/self/io", ("rchar", "wchar"))
+    return (values["rchar"], values["wchar"]) if values else None
+
+
+def _process_peak_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / MB if sys.platform == "darwin" else peak / 1024
+
+
+def _high_water_mb():
+    """Peak RSS since the last reset, falling back to the peak of the whole process."""
+    values = _read_proc("/proc/self/status", ("VmHWM",))
+    return values["VmHWM"] / 1024 if values else _process_peak_mb()
+
+
+def _reset_high_water():
+    # Resets VmHWM for the whole process, which is why only entry points start runs
+    try:
+        with open("/proc/self/clear_refs", "w") as fh:
+            fh.write("5")
+    except OSError:
+        pass
+
+
+def _start_profiler():
+    """Start the profiler named by config.PROFILE; returns (kind, profiler) or None."""
+    kind = config.PROFILE
+    if not kind:
+        return None
+    try:
+        if kind == "pyinstrument":
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+        else:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+    except ImportError:
+        print("⚠ pyinstrument is not installed; set PROFILE = 'cprofile' or pip install pyinstrument")
+        config.PROFILE = None
+        return None
+    except ValueError as e:
+        # Another profiler is already active in this process
+        print(f"⚠ Not profiling: {e}")
+        return None
+    return kind, profiler
+
+
+def _stop_profiler(profiling, name):
+    """Stop a profiler and save its output; returns the file path."""
+    kind, profiler = profiling
+    folder = os.path.join(run_dir(), "profiles")
+    os.makedirs(folder, exist_ok=True)
+    base = os.path.join(folder, f"{name.replace('/', '_')}_{os.getpid()}_{time.time_ns()}")
+    if kind == "pyinstrument":
+        profiler.stop()
+        path = base + ".html"
+        with open(path, "w") as fh:
+            fh.write(profiler.output_html())
+    else:
+        profiler.disable()
+        path = base + ".prof"
+        profiler.dump_stats(path)
+    return path
+
+
+def _forget_inherited_steps():
+    """A forked worker inherits its parent's open steps; drop them (and their profilers)."""
+    global _stack_pid, _forked_from
+    if _stack_pid == os.getpid():
+        return
+    if _stack:
+        _forked_from = (_stack[0]["record"]["script"], _stack[-1]["record"]["name"], len(_stack))
+    for entry in _stack:
+        if entry["profiling"] is not None and entry["profiling"][0] == "cprofile":
+            entry["profiling"][1].disable()
+    _stack.clear()
+    _stack_pid = os.getpid()
+
+
+def _save_record(record):
+    folder = run_dir()
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, f"events-{os.getpid()}.jsonl"), "a") as fh:
+        fh.write(json.dumps(record) + "\n")
+
+
+@contextmanager
+def stage(name, kind="stage", **fields):
+    """
+    Record one step. Yields the record dict, so the caller can fill in
+    rows_in/rows_out or any other field before the step ends.
+    """
+    if not recording():
+        yield dict(fields)
+        return
+    _forget_inherited_steps()
+    # Fold the peak so far into the open steps before resetting the high-water mark
+    high_water = _high_water_mb()
+    for entry in _stack:
+        entry["peak"] = max(entry["peak"], high_water)
+    _reset_high_water()
+
+    if _stack:
+        parent = _stack[-1]["record"]
+        script, parent_name, depth = parent["script"], parent["name"], parent["depth"] + 1
+    else:
+        script, parent_name, depth = _forked_from or (_script_name(), None, 0)
+    record = {"name": name, "kind": kind, "script": script, "parent": parent_name, "depth": depth,
+              "pid": os.getpid(), "start": time.time(), "rows_in": None, "rows_out": None}
+    record.update(fields)
+    entry = {"record": record, "peak": 0.0, "profiling": None}
+    _stack.append(entry)
+    io_start = _io_bytes()
+    cpu_start = time.process_time()
+    if len(_stack) == 1:
+        entry["profiling"] = _start_profiler()
+    wall_start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record["wall_s"] = round(time.perf_counter() - wall_start, 4)
+        if entry["profiling"] is not None:
+            record["profile"] = _stop_profiler(entry["profiling"], name)
+        record["cpu_s"] = round(time.process_time() - cpu_start, 4)
+        io_end = _io_bytes()
+        if io_start is not None and io_end is not None:
+            record["read_mb"] = round((io_end[0] - io_start[0]) / MB, 3)
+            record["written_mb"] = round((io_end[1] - io_start[1]) / MB, 3)
+        peak = max(entry["peak"], _high_water_mb())
+        record["peak_rss_mb"] = round(peak, 1)
+        _stack.pop()
+        if _stack:
+            _stack[-1]["peak"] = max(_stack[-1]["peak"], peak)
+        try:
+            _save_record(record)
+        except OSError as e:
+            print(f"⚠ Could not save the timeline record of {name}: {e}")
+
+
+def _first_frame_len(args):
+    for arg in args:
+        if hasattr(arg, "columns") and hasattr(arg, "__len__"):
+            return len(arg)
+    return None
+
+
+def instrumented(kind, name=None):
+    """
+    Decorator form of stage(). rows_in is the length of the first DataFrame
+    argument, rows_out the length of a DataFrame result, and `target` the
+    first string argument (the dataset or file the step works on).
+    """
+    def decorate(func):
+        # Scripts run directly are __main__; name their steps after the file instead
+        module = os.path.splitext(os.path.basename(func.__globals__.get("__file__") or func.__module__))[0]
+        step = name or f"{module}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            target = next((a for a in args if isinstance(a, str)), None)
+            with stage(step, kind, target=target, rows_in=_first_frame_len(args)) as record:
+                result = func(*args, **kwargs)
+                if hasattr(result, "columns") and hasattr(result, "__len__"):
+                    record["rows_out"] = len(result)
+                return result
+        return wrapper
+    return decorate
+
+
+def load_records(run=None):
+    """Every record of a run (default: this one), from all of its processes, by start time."""
+    records = []
+    if not (run or run_id()):
+        return records
+    folder = run_dir(run)
+    if not os.path.isdir(folder):
+        return records
+    for filename in sorted(os.listdir(folder)):
+        if filename.startswith("events-") and filename.endswith(".jsonl"):
+            with open(os.path.join(folder, filename)) as fh:
+                records.extend(json.loads(line) for line in fh if line.strip())
+    return sorted(records, key=lambda r: r["start"])
+
+
+def summarize(records):
+    """One row per (script, step) with call count, summed time/rows/bytes and the highest peak."""
+    rows = {}
+    for r in records:
+        key = (r["script"], r["name"])
+        if key not in rows:
+            rows[key] = {"script": r["script"], "step": r["name"], "kind": r["kind"], "depth": r["depth"],
+                         "calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_rss_mb": 0.0,
+                         "rows_in": None, "rows_out": None, "read_mb": None, "written_mb": None}
+        row = rows[key]
+        row["depth"] = min(row["depth"], r["depth"])
+        row["calls"] += 1
+        row["wall_s"] += r.get("wall_s", 0.0)
+        row["cpu_s"] += r.get("cpu_s", 0.0)
+        row["peak_rss_mb"] = max(row["peak_rss_mb"], r.get("peak_rss_mb") or 0.0)
+        for field in ("rows_in", "rows_out", "read_mb", "written_mb"):
+            if r.get(field) is not None:
+                row[field] = (row[field] or 0) + r[field]
+    for row in rows.values():
+        for field in ("wall_s", "cpu_s", "read_mb", "written_mb"):
+            if row[field] is not None:
+                row[field] = round(row[field], 3)
+    # Keep the steps of each script together, scripts in the order they started
+    scripts = list(dict.fromkeys(r["script"] for r in records))
+    return sorted(rows.values(), key=lambda row: scripts.index(row["script"]))
+
+
+def print_summary(rows):
+    """Print the summary table; nested steps are indented under their parents (their time is included)."""
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else ""
+
+    print(f"\n{'Script':<22} {'Step':<42} {'Kind':<9} {'Calls':>5} {'Wall s':>8} {'CPU s':>8} "
+          f"{'Peak MB':>8} {'Rows in':>10} {'Rows out':>10} {'Read MB':>8} {'Wrote MB':>8}")
+    for r in rows:
+        step = "  " * r["depth"] + r["step"]
+        print(f"{r['script'][:22]:<22} {step[:42]:<42} {r['kind']:<9} {r['calls']:>5} {r['wall_s']:>8.2f} "
+              f"{r['cpu_s']:>8.2f} {r['peak_rss_mb']:>8.0f} {fmt(r['rows_in'], '>10')} "
+              f"{fmt(r['rows_out'], '>10')} {fmt(r['read_mb'], '>8.1f')} {fmt(r['written_mb'], '>8.1f')}")
+
+
+def write_report(run=None, verbose=True):
+    """Write timeline.json and summary.csv for a run and print the summary. Returns the timeline path."""
+    records = load_records(run)
+    if not records:
+        return None
+    folder = run_dir(run)
+    timeline = {
+        "run_id": run or run_id(),
+        "command": sys.argv,
+        "started": datetime.fromtimestamp(records[0]["start"]).isoformat(timespec="seconds"),
+        "wall_s": round(max(r["start"] + r.get("wall_s", 0.0) for r in records) - records[0]["start"], 3),
+        # Start offsets are relative to the first step, across all processes
+        "records": [dict(r, offset_s=round(r["start"] - records[0]["start"], 4)) for r in records],
+    }
+    path = os.path.join(folder, "timeline.json")
+    with open(path, "w") as fh:
+        json.dump(timeline, fh, indent=1)
+    rows = summarize(records)
+    with open(os.path.join(folder, "summary.csv"), "w", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=SUMMARY_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    if verbose:
+        print_summary(rows)
+        print(f"Timeline: {path}")
+    return path
+
+
+def _report_at_exit():
+    if os.getpid() != _owner_pid:
+        return
+    try:
+        write_report()
+    except OSError as e:
+        print(f"⚠ Could not write the run timeline: {e}")
@@ -1,96 +1,98 @@
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
 import logging
 
+import config
+from scripts.aggregate_cube import load_cube, summarize, value_columns
+from scripts.correlation import overall_corr
+from scripts.downsample import multi_resolution_figure, write_html
+from scripts.instrument import setup_logging, start_run
+from scripts.loader import load_dataset
+
 # Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+setup_logging()
 
-CLEAN_PATH = "../data/processed/"
-VIS_PATH = "../visuals/"
+VIS_PATH = os.path.join(config.VISUALS_DIR, "")
 
-def create_interactive_pm25_trend(filename):
+def create_interactive_pm25_trend(name):
     """Create interactive PM2.5 trend plot."""
-    df = pd.read_csv(CLEAN_PATH + filename)
+    df = load_dataset(name, columns=["City", "Datetime", "PM2.5"])
 
     if "Datetime" not in df.columns or "PM2.5" not in df.columns:
-        logging.warning(f"Required columns not found in {filename}. Skipping.")
+        logging.warning(f"Required columns not found in {name}. Skipping.")
         return
 
-    df['Datetime'] = pd.to_datetime(df['Datetime'])
     df = df.dropna(subset=['PM2.5'])
 
-    # Group by date and city if available
+    # Day/week/month means by city if available, downsampled per trace (see downsample.py)
     if "City" in df.columns:
-        daily_pm25 = df.groupby(['Datetime', 'City'])['PM2.5'].mean().reset_index()
-        fig = px.line(daily_pm25, x='Datetime', y='PM2.5', color='City',
-                      title=f'Interactive PM2.5 Trends by City ({filename})')
+        df['City'] = df['City'].astype(str)
+        fig = multi_resolution_figure(df, 'Datetime', 'PM2.5', 'City',
+                                      title=f'Interactive PM2.5 Trends by City ({name})')
     else:
-        daily_pm25 = df.groupby('Datetime')['PM2.5'].mean().reset_index()
-        fig = px.line(daily_pm25, x='Datetime', y='PM2.5',
-                      title=f'Interactive PM2.5 Trend ({filename})')
+        fig = multi_resolution_figure(df, 'Datetime', 'PM2.5',
+                                      title=f'Interactive PM2.5 Trend ({name})')
 
     fig.update_layout(xaxis_title='Date', yaxis_title='PM2.5')
-    out_path = VIS_PATH + filename.replace(".csv", "_pm25_trend_interactive.html")
-    fig.write_html(out_path)
+    out_path = VIS_PATH + f"{name}_cleaned_pm25_trend_interactive.html"
+    write_html(fig, out_path)
     logging.info(f"Saved interactive PM2.5 trend: {out_path}")
 
 def create_interactive_top_cities():
     """Create interactive bar chart of top polluted cities."""
-    df = pd.read_csv(CLEAN_PATH + "city_day_cleaned.csv")
+    cube = load_cube("city_day")
 
-    if "City" not in df.columns or "AQI" not in df.columns:
+    if "City" not in cube.columns or "AQI" not in value_columns(cube):
         logging.warning("Required columns not found. Skipping top cities chart.")
         return
 
-    top_cities = df.groupby("City")["AQI"].mean().sort_values(ascending=False).head(10).reset_index()
+    top_cities = summarize(cube, "City", ["AQI"])["AQI"].sort_values(ascending=False).head(10).reset_index()
+    top_cities["City"] = top_cities["City"].astype(str)
 
+    import plotly.express as px
     fig = px.bar(top_cities, x='City', y='AQI',
                  title='Top 10 Most Polluted Cities (Average AQI)',
                  color='AQI', color_continuous_scale='Reds')
     fig.update_layout(xaxis_title='City', yaxis_title='Average AQI')
 
     out_path = VIS_PATH + "top_polluted_cities_interactive.html"
-    fig.write_html(out_path)
+    write_html(fig, out_path)
     logging.info(f"Saved interactive top cities chart: {out_path}")
 
 def create_interactive_seasonal_trends():
     """Create interactive seasonal trends."""
-    df = pd.read_csv(CLEAN_PATH + "city_day_cleaned.csv")
+    cube = load_cube("city_day")
 
-    if "Datetime" not in df.columns or "PM2.5" not in df.columns:
+    if "PM2.5" not in value_columns(cube):
         logging.warning("Required columns not found. Skipping seasonal trends.")
         return
 
-    df['Datetime'] = pd.to_datetime(df['Datetime'])
-    df['Month'] = df['Datetime'].dt.month
-    df['Year'] = df['Datetime'].dt.year
-
-    monthly_pm25 = df.groupby(['Year', 'Month'])['PM2.5'].mean().reset_index()
+    monthly_pm25 = summarize(cube, ["year", "month"], ["PM2.5"]).reset_index()
+    monthly_pm25 = monthly_pm25.rename(columns={"year": "Year", "month": "Month"})
     monthly_pm25['Date'] = pd.to_datetime(monthly_pm25[['Year', 'Month']].assign(DAY=1))
 
+    import plotly.express as px
     fig = px.line(monthly_pm25, x='Date', y='PM2.5',
                   title='Seasonal PM2.5 Trends Over Years')
     fig.update_layout(xaxis_title='Date', yaxis_title='PM2.5')
 
     out_path = VIS_PATH + "seasonal_pm25_trends_interactive.html"
-    fig.write_html(out_path)
+    write_html(fig, out_path)
     logging.info(f"Saved interactive seasonal trends: {out_path}")
 
-def create_interactive_correlation_heatmap(filename):
-    """Create interactive correlation heatmap."""
-    df = pd.read_csv(CLEAN_PATH + filename)
+def create_interactive_correlation_heatmap(name):
+    """Create interactive correlation heatmap (streamed, so the dataset is never fully loaded)."""
+    corr_matrix = overall_corr(name)
 
-    pollutants = ['PM2.5', 'PM10', 'NO', 'NO2', 'NOx', 'NH3', 'CO', 'SO2', 'O3', 'Benzene', 'Toluene', 'Xylene']
-    available_pollutants = [p for p in pollutants if p in df.columns]
-
-    if len(available_pollutants) < 2:
+    if len(corr_matrix.columns) < 2:
         logging.warning("Not enough pollutants for correlation analysis.")
         return
 
-    corr_matrix = df[available_pollutants].corr()
-
+    import plotly.graph_objects as go
     fig = go.Figure(data=go.Heatmap(
         z=corr_matrix.values,
         x=corr_matrix.columns,
@@ -98,18 +100,19 @@ def create_interactive_correlation_heatmap(filename):
         colorscale='RdBu',
         zmid=0))
 
-    fig.update_layout(title=f'Interactive Pollutant Correlation Matrix ({filename})')
+    fig.update_layout(title=f'Interactive Pollutant Correlation Matrix ({name})')
 
-    out_path = VIS_PATH + filename.replace(".csv", "_correlation_interactive.html")
-    fig.write_html(out_path)
+    out_path = VIS_PATH + f"{name}_cleaned_correlation_interactive.html"
+    write_html(fig, out_path)
     logging.info(f"Saved interactive correlation heatmap: {out_path}")
 
 def main():
     # Create interactive visualizations for city_day data
-    create_interactive_pm25_trend("city_day_cleaned.csv")
+    create_interactive_pm25_trend("city_day")
     create_interactive_top_cities()
     create_interactive_seasonal_trends()
-    create_interactive_correlation_heatmap("city_day_cleaned.csv")
+    create_interactive_correlation_heatmap("city_day")
 
 if __name__ == "__main__":
+    start_run()
     main()
@@ -0,0 +1,75 @@
+# I wrote this module so all analysis scripts share one in-memory copy of each
+# processed dataset. Frames are read from the processed store once, kept in a
+# small LRU cache and handed out as copies, so running several scripts in the
+# same process (see run_all.py --in-process) only pays the read once.
+
+import os
+from collections import OrderedDict
+
+import config
+from scripts import processed_store
+
+# Number of datasets kept in memory at once
+CACHE_SIZE = config.LOADER_CACHE_SIZE
+
+# name -> (signature, frame, holds all columns), most recently used last
+_cache = OrderedDict()
+
+
+def _source_file(name):
+    """Return the file whose mtime/size identifies the current version of a dataset."""
+    if processed_store.dataset_exists(name):
+        return os.path.join(processed_store.dataset_path(name), processed_store.METADATA_FILE)
+    return processed_store.legacy_csv_path(name)
+
+
+def _signature(name):
+    path = _source_file(name)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (path, st.st_mtime_ns, st.st_size)
+
+
+def load_dataset(name, columns=None):
+    """
+    Return a typed DataFrame for a processed dataset (e.g. "city_day").
+    Results are cached and invalidated when the underlying file's mtime or size
+    changes. If the cached frame already holds the requested columns it is
+    sliced instead of re-read. Callers always get their own copy.
+    """
+    signature = _signature(name)
+    entry = _cache.get(name)
+
+    if entry is not None and entry[0] == signature:
+        df, complete = entry[1], entry[2]
+        if columns is None and complete:
+            _cache.move_to_end(name)
+            return df.copy()
+        if columns is not None and (complete or all(c in df.columns for c in columns)):
+            _cache.move_to_end(name)
+            return df[[c for c in columns if c in df.columns]].copy()
+        # Widen the cached frame to the union of both column sets
+        if columns is not None:
+            columns = list(dict.fromkeys(list(df.columns) + list(columns)))
+
+    df = processed_store.read_dataset(name, columns=columns)
+    _cache[name] = (signature, df, columns is None)
+    _cache.move_to_end(name)
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+
+    if columns is None:
+        return df.copy()
+    return df[[c for c in columns if c in df.columns]].copy()
+
+
+def clear_cache():
+    """Drop every cached dataset."""
+    _cache.clear()
+
+
+def cache_info():
+    """Return (name, rows, columns) for each cached dataset, least recently used first."""
+    return [(name, len(entry[1]), len(entry[1].columns)) for name, entry in _cache.items()]
@@ -0,0 +1,49 @@
+# scripts/memory_report.py
+# I wrote this script to check how much RAM each processed dataset takes once
+# loaded with the schema dtypes (see schema.py), compared with pandas' default
+# object/float64 columns. Bytes per row tell how many hourly rows fit on a node.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import config
+from scripts.instrument import start_run
+from scripts.loader import load_dataset
+from scripts.processed_store import list_datasets
+from scripts.schema import memory_report
+
+OUTPUT = os.path.join(config.OUTPUT_DIR, "")
+os.makedirs(OUTPUT, exist_ok=True)
+
+MB = 1024 * 1024
+
+def main():
+    names = list_datasets()
+    if not names:
+        print("No datasets in the processed store. Run clean_data.py first.")
+        return
+
+    reports = []
+    print(f"{'Dataset':<20} {'Rows':>10} {'MB':>9} {'Default MB':>11} {'Bytes/row':>10} {'Saving':>7}")
+    for name in names:
+        df = load_dataset(name)
+        report = memory_report(df)
+        report.insert(0, "dataset", name)
+        report.insert(1, "rows", len(df))
+        reports.append(report)
+
+        used, default = report["bytes"].sum(), report["default_bytes"].sum()
+        per_row = used / len(df) if len(df) else 0
+        saving = 1 - used / default if default else 0
+        print(f"{name:<20} {len(df):>10} {used / MB:>9.1f} {default / MB:>11.1f} {per_row:>10.1f} {saving:>7.0%}")
+
+    out = OUTPUT + "memory_report.csv"
+    pd.concat(reports, ignore_index=True).to_csv(out, index=False)
+    print("Saved:", out)
+
+if __name__ == "__main__":
+    start_run()
+    main()
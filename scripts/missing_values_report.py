@@ -1,20 +1,23 @@
 # scripts/missing_values_report.py
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
-import numpy as np
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import config
+from scripts.instrument import start_run
+from scripts.loader import load_dataset
 
-PROCESSED = "../data/processed/"
-OUTPUT = "../output/"
-VISUALS = "../visuals/"
+OUTPUT = os.path.join(config.OUTPUT_DIR, "")
+VISUALS = os.path.join(config.VISUALS_DIR, "")
 os.makedirs(OUTPUT, exist_ok=True)
 os.makedirs(VISUALS, exist_ok=True)
 
 def main():
-    file = PROCESSED + "city_day_cleaned.csv"
-    print("Loading:", file)
-    df = pd.read_csv(file)
+    print("Loading: city_day")
+    df = load_dataset("city_day")
 
     # missing counts and fraction
     miss = df.isna().sum()
@@ -30,6 +33,8 @@ def main():
         print("No missing values found.")
         return
 
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     plt.figure(figsize=(12,6))
     sns.heatmap(df[top_cols].isna().transpose(), cbar=False)
     plt.title("Missing values heatmap (rows=columns)")
@@ -42,4 +47,5 @@ def main():
     print("Saved:", out)
 
 if __name__ == "__main__":
+    start_run()
     main()
@@ -0,0 +1,184 @@
+# I wrote this module to catch sensor spikes before they skew every mean
+# downstream. Readings are judged against their own group: per
+# config.OUTLIER_GROUP_COLUMNS (City/Station), pollutant and calendar month.
+#
+#   'iqr'  Tukey fences: values below Q1 - k * IQR or above Q3 + k * IQR,
+#          with k = config.IQR_MULTIPLIER. The quartiles of every group and
+#          pollutant come from one grouped quantile call, or from a
+#          GroupedQuantileSketch when a file is cleaned in chunks.
+#   'mad'  rolling median band for hourly data: values further than
+#          config.OUTLIER_MAD_THRESHOLD scaled MADs from the rolling median of
+#          the station's own series (config.OUTLIER_MAD_WINDOW readings).
+#
+# Outliers are masked to NaN (and later imputed) or flagged in an extra
+# <pollutant>_outlier column, per config.OUTLIER_ACTION. outlier_report()
+# turns the counts into one row per group, month and pollutant.
+
+import numpy as np
+import pandas as pd
+
+import config
+from scripts.calendar_features import calendar_features
+from scripts.schema import find_date_col
+from scripts.streaming_stats import GroupedQuantileSketch
+
+POLLUTANT_COLS = config.POLLUTANTS
+METHODS = ("iqr", "mad")
+ACTIONS = ("mask", "flag")
+# Scales the MAD to the standard deviation of normally distributed data
+MAD_SCALE = 1.4826
+
+
+def group_keys(df, group_cols=None):
+    """Key columns of every row: the group columns present plus the calendar month."""
+    group_cols = [c for c in (group_cols or config.OUTLIER_GROUP_COLUMNS) if c in df.columns]
+    keys = df[group_cols].copy()
+    date_col = find_date_col(df)
+    if date_col is not None:
+        keys["month"] = calendar_features(df[date_col], ["month"])["month"]
+    return keys
+
+
+def iqr_quartiles(df, keys, columns):
+    """Q1, Q3 and count per group (index) and pollutant (columns) in one grouped pass."""
+    grouped = df[columns].groupby([keys[c] for c in keys.columns], observed=True)
+    q = grouped.quantile([0.25, 0.75])
+    return q.xs(0.25, level=-1), q.xs(0.75, level=-1), grouped.count()
+
+
+def sketch_quartiles(sketches):
+    """Q1, Q3 and count frames like iqr_quartiles(), from {pollutant: GroupedQuantileSketch}."""
+    q1, q3, n = {}, {}, {}
+    for col, sketch in sketches.items():
+        result = sketch.quantiles([0.25, 0.75])
+        q1[col], q3[col], n[col] = result[0.25], result[0.75], result["n"]
+    return pd.DataFrame(q1), pd.DataFrame(q3), pd.DataFrame(n)
+
+
+def add_to_sketches(sketches, df, columns=None, group_cols=None):
+    """Feed one chunk into {pollutant: GroupedQuantileSketch} (created on first use)."""
+    columns = [c for c in (columns or POLLUTANT_COLS) if c in df.columns]
+    keys = group_keys(df, group_cols)
+    for col in columns:
+        sketches.setdefault(col, GroupedQuantileSketch(list(keys.columns))).add(keys, df[col].to_numpy())
+    return sketches
+
+
+def fences(q1, q3, counts, multiplier=None, min_count=None):
+    """
+    Lower and upper Tukey fences per group and pollutant. Groups with fewer
+    than config.OUTLIER_MIN_COUNT readings, or an IQR of zero (mostly
+    identical readings), get no fence (NaN) and are left alone.
+    """
+    multiplier = config.IQR_MULTIPLIER if multiplier is None else multiplier
+    min_count = config.OUTLIER_MIN_COUNT if min_count is None else min_count
+    iqr = q3 - q1
+    usable = (counts >= min_count) & (iqr > 0)
+    return (q1 - multiplier * iqr).where(usable), (q3 + multiplier * iqr).where(usable)
+
+
+def iqr_mask(df, keys, lower, upper, columns):
+    """Boolean frame of the values outside their group's fences."""
+    index = pd.MultiIndex.from_frame(keys) if keys.shape[1] > 1 else pd.Index(keys.iloc[:, 0])
+    mask = pd.DataFrame(False, index=df.index, columns=columns)
+    for col in columns:
+        if col not in lower.columns:
+            continue
+        lo = lower[col].reindex(index).to_numpy()
+        hi = upper[col].reindex(index).to_numpy()
+        values = df[col].to_numpy(dtype=np.float64)
+        with np.errstate(invalid="ignore"):
+            mask[col] = (values < lo) | (values > hi)
+    return mask
+
+
+def mad_mask(df, columns, group_cols=None, window=None, threshold=None):
+    """
+    Boolean frame of the values further than `threshold` scaled MADs from the
+    centred rolling median of their own series (rows in date order per group).
+    """
+    window = window or config.OUTLIER_MAD_WINDOW
+    threshold = threshold or config.OUTLIER_MAD_THRESHOLD
+    group_cols = [c for c in (group_cols or config.OUTLIER_GROUP_COLUMNS) if c in df.columns]
+    date_col = find_date_col(df)
+    ordered = df.sort_values(group_cols + [date_col], kind="stable") if date_col else df
+    values = ordered[columns].astype(np.float64)
+
+    def rolling_median(frame):
+        rolling = (frame.groupby([ordered[c] for c in group_cols], observed=True, sort=False)
+                   if group_cols else frame)
+        result = rolling.rolling(window, center=True, min_periods=max(window // 4, 3)).median()
+        return result.droplevel(list(range(len(group_cols)))) if group_cols else result
+
+    median = rolling_median(values)
+    deviation = (values - median).abs()
+    mad = rolling_median(deviation) * MAD_SCALE
+    mask = (deviation > threshold * mad) & (mad > 0)
+    return mask.reindex(df.index)
+
+
+def detect(df, method=None, columns=None, fence_frames=None, group_cols=None):
+    """
+    Boolean frame (rows of df, pollutant columns) of the outliers in df.
+    For 'iqr', `fence_frames` = (lower, upper) from fences() can be given to
+    use fences computed over more data than df (e.g. a whole file).
+    """
+    method = method or config.OUTLIER_METHODS["day"]
+    if method not in METHODS:
+        raise ValueError(f"Unknown outlier method '{method}'. Choose from: {', '.join(METHODS)}")
+    columns = [c for c in (columns or POLLUTANT_COLS) if c in df.columns]
+    if df.empty or not columns:
+        return pd.DataFrame(False, index=df.index, columns=columns)
+
+    if method == "mad":
+        return mad_mask(df, columns, group_cols)
+    keys = group_keys(df, group_cols)
+    if fence_frames is None:
+        fence_frames = fences(*iqr_quartiles(df, keys, columns))
+    return iqr_mask(df, keys, *fence_frames, columns)
+
+
+def apply(df, mask, action=None):
+    """Mask the flagged values to NaN or add <pollutant>_outlier columns (returns a new frame)."""
+    action = action or config.OUTLIER_ACTION
+    if action not in ACTIONS:
+        raise ValueError(f"Unknown outlier action '{action}'. Choose from: {', '.join(ACTIONS)}")
+    df = df.copy()
+    for col in mask.columns:
+        if action == "mask":
+            df[col] = df[col].mask(mask[col])
+        else:
+            df[f"{col}_outlier"] = mask[col].to_numpy()
+    return df
+
+
+def count_outliers(df, mask, group_cols=None):
+    """Readings and outliers per group (index) and pollutant, as a long frame."""
+    keys = group_keys(df, group_cols)
+    by = [keys[c] for c in keys.columns]
+    readings = df[list(mask.columns)].notna().groupby(by, observed=True).sum()
+    outliers = mask.groupby(by, observed=True).sum()
+    counts = pd.concat({"n": readings.stack(), "outliers": outliers.stack()}, axis=1)
+    counts.index = counts.index.set_names(list(keys.columns) + ["pollutant"])
+    return counts
+
+
+def merge_counts(total, counts):
+    """Add the counts of one chunk to a running total (either may be None)."""
+    if total is None:
+        return counts
+    return total.add(counts, fill_value=0)
+
+
+def outlier_report(counts, fence_frames=None):
+    """
+    One row per group, month and pollutant with the number of readings and
+    outliers, the outlier share and (for 'iqr') the fences used.
+    """
+    report = counts.astype("int64")
+    if fence_frames is not None:
+        lower, upper = fence_frames
+        report = report.join(pd.concat({"lower": lower.stack(), "upper": upper.stack()}, axis=1)
+                             .rename_axis(report.index.names), how="left")
+    report["share"] = report["outliers"] / report["n"].where(report["n"] > 0)
+    return report.reset_index()
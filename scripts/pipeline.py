@@ -0,0 +1,354 @@
+# I wrote this module to run the analysis scripts as a dependency graph instead
+# of a fixed list. Every stage declares the files it reads and writes; a stage
+# depends on every stage whose outputs it reads. Stages whose input contents,
+# code and outputs are unchanged since their last successful run are skipped,
+# and stages that do not depend on each other run in parallel on a process pool.
+
+import ast
+import fnmatch
+import glob
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import config
+from scripts.instrument import stage
+
+ROOT = config.PROJECT_ROOT
+STATE_FILE = config.PIPELINE_STATE_FILE
+
+# Data, output and visuals directories follow config (and its AIR_QUALITY_* overrides)
+RAW = os.path.join(config.RAW_DATA_DIR, "")
+STORE = os.path.join(config.PROCESSED_STORE_DIR, "")
+OUTPUT = os.path.join(config.OUTPUT_DIR, "")
+VISUALS = os.path.join(config.VISUALS_DIR, "")
+
+RAW_FILES = [RAW + "city_day.csv", RAW + "city_hour.csv", RAW + "station_day.csv",
+             RAW + "station_hour.csv", RAW + "stations.csv"]
+TIME_SERIES = [STORE + "city_day", STORE + "city_hour", STORE + "station_day", STORE + "station_hour"]
+CUBES = [path + "_cube" for path in TIME_SERIES]
+
+
+def _rollup_output(target):
+    """Store path rollup.py writes a target to (rollup.output_name, without importing pandas)."""
+    if os.path.exists(RAW + f"{target}.csv") and not config.ROLLUP_REPLACE_RAW:
+        return STORE + target + "_rollup"
+    return STORE + target
+
+
+# rollup.py is the only owner of what it writes, so clean never declares a
+# dataset that rollup overwrites (otherwise clean would look stale every run)
+ROLLED_UP = [_rollup_output(target) for target in ["station_day", "city_hour", "city_day"]]
+CLEANED = [path for path in TIME_SERIES if path not in ROLLED_UP]
+
+# Paths are absolute or relative to the project root and may contain glob patterns.
+# When two stages write the same output, the one declared later runs after the earlier one.
+STAGES = [
+    {"name": "clean", "module": "clean_data",
+     "inputs": RAW_FILES,
+     "outputs": CLEANED + [path + "_cube" for path in CLEANED] + [STORE + "stations",
+                                                                   OUTPUT + "*_outliers.csv"]},
+    {"name": "rollup", "module": "rollup",
+     "inputs": [STORE + "station_hour"],
+     "outputs": ROLLED_UP + [path + "_cube" for path in ROLLED_UP]},
+    {"name": "trends", "module": "analyze_data",
+     "inputs": TIME_SERIES,
+     "outputs": [VISUALS + "*_cleaned_pm25_trend.png"]},
+    {"name": "trends_enhanced", "module": "analyze_data_enhanced",
+     "inputs": TIME_SERIES + CUBES,
+     "outputs": [VISUALS + "*_cleaned_pm25_trend.png", VISUALS + "*_cleaned_correlation.png",
+                 OUTPUT + "*_seasonal_anova.csv", OUTPUT + "*_seasonal_posthoc.csv",
+                 OUTPUT + "*_pollutant_correlations.csv"]},
+    {"name": "stations", "module": "analyze_stations",
+     "inputs": [STORE + "stations"],
+     "outputs": [OUTPUT + "stations_summary.csv", VISUALS + "stations_per_city.png"]},
+    {"name": "seasonal", "module": "seasonal_trends",
+     "inputs": [STORE + "city_day_cube"],
+     "outputs": [OUTPUT + "seasonal_means_by_pollutant.csv", VISUALS + "seasonal_*.png"]},
+    {"name": "exceedance", "module": "exceedance",
+     "inputs": [STORE + "station_hour", STORE + "city_day"],
+     "outputs": [STORE + "station_hour_rolling", STORE + "station_daily_metrics", STORE + "city_daily_metrics",
+                 STORE + "station_exceedance_days", STORE + "city_exceedance_days"]},
+    {"name": "dashboard", "module": "city_comparison_dashboard",
+     "inputs": [STORE + "city_day", STORE + "city_day_cube", STORE + "city_exceedance_days"],
+     "outputs": [VISUALS + "city_comparison_dashboard.html", VISUALS + "plotly.min.js"]},
+    {"name": "city_years", "module": "city_pollution_over_years",
+     "inputs": [STORE + "city_day_cube"],
+     "outputs": [OUTPUT + "city_yearly_avg.csv", VISUALS + "city_pollution_over_years_top6.png"]},
+    {"name": "top_cities", "module": "top_polluted_cities",
+     "inputs": [STORE + "city_day_cube", STORE + "city_exceedance_days"],
+     "outputs": [OUTPUT + "top_polluted_cities.csv", VISUALS + "top_polluted_cities.png"]},
+    {"name": "hotspots", "module": "pollution_hotspots",
+     "inputs": [STORE + "city_day_cube"],
+     "outputs": [OUTPUT + "city_pollution_clusters.csv", VISUALS + "pollution_hotspots_clusters.png"]},
+    {"name": "station_clusters", "module": "station_clustering",
+     "inputs": [STORE + "station_day_cube", STORE + "station_hour"],
+     "outputs": [OUTPUT + "station_clusters.csv", OUTPUT + "station_cluster_k_sweep.csv",
+                 OUTPUT + "models/station_clusters.joblib", VISUALS + "station_clusters.png"]},
+    {"name": "forecast", "module": "forecast",
+     "inputs": [STORE + "city_day"],
+     "outputs": [STORE + "forecasts", OUTPUT + "forecasts_summary.csv"]},
+    {"name": "missing_values", "module": "missing_values_report",
+     "inputs": [STORE + "city_day"],
+     "outputs": [OUTPUT + "missing_values_summary.csv", VISUALS + "missing_values_heatmap.png"]},
+    {"name": "interactive", "module": "interactive_visualizations",
+     "inputs": [STORE + "city_day", STORE + "city_day_cube"],
+     "outputs": [VISUALS + "*_interactive.html", VISUALS + "plotly.min.js"]},
+    {"name": "memory", "module": "memory_report",
+     "inputs": [STORE + "*"],
+     "outputs": [OUTPUT + "memory_report.csv"]},
+    {"name": "report", "module": "generate_report",
+     "inputs": [VISUALS + "*.png"],
+     "outputs": [OUTPUT + "air_quality_report.pdf"]},
+]
+
+
+def _overlaps(a, b):
+    """True if two path patterns can refer to the same file (or one contains the other)."""
+    if fnmatch.fnmatch(a, b) or fnmatch.fnmatch(b, a):
+        return True
+    return a.startswith(b.rstrip("/") + "/") or b.startswith(a.rstrip("/") + "/")
+
+
+def build_graph(stages=STAGES):
+    """Return {stage name: set of stage names it depends on}."""
+    graph = {s["name"]: set() for s in stages}
+    for i, stage in enumerate(stages):
+        for other in stages[:i] + stages[i + 1:]:
+            reads_other = any(_overlaps(inp, out) for inp in stage["inputs"] for out in other["outputs"])
+            # Declared later and writing the same file: run after the other stage
+            same_output = stages.index(other) < i and any(
+                _overlaps(out, o) for out in stage["outputs"] for o in other["outputs"])
+            if reads_other or same_output:
+                graph[stage["name"]].add(other["name"])
+
+    # Reject cycles early with a readable message
+    visiting, visited = set(), set()
+
+    def visit(name):
+        if name in visiting:
+            raise ValueError(f"Pipeline has a dependency cycle through stage '{name}'")
+        if name not in visited:
+            visiting.add(name)
+            for dep in graph[name]:
+                visit(dep)
+            visiting.discard(name)
+            visited.add(name)
+
+    for name in graph:
+        visit(name)
+    return graph
+
+
+def _expand(pattern):
+    """Return the sorted files a path pattern refers to (directories are walked)."""
+    files = []
+    for path in sorted(glob.glob(os.path.join(ROOT, pattern))):
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                files.extend(os.path.join(dirpath, f) for f in sorted(filenames))
+        else:
+            files.append(path)
+    return files
+
+
+def _file_digest(path, cache):
+    """sha256 of a file, reusing the cached digest while size and mtime are unchanged."""
+    st = os.stat(path)
+    rel = os.path.relpath(path, ROOT)
+    cached = cache.get(rel)
+    if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+        return cached[2]
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    cache[rel] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+    return cache[rel][2]
+
+
+def fingerprint(patterns, cache):
+    """Content hash per pattern; None when nothing matches."""
+    result = {}
+    for pattern in patterns:
+        files = _expand(pattern)
+        if not files:
+            result[pattern] = None
+            continue
+        h = hashlib.sha256()
+        for path in files:
+            h.update(os.path.relpath(path, ROOT).encode())
+            h.update(_file_digest(path, cache).encode())
+        result[pattern] = h.hexdigest()
+    return result
+
+
+def _script_imports(module):
+    """Names of the scripts modules `module` imports, including imports inside functions."""
+    with open(os.path.join(ROOT, "scripts", module + ".py")) as fh:
+        tree = ast.parse(fh.read())
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name[len("scripts."):] for alias in node.names
+                         if alias.name.startswith("scripts."))
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            if node.module == "scripts":
+                names.update(alias.name for alias in node.names)
+            elif node.module.startswith("scripts."):
+                names.add(node.module[len("scripts."):])
+    return {name.split(".")[0] for name in names
+            if os.path.exists(os.path.join(ROOT, "scripts", name.split(".")[0] + ".py"))}
+
+
+def _code_fingerprint(stage, cache):
+    """Hash the stage module, every scripts module it imports (transitively) and config.py."""
+    modules, pending = set(), [stage["module"]]
+    while pending:
+        module = pending.pop()
+        if module not in modules:
+            modules.add(module)
+            pending.extend(_script_imports(module))
+    files = [os.path.join("scripts", module + ".py") for module in sorted(modules)]
+    return fingerprint(files + ["config.py"], cache)
+
+
+def load_state():
+    if os.path.exists(STATE_FILE):
+        with open(STATE_FILE) as fh:
+            return json.load(fh)
+    return {"files": {}, "stages": {}}
+
+
+def save_state(state):
+    tmp = STATE_FILE + ".tmp"
+    with open(tmp, "w") as fh:
+        json.dump(state, fh, indent=1, sort_keys=True)
+    os.replace(tmp, STATE_FILE)
+
+
+def is_up_to_date(stage, state, inputs, code):
+    """A stage is fresh if inputs, code and its recorded outputs are all unchanged."""
+    last = state["stages"].get(stage["name"])
+    if not last or last["inputs"] != inputs or last["code"] != code:
+        return False
+    return fingerprint(stage["outputs"], state["files"]) == last["outputs"]
+
+
+def call_main(module_name, argv=()):
+    """
+    Import scripts.<module_name> and call its main() with `argv` (an empty
+    command line gives a script its defaults). Returns what main() returns.
+    """
+    module = importlib.import_module("scripts." + module_name)
+    if inspect.signature(module.main).parameters:
+        return module.main(list(argv))
+    if argv:
+        raise SystemExit(f"{module_name}.py takes no options (got {' '.join(argv)})")
+    return module.main()
+
+
+def run_stage(module_name):
+    """Import a script and call its main(); returns (ok, seconds, error)."""
+    # Picked up when a stage imports matplotlib, so stages that do not plot never import it
+    os.environ["MPLBACKEND"] = "Agg"
+
+    start = time.perf_counter()
+    try:
+        with stage(module_name, "stage", script=module_name):
+            call_main(module_name)
+    except Exception as e:
+        return False, time.perf_counter() - start, f"{type(e).__name__}: {e}"
+    return True, time.perf_counter() - start, None
+
+
+def run_pipeline(jobs=None, force=False, only=None, dry_run=False, stages=STAGES):
+    """
+    Run every stage whose inputs changed, in dependency order.
+    `jobs` sets the process pool size (0 runs everything in this process and
+    shares the loader cache), `force` ignores the recorded state and `only`
+    limits the run to the named stages and the stages they depend on.
+    Returns a list of (stage, status, seconds) rows.
+    """
+    graph = build_graph(stages)
+    by_name = {s["name"]: s for s in stages}
+
+    if only:
+        wanted, todo = set(), list(only)
+        while todo:
+            name = todo.pop()
+            if name not in graph:
+                raise ValueError(f"Unknown stage '{name}'. Choose from: {', '.join(graph)}")
+            if name not in wanted:
+                wanted.add(name)
+                todo.extend(graph[name])
+        graph = {n: deps & wanted for n, deps in graph.items() if n in wanted}
+
+    state = load_state()
+    status, seconds = {}, {}
+    pending = dict(graph)
+    running = {}
+    pool = ProcessPoolExecutor(max_workers=jobs) if jobs != 0 and not dry_run else None
+
+    def schedule_ready():
+        for name in [n for n, deps in pending.items() if all(d in status for d in deps)]:
+            del pending[name]
+            stage = by_name[name]
+            if any(status[d] in ("failed", "blocked") for d in graph[name]):
+                status[name], seconds[name] = "blocked", 0.0
+                print(f"⏭  {name}: blocked by a failed dependency")
+                continue
+            inputs = fingerprint(stage["inputs"], state["files"])
+            code = _code_fingerprint(stage, state["files"])
+            upstream_pending = any(status[d] == "would run" for d in graph[name])
+            if not force and not upstream_pending and is_up_to_date(stage, state, inputs, code):
+                status[name], seconds[name] = "skipped", 0.0
+                print(f"✔ {name}: up to date")
+                continue
+            if dry_run:
+                status[name], seconds[name] = "would run", 0.0
+                print(f"▶ {name}: would run")
+                continue
+            print(f"▶ Running {name} ({stage['module']}.py)...")
+            if pool is None:
+                finish(name, run_stage(stage["module"]), inputs, code)
+            else:
+                running[pool.submit(run_stage, stage["module"])] = (name, inputs, code)
+
+    def finish(name, result, inputs, code):
+        ok, secs, error = result
+        seconds[name] = secs
+        if ok:
+            status[name] = "ran"
+            state["stages"][name] = {
+                "inputs": inputs,
+                "code": code,
+                "outputs": fingerprint(by_name[name]["outputs"], state["files"]),
+            }
+            save_state(state)
+            print(f"✔ Done: {name} ({secs:.1f}s)")
+        else:
+            status[name] = "failed"
+            state["stages"].pop(name, None)
+            save_state(state)
+            print(f"✖ Failed: {name} ({error})")
+
+    try:
+        while pending or running:
+            schedule_ready()
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, inputs, code = running.pop(future)
+                finish(name, future.result(), inputs, code)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return [(name, status[name], seconds[name]) for name in graph]
@@ -1,41 +1,62 @@
 # scripts/pollution_hotspots.py
-import pandas as pd
-import numpy as np
+# Clusters cities by their average pollutant levels. With --stations it runs
+# the station clustering instead (profiles per station, MiniBatchKMeans, saved
+# model; see station_clustering.py).
+import argparse
 import os
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
-
-PROCESSED = "../data/processed/"
-VISUALS = "../visuals/"
-OUTPUT = "../output/"
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from scripts.aggregate_cube import load_cube, summarize, value_columns
+from scripts.instrument import start_run
+
+VISUALS = os.path.join(config.VISUALS_DIR, "")
+OUTPUT = os.path.join(config.OUTPUT_DIR, "")
 os.makedirs(VISUALS, exist_ok=True)
 os.makedirs(OUTPUT, exist_ok=True)
 
-def main():
-    file = PROCESSED + "city_day_cleaned.csv"
-    print("Loading:", file)
-    df = pd.read_csv(file)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cluster cities (or stations) by pollution.")
+    parser.add_argument("--stations", action="store_true",
+                        help="cluster stations by seasonal/diurnal profiles instead of cities")
+    args = parser.parse_args(argv)
+    if args.stations:
+        from scripts import station_clustering
+        station_clustering.main()
+        return
+
+    print("Loading: city_day cube")
+    cube = load_cube("city_day")
+    columns = value_columns(cube)
 
     # choose pollutant columns
-    poll_cols = [c for c in ["PM2.5","PM10","NO2","SO2","O3","CO"] if c in df.columns]
+    poll_cols = [c for c in ["PM2.5","PM10","NO2","SO2","O3","CO"] if c in columns]
     if not poll_cols:
-        # fallback: pick numeric columns that look like pollutants
-        poll_cols = [c for c in df.select_dtypes("number").columns if c.lower() not in ("aqi",)]
+        # fallback: pick summarized columns that look like pollutants
+        poll_cols = [c for c in columns if c.lower() not in ("aqi",)]
     print("Using pollutant columns:", poll_cols)
 
     # compute city-level averages
-    city_avg = df.groupby("City")[poll_cols].mean().dropna()
+    city_avg = summarize(cube, "City", poll_cols).dropna()
     if city_avg.shape[0] < 3:
         print("Not enough cities to cluster.")
         return
 
+    # sklearn and the plotting libraries take seconds to import, so only load them here
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from sklearn.cluster import KMeans
+    from sklearn.decomposition import PCA
+    from sklearn.preprocessing import StandardScaler
+    from scripts.station_clustering import choose_k
+
     scaler = StandardScaler()
     X = scaler.fit_transform(city_avg)
 
-    # choose K (simple heuristic: sqrt(n))
-    k = max(2, int(np.sqrt(city_avg.shape[0])))
+    # choose K by silhouette (few rows, so no need for a process pool)
+    k, _ = choose_k(X, workers=1)
     print("Clustering with K =", k)
     kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
     labels = kmeans.fit_predict(X)
@@ -45,7 +66,6 @@ def main():
     print("Saved cluster assignment:", OUTPUT + "city_pollution_clusters.csv")
 
     # Plot clusters on a 2D PCA-like scatter (use first two PCA components via SVD)
-    from sklearn.decomposition import PCA
     pca = PCA(n_components=2)
     coords = pca.fit_transform(X)
     plt.figure(figsize=(10,7))
@@ -60,4 +80,5 @@ def main():
     print("Saved:", out)
 
 if __name__ == "__main__":
+    start_run()
     main()
@@ -0,0 +1,320 @@
+# I wrote this module so the cleaned datasets are stored in a typed, columnar
+# format instead of CSV. Every dataset lives under data/processed/store/<name>/
+# as Parquet files partitioned by year and City, so readers get real datetime,
+# float32 and categorical columns back (see schema.py) without re-parsing any text.
+
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+import config
+from scripts.instrument import instrumented, stage
+from scripts.schema import CSV_DTYPES, apply_schema, find_date_col
+
+STORE_DIR = config.PROCESSED_STORE_DIR
+METADATA_FILE = "_metadata.json"
+
+# Hive partition columns and their types, outermost first
+PARTITION_TYPES = {"year": pa.int16(), "City": pa.string()}
+
+# Cleaned CSVs written by earlier versions of clean_data.py, used as a fallback
+LEGACY_CSV = {
+    "city_day": config.CITY_DAY_CLEANED,
+    "city_hour": config.CITY_HOUR_CLEANED,
+    "station_day": config.STATION_DAY_CLEANED,
+    "station_hour": config.STATION_HOUR_CLEANED,
+    "stations": config.STATIONS_CLEANED,
+}
+
+
+def dataset_path(name):
+    """Return the directory holding a dataset in the store."""
+    return os.path.join(STORE_DIR, name)
+
+
+def legacy_csv_path(name):
+    """Return the cleaned CSV path used for a dataset before the store existed."""
+    return LEGACY_CSV.get(name, os.path.join(config.PROCESSED_DATA_DIR, f"{name}_cleaned.csv"))
+
+
+def dataset_exists(name):
+    """Check whether a dataset has been written to the store."""
+    return os.path.exists(os.path.join(dataset_path(name), METADATA_FILE))
+
+
+def list_datasets():
+    """Names of all datasets in the store."""
+    if not os.path.isdir(STORE_DIR):
+        return []
+    return sorted(name for name in os.listdir(STORE_DIR) if dataset_exists(name))
+
+
+def read_metadata(name):
+    """Read the sidecar metadata (column order, date column, partitions) of a dataset."""
+    with open(os.path.join(dataset_path(name), METADATA_FILE)) as fh:
+        return json.load(fh)
+
+
+class DatasetWriter:
+    """
+    Write a dataset to the store one frame at a time, so a cleaner can stream
+    chunks without holding the whole dataset in memory. Files go to a temporary
+    directory that replaces the previous version of the dataset on close().
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.path = dataset_path(name)
+        self.tmp_path = self.path + ".tmp"
+        if os.path.exists(self.tmp_path):
+            shutil.rmtree(self.tmp_path)
+        os.makedirs(self.tmp_path)
+        self.parts = 0
+        self.rows = 0
+        self.columns = None
+        self.date_col = None
+        self.partition_cols = None
+
+    def write(self, df):
+        """Append one frame; every frame must have the same columns."""
+        with stage("processed_store.DatasetWriter.write", "save", target=self.name, rows_in=len(df)):
+            self._write(df)
+
+    def _write(self, df):
+        df = apply_schema(df.copy())
+        columns = list(df.columns)
+        date_col = find_date_col(df)
+
+        partition_cols = []
+        if date_col is not None:
+            df["year"] = df[date_col].dt.year.astype("int16")
+            partition_cols.append("year")
+            if "City" in df.columns:
+                # Partition values are plain strings in the directory names
+                df["City"] = df["City"].astype(str)
+                partition_cols.append("City")
+
+        if self.columns is None:
+            self.columns = columns
+            self.date_col = date_col
+            self.partition_cols = partition_cols
+
+        ds.write_dataset(
+            pa.Table.from_pandas(df, preserve_index=False),
+            self.tmp_path,
+            format="parquet",
+            partitioning=_partitioning(partition_cols),
+            basename_template=f"part-{self.parts}-{{i}}.parquet",
+            max_partitions=100_000,
+            max_rows_per_group=config.STORE_ROW_GROUP_ROWS,
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        self.parts += 1
+        self.rows += len(df)
+
+    def close(self):
+        """Write the metadata sidecar and swap the new files into place."""
+        metadata = {
+            "columns": self.columns or [],
+            "date_col": self.date_col,
+            "partition_cols": self.partition_cols or [],
+            "rows": self.rows,
+        }
+        with open(os.path.join(self.tmp_path, METADATA_FILE), "w") as fh:
+            json.dump(metadata, fh, indent=2)
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.replace(self.tmp_path, self.path)
+        return self.path
+
+
+def write_dataset(df, name):
+    """
+    Write a cleaned frame to the store, replacing any previous version.
+    Datasets with a date column are partitioned by year and City so readers
+    can skip whole files; small lookup tables like stations are kept in one file.
+    """
+    writer = DatasetWriter(name)
+    writer.write(df)
+    return writer.close()
+
+
+def _drop_matching(existing, new, key_cols):
+    """Rows of `existing` whose key_cols do not appear in `new`."""
+    if existing.empty or new.empty:
+        return existing
+    keys = new[key_cols].drop_duplicates()
+    marked = existing.merge(keys, on=key_cols, how="left", indicator=True)
+    return existing[(marked["_merge"] == "left_only").to_numpy()]
+
+
+@instrumented("save")
+def upsert_dataset(df, name, key_cols):
+    """
+    Insert or replace rows: rows of `df` replace the stored rows with the same
+    `key_cols` values. Only the year/City partitions that `df` touches are
+    read and rewritten; other files are left alone. Creates the dataset if it
+    does not exist yet. Returns the list of (year, City) partitions rewritten.
+    """
+    df = apply_schema(df.copy())
+    date_col = find_date_col(df)
+    if date_col is None or "City" not in df.columns:
+        raise ValueError("Upserts need a dataset partitioned by year and City")
+    partitions = sorted(set(zip(df[date_col].dt.year.astype(int), df["City"].astype(str))))
+    if not dataset_exists(name):
+        write_dataset(df, name)
+        return partitions
+
+    metadata = read_metadata(name)
+    if metadata["partition_cols"] != list(PARTITION_TYPES):
+        raise ValueError(f"Dataset '{name}' is not partitioned by year and City")
+    columns = metadata["columns"]
+    writer = DatasetWriter(name)
+    rows_delta = 0
+    for (year, city), part in df.groupby([df[date_col].dt.year.rename("year"), df["City"].astype(str)],
+                                         observed=True):
+        expr = (ds.field("year") == int(year)) & (ds.field("City") == city)
+        existing = read_dataset(name, filter=expr)
+        kept = _drop_matching(existing, part, key_cols)
+        combined = pd.concat([f for f in (kept, part[columns]) if len(f)], ignore_index=True)
+        writer.write(combined.sort_values(metadata["date_col"], kind="stable"))
+        rows_delta += len(combined) - len(existing)
+
+    # Swap the rewritten partition directories into the live dataset
+    for root, _, files in os.walk(writer.tmp_path):
+        if any(f.endswith(".parquet") for f in files):
+            target = os.path.join(writer.path, os.path.relpath(root, writer.tmp_path))
+            if os.path.exists(target):
+                shutil.rmtree(target)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(root, target)
+    shutil.rmtree(writer.tmp_path)
+
+    metadata["rows"] += rows_delta
+    with open(os.path.join(writer.path, METADATA_FILE), "w") as fh:
+        json.dump(metadata, fh, indent=2)
+    return partitions
+
+
+@instrumented("save")
+def append_dataset(df, name):
+    """
+    Add rows to a stored dataset without touching the files already there:
+    the rows go to new files in their year/City partitions. The caller makes
+    sure they are not already stored (see ingestion.py). Creates the dataset
+    if it does not exist yet. Returns the list of (year, City) partitions appended to.
+    """
+    if not dataset_exists(name):
+        write_dataset(df, name)
+        metadata = read_metadata(name)
+    else:
+        metadata = read_metadata(name)
+        df = apply_schema(df[metadata["columns"]].copy())
+        date_col = metadata["date_col"]
+        if "year" in metadata["partition_cols"]:
+            df["year"] = df[date_col].dt.year.astype("int16")
+        if "City" in metadata["partition_cols"]:
+            df["City"] = df["City"].astype(str)
+        ds.write_dataset(
+            pa.Table.from_pandas(df, preserve_index=False),
+            dataset_path(name),
+            format="parquet",
+            partitioning=_partitioning(metadata["partition_cols"]),
+            basename_template=f"append-{time.time_ns()}-{{i}}.parquet",
+            max_partitions=100_000,
+            max_rows_per_group=config.STORE_ROW_GROUP_ROWS,
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        metadata["rows"] += len(df)
+        with open(os.path.join(dataset_path(name), METADATA_FILE), "w") as fh:
+            json.dump(metadata, fh, indent=2)
+
+    date_col = metadata["date_col"]
+    if date_col is None or "City" not in df.columns:
+        return []
+    return sorted(set(zip(df[date_col].dt.year.astype(int), df["City"].astype(str))))
+
+
+def _partitioning(partition_cols):
+    if not partition_cols:
+        return None
+    return ds.partitioning(pa.schema([(c, PARTITION_TYPES[c]) for c in partition_cols]), flavor="hive")
+
+
+def _open_dataset(name, metadata, files=None):
+    if files is not None:
+        return ds.dataset(files, format="parquet", partitioning=_partitioning(metadata["partition_cols"]),
+                          partition_base_dir=dataset_path(name))
+    return ds.dataset(dataset_path(name), format="parquet",
+                      partitioning=_partitioning(metadata["partition_cols"]))
+
+
+def dataset_files(name):
+    """Parquet files of a dataset in the store (e.g. to split work between processes)."""
+    metadata = read_metadata(name)
+    return list(_open_dataset(name, metadata).files)
+
+
+def iter_batches(name, columns=None, filter=None, files=None, batch_size=None):
+    """
+    Yield a stored dataset as pandas frames of at most `batch_size` rows
+    (default config.CLEAN_CHUNK_ROWS) without loading all of it. Pass `files`
+    (from dataset_files) to read only part of the dataset.
+    """
+    metadata = read_metadata(name)
+    wanted = list(columns) if columns is not None else metadata["columns"]
+    wanted = [c for c in wanted if c in metadata["columns"] or c in metadata["partition_cols"]]
+    dataset = _open_dataset(name, metadata, files)
+    for batch in dataset.to_batches(columns=wanted, filter=filter,
+                                    batch_size=batch_size or config.CLEAN_CHUNK_ROWS):
+        if batch.num_rows:
+            yield apply_schema(batch.to_pandas())
+
+
+def open_dataset(name):
+    """Return (pyarrow dataset, metadata) for a dataset in the store."""
+    metadata = read_metadata(name)
+    return _open_dataset(name, metadata), metadata
+
+
+@instrumented("load")
+def read_dataset(name, columns=None, filter=None):
+    """
+    Load a dataset from the store with its stored dtypes.
+    Pass `columns` to read only the columns you need; the partition column
+    `year` can be requested explicitly. `filter` is a pyarrow dataset
+    expression (see query.py) evaluated against partitions and row-group
+    statistics before any data is read. Falls back to the legacy cleaned CSV
+    if the dataset has not been written to the store yet.
+    """
+    if not dataset_exists(name):
+        if filter is not None:
+            raise ValueError(f"Dataset '{name}' is not in the store; filters need the store (run clean_data.py)")
+        return _read_legacy_csv(name, columns)
+
+    metadata = read_metadata(name)
+    wanted = list(columns) if columns is not None else metadata["columns"]
+    wanted = [c for c in wanted if c in metadata["columns"] or c in metadata["partition_cols"]]
+
+    table = _open_dataset(name, metadata).to_table(columns=wanted, filter=filter)
+    # City comes back from the directory names as plain strings
+    df = apply_schema(table.to_pandas())
+
+    # Files are laid out per partition, so restore chronological order
+    date_col = metadata["date_col"]
+    if date_col in df.columns:
+        df = df.sort_values(date_col, kind="stable").reset_index(drop=True)
+    return df[wanted]
+
+
+def _read_legacy_csv(name, columns=None):
+    path = legacy_csv_path(name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Dataset '{name}' not found in the store or at {path}. Run clean_data.py first.")
+    df = pd.read_csv(path, usecols=lambda c: columns is None or c in columns, dtype=CSV_DTYPES)
+    return apply_schema(df)
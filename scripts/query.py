@@ -0,0 +1,122 @@
+# I wrote this module so scripts can ask for "Delhi, January 2019" without
+# loading every city and every year first. City and year are directory
+# partitions in the processed store, so a city/date filter skips whole files;
+# inside a file rows are written in date order in small row groups, so the
+# Datetime min/max statistics of each row group let pyarrow skip the rest.
+#
+#   from scripts.query import load
+#   df = load("city_hour", cities=["Delhi"], start="2019-01-01", end="2019-02-01")
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+from scripts import loader, processed_store
+
+
+def _as_list(values):
+    if values is None:
+        return None
+    return [values] if isinstance(values, str) else list(values)
+
+
+def build_filter(metadata, cities=None, start=None, end=None, stations=None):
+    """
+    pyarrow expression for the given predicates (None if there are none).
+    `start` is inclusive and `end` exclusive, like pandas slicing by date.
+    """
+    cities, stations = _as_list(cities), _as_list(stations)
+    date_col = metadata.get("date_col")
+    partition_cols = metadata.get("partition_cols", [])
+    if (start is not None or end is not None) and date_col is None:
+        raise ValueError("Date range given but the dataset has no date column")
+
+    parts = []
+    if cities is not None:
+        parts.append(ds.field("City").isin(cities))
+    if stations is not None:
+        parts.append(ds.field("Station").isin(stations))
+    if start is not None:
+        start = pd.Timestamp(start)
+        parts.append(ds.field(date_col) >= start)
+        if "year" in partition_cols:
+            parts.append(ds.field("year") >= start.year)
+    if end is not None:
+        end = pd.Timestamp(end)
+        parts.append(ds.field(date_col) < end)
+        if "year" in partition_cols:
+            # end is exclusive: an end of Jan 1st does not need that year's files
+            last_year = end.year - 1 if end == pd.Timestamp(end.year, 1, 1) else end.year
+            parts.append(ds.field("year") <= last_year)
+
+    if not parts:
+        return None
+    expr = parts[0]
+    for part in parts[1:]:
+        expr = expr & part
+    return expr
+
+
+def _filter_frame(df, cities=None, start=None, end=None, stations=None):
+    """Same predicates applied in pandas, for datasets that are only available as CSV."""
+    mask = np.ones(len(df), dtype=bool)
+    if cities is not None:
+        mask &= df["City"].isin(_as_list(cities)).to_numpy()
+    if stations is not None:
+        mask &= df["Station"].isin(_as_list(stations)).to_numpy()
+    date_col = processed_store.find_date_col(df)
+    if start is not None:
+        mask &= (df[date_col] >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        mask &= (df[date_col] < pd.Timestamp(end)).to_numpy()
+    return df[mask].reset_index(drop=True)
+
+
+def load(dataset, cities=None, start=None, end=None, columns=None, stations=None):
+    """
+    Load the rows of `dataset` for the given cities/stations and date range.
+    Only the partitions and row groups that can match are read. Without any
+    predicate this is the same as loader.load_dataset (and uses its cache).
+    """
+    if cities is None and stations is None and start is None and end is None:
+        return loader.load_dataset(dataset, columns)
+
+    if not processed_store.dataset_exists(dataset):
+        df = loader.load_dataset(dataset)
+        df = _filter_frame(df, cities, start, end, stations)
+        return df[[c for c in columns if c in df.columns]] if columns is not None else df
+
+    metadata = processed_store.read_metadata(dataset)
+    expr = build_filter(metadata, cities, start, end, stations)
+    df = processed_store.read_dataset(dataset, columns, filter=expr)
+    if "City" in df.columns and cities is not None:
+        df["City"] = df["City"].cat.remove_unused_categories()
+    return df
+
+
+def scan_stats(dataset, cities=None, start=None, end=None, stations=None):
+    """
+    How much of the stored dataset a query would read: files, row groups and
+    row-group bytes touched versus the total. Useful to check that a filter
+    is actually pruning.
+    """
+    dataset_obj, metadata = processed_store.open_dataset(dataset)
+    expr = build_filter(metadata, cities, start, end, stations)
+
+    def count(filter_expr):
+        files = row_groups = size = 0
+        for fragment in dataset_obj.get_fragments(filter=filter_expr):
+            pieces = (fragment.split_by_row_group(filter_expr, schema=dataset_obj.schema)
+                      if filter_expr is not None else fragment.split_by_row_group())
+            ids = [rg.id for piece in pieces for rg in piece.row_groups]
+            if ids:
+                files += 1
+                row_groups += len(ids)
+                size += sum(fragment.metadata.row_group(i).total_byte_size for i in ids)
+        return files, row_groups, size
+
+    total = count(None)
+    read = count(expr)
+    return {"files": read[0], "total_files": total[0],
+            "row_groups": read[1], "total_row_groups": total[1],
+            "bytes": read[2], "total_bytes": total[2]}
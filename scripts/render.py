@@ -0,0 +1,180 @@
+# I wrote this module because savefig dominated the runtime of the plotting
+# scripts. Scripts now describe each figure as a plot job (already aggregated
+# data, a small spec and the output path) and hand the whole list to
+# render_jobs(), which draws them on a process pool with the Agg backend.
+# A job whose data and spec hash the same as at its last render, and whose
+# PNG is still there, is skipped.
+#
+#   job = plot_job("bar", season_mean["PM2.5"], VISUALS + "seasonal_pm25.png",
+#                  title="Seasonal average — PM2.5", dpi=200)
+#   render_jobs([job])
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import config
+from scripts.instrument import stage
+
+STATE_FILE = config.RENDER_STATE_FILE
+
+# Bump when a renderer changes so cached figures are redrawn
+RENDERER_VERSION = 1
+
+
+def plot_job(kind, data, output, title=None, xlabel=None, ylabel=None, figsize=(10, 5), dpi=100,
+             xtick_rotation=None, **options):
+    """
+    Describe one figure. `kind` is a key of RENDERERS, `data` the aggregated
+    Series/DataFrame to draw and `options` extra keyword arguments for the
+    plotting call (e.g. annot=True for a heatmap).
+    """
+    return {"kind": kind, "data": data, "output": output,
+            "spec": {"title": title, "xlabel": xlabel, "ylabel": ylabel, "figsize": list(figsize),
+                     "dpi": dpi, "xtick_rotation": xtick_rotation, "options": options}}
+
+
+def _draw_line(ax, data, options):
+    data.plot(ax=ax, **options)
+
+
+def _draw_bar(ax, data, options):
+    import seaborn as sns
+    sns.barplot(x=data.index, y=data.values, ax=ax, **options)
+
+
+def _draw_heatmap(ax, data, options):
+    import seaborn as sns
+    sns.heatmap(data, ax=ax, **options)
+
+
+def _draw_scatter(ax, data, options):
+    # Columns: x, y and optionally the hue
+    import seaborn as sns
+    hue = data.columns[2] if data.shape[1] > 2 else None
+    sns.scatterplot(data=data, x=data.columns[0], y=data.columns[1], hue=hue, ax=ax, **options)
+
+
+RENDERERS = {"line": _draw_line, "bar": _draw_bar, "heatmap": _draw_heatmap, "scatter": _draw_scatter}
+
+
+def job_hash(job):
+    """sha256 of the job's data (values and labels), spec and renderer version."""
+    if job["kind"] not in RENDERERS:
+        raise ValueError(f"Unknown plot kind '{job['kind']}'. Choose from: {', '.join(RENDERERS)}")
+    data = job["data"]
+    h = hashlib.sha256()
+    h.update(json.dumps([job["kind"], job["spec"], RENDERER_VERSION], sort_keys=True, default=str).encode())
+    h.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    labels = list(data.columns) if isinstance(data, pd.DataFrame) else [data.name]
+    h.update(json.dumps([str(c) for c in labels] + [str(data.index.name)]).encode())
+    return h.hexdigest()
+
+
+def render(job):
+    """Draw one job to its output file; returns (ok, seconds, error)."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    spec = job["spec"]
+    try:
+        fig, ax = plt.subplots(figsize=spec["figsize"])
+        RENDERERS[job["kind"]](ax, job["data"], spec["options"])
+        if spec["title"] is not None:
+            ax.set_title(spec["title"])
+        if spec["xlabel"] is not None:
+            ax.set_xlabel(spec["xlabel"])
+        if spec["ylabel"] is not None:
+            ax.set_ylabel(spec["ylabel"])
+        if spec["xtick_rotation"] is not None:
+            plt.setp(ax.get_xticklabels(), rotation=spec["xtick_rotation"])
+        fig.tight_layout()
+        os.makedirs(os.path.dirname(job["output"]) or ".", exist_ok=True)
+        fig.savefig(job["output"], dpi=spec["dpi"])
+        plt.close(fig)
+    except Exception as e:
+        plt.close("all")
+        return False, time.perf_counter() - start, f"{type(e).__name__}: {e}"
+    return True, time.perf_counter() - start, None
+
+
+def _load_state():
+    if os.path.exists(STATE_FILE):
+        with open(STATE_FILE) as fh:
+            return json.load(fh)
+    return {}
+
+
+def _save_state(updates):
+    """
+    Record new digests (None drops an entry). The file is re-read first so
+    scripts rendering at the same time do not drop each other's entries.
+    """
+    state = _load_state()
+    for key, digest in updates.items():
+        if digest is None:
+            state.pop(key, None)
+        else:
+            state[key] = digest
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp = f"{STATE_FILE}.{os.getpid()}.tmp"
+    with open(tmp, "w") as fh:
+        json.dump(state, fh, indent=1, sort_keys=True)
+    os.replace(tmp, STATE_FILE)
+
+
+def render_jobs(jobs, workers=None, force=False, verbose=True):
+    """
+    Render plot jobs, in parallel when workers > 1 (default config.RENDER_WORKERS).
+    Unchanged jobs are skipped unless `force` is set. Returns one dict per job
+    with output, status (rendered, skipped or failed), seconds and error.
+    """
+    with stage("render.render_jobs", "plot", jobs=len(jobs)) as record:
+        results = _render_jobs(jobs, workers, force)
+        record["rendered"] = sum(r["status"] == "rendered" for r in results)
+    if verbose:
+        print_render_summary(results)
+    return results
+
+
+def _render_jobs(jobs, workers, force):
+    workers = config.RENDER_WORKERS if workers is None else workers
+    state = _load_state()
+    results, todo = [None] * len(jobs), []
+    for i, job in enumerate(jobs):
+        key = os.path.relpath(job["output"], config.PROJECT_ROOT)
+        digest = job_hash(job)
+        if not force and state.get(key) == digest and os.path.exists(job["output"]):
+            results[i] = {"output": job["output"], "status": "skipped", "seconds": 0.0, "error": None}
+        else:
+            todo.append((i, job, key, digest))
+
+    if workers > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+            outcomes = list(pool.map(render, [job for _, job, _, _ in todo]))
+    else:
+        outcomes = [render(job) for _, job, _, _ in todo]
+
+    updates = {}
+    for (i, job, key, digest), (ok, seconds, error) in zip(todo, outcomes):
+        updates[key] = digest if ok else None
+        results[i] = {"output": job["output"], "status": "rendered" if ok else "failed",
+                      "seconds": seconds, "error": error}
+    if updates:
+        _save_state(updates)
+    return results
+
+
+def print_render_summary(results):
+    """Print the per-job render status and time."""
+    print(f"\n{'Figure':<48} {'Status':<9} {'Seconds':>7}")
+    for r in results:
+        print(f"{os.path.basename(r['output']):<48} {r['status']:<9} {r['seconds']:>7.2f}")
+        if r["error"]:
+            print(f"    {r['error']}")
@@ -0,0 +1,205 @@
+# scripts/rollup.py
+# I wrote this script to derive the coarser datasets from station data instead
+# of depending on separate raw files (there is no raw city_hour.csv):
+#
+#   station_hour -> station_day   daily mean per station, at least
+#                                 config.ROLLUP_MIN_HOURS valid hours per value
+#   station_hour -> city_hour     hourly mean over a city's stations
+#   station_day  -> city_day      daily mean over a city's stations
+#
+# Each rollup is one sorted groupby over (keys, period) that takes the mean
+# and count of every pollutant together; values backed by too few readings
+# become NaN. AQI is recomputed from the rolled-up concentrations (or
+# averaged when config.RECOMPUTE_AQI is off). Datasets are processed one city
+# at a time, so memory is bounded by the largest city.
+#
+# A target that was also cleaned from a raw file is written as <target>_rollup
+# so real data is not replaced (unless config.ROLLUP_REPLACE_RAW). refresh()
+# re-aggregates only the (City, day) pairs touched by newly ingested hours and
+# upserts them, rewriting just the affected partitions and cube rows.
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import config
+from scripts import processed_store
+from scripts.aggregate_cube import build_cube, load_cube, merge_cubes, refresh_cube, write_cube
+from scripts.aqi import add_aqi, aqi_bucket
+from scripts.instrument import instrumented, start_run
+from scripts.query import load
+
+VALUE_COLUMNS = config.POLLUTANTS + ["AQI"]
+
+# target, source, keys kept, period the date column is floored to, minimum readings per value
+ROLLUPS = [
+    {"target": "station_day", "source": "station_hour", "keys": ["City", "Station"], "freq": "D",
+     "min_count": config.ROLLUP_MIN_HOURS},
+    {"target": "city_hour", "source": "station_hour", "keys": ["City"], "freq": "h",
+     "min_count": config.ROLLUP_MIN_STATIONS},
+    {"target": "city_day", "source": "station_day", "keys": ["City"], "freq": "D",
+     "min_count": config.ROLLUP_MIN_STATIONS},
+]
+TARGETS = [spec["target"] for spec in ROLLUPS]
+ONE_DAY = pd.Timedelta(days=1)
+
+
+def output_name(target):
+    """Store name a rollup writes to: <target>_rollup if the target also has a raw file."""
+    raw = os.path.join(config.RAW_DATA_DIR, f"{target}.csv")
+    if os.path.exists(raw) and not config.ROLLUP_REPLACE_RAW:
+        return f"{target}_rollup"
+    return target
+
+
+def source_name(spec):
+    """Read from the output of an earlier rollup when the source is itself rolled up."""
+    return output_name(spec["source"]) if spec["source"] in TARGETS else spec["source"]
+
+
+def targets_fed_by(name):
+    """Rollup targets computed from dataset `name`, directly or through another rollup."""
+    names, targets = {name}, []
+    for spec in ROLLUPS:
+        if source_name(spec) in names:
+            targets.append(spec["target"])
+            names.add(output_name(spec["target"]))
+    return targets
+
+
+@instrumented("aggregate")
+def rollup(df, keys, freq, min_count):
+    """
+    Mean of every pollutant per `keys` and `freq` period of the date column,
+    NaN where fewer than `min_count` readings (hours or stations) back it.
+    """
+    date_col = processed_store.find_date_col(df)
+    recompute = config.RECOMPUTE_AQI and any(p in df.columns for p in ("PM2.5", "PM10"))
+    cols = [c for c in VALUE_COLUMNS if c in df.columns and not (recompute and c == "AQI")]
+    period = df[date_col].dt.floor(freq).rename(date_col)
+    grouped = df[cols].astype(np.float64).groupby([df[k] for k in keys] + [period], observed=True, sort=True)
+    stats = grouped.agg(["mean", "count"])
+    means = stats.xs("mean", axis=1, level=1).where(stats.xs("count", axis=1, level=1) >= min_count)
+    result = means.reset_index()
+
+    if recompute:
+        result = add_aqi(result, hourly=freq != "D")
+    elif "AQI" in result.columns:
+        result["AQI_Bucket"] = aqi_bucket(result["AQI"].to_numpy())
+    return result
+
+
+def _cities(name):
+    return sorted(load_cube(name)["City"].astype(str).unique())
+
+
+def _read_columns(spec):
+    return spec["keys"] + config.DATE_COLUMNS + VALUE_COLUMNS
+
+
+def build(spec):
+    """Rebuild one rollup target from its whole source, city by city. Returns the store path."""
+    source, target = source_name(spec), output_name(spec["target"])
+    writer = processed_store.DatasetWriter(target)
+    cube = None
+    for city in _cities(source):
+        rolled = rollup(load(source, cities=[city], columns=_read_columns(spec)),
+                        spec["keys"], spec["freq"], spec["min_count"])
+        if rolled.empty:
+            continue
+        writer.write(rolled)
+        cube = build_cube(rolled) if cube is None else merge_cubes(cube, build_cube(rolled))
+    path = writer.close()
+    if cube is not None:
+        write_cube(cube, target)
+    return path
+
+
+def touched_days(rows):
+    """(City, day) pairs covered by newly ingested rows."""
+    date_col = processed_store.find_date_col(rows)
+    days = pd.DataFrame({"City": rows["City"].astype(str), "day": rows[date_col].dt.normalize()})
+    return days.drop_duplicates().reset_index(drop=True)
+
+
+def _days_to_redo(days, spec):
+    """
+    Days to re-aggregate and days to read. Hourly AQI uses trailing 24-hour
+    windows, so an hourly target also redoes the day after each touched day
+    and reads the day before as context.
+    """
+    days = pd.DatetimeIndex(days.unique())
+    if spec["freq"] == "D" or not config.RECOMPUTE_AQI:
+        return days, days
+    redo = days.union(days + ONE_DAY)
+    return redo, redo.union(redo - ONE_DAY)
+
+
+def refresh(days, targets=None):
+    """
+    Re-aggregate only the given (City, day) pairs of every rollup (in order,
+    so city_day sees the refreshed station_day) and upsert them into the
+    targets. Returns {target: number of rows rewritten}.
+    """
+    written = {}
+    for spec in ROLLUPS:
+        if targets is not None and spec["target"] not in targets:
+            continue
+        source, target = source_name(spec), output_name(spec["target"])
+        if not processed_store.dataset_exists(source):
+            continue
+        partitions, rows = [], 0
+        for city, city_days in days.groupby("City"):
+            redo, needed = _days_to_redo(city_days["day"], spec)
+            src = load(source, cities=[city], start=needed.min(), end=needed.max() + ONE_DAY,
+                       columns=_read_columns(spec))
+            if src.empty:
+                continue
+            date_col = processed_store.find_date_col(src)
+            src = src[src[date_col].dt.normalize().isin(needed)]
+            rolled = rollup(src, spec["keys"], spec["freq"], spec["min_count"])
+            rolled = rolled[rolled[date_col].dt.normalize().isin(redo)]
+            key_cols = spec["keys"] + [processed_store.find_date_col(rolled)]
+            partitions += processed_store.upsert_dataset(rolled, target, key_cols)
+            rows += len(rolled)
+        if partitions:
+            refresh_cube(target, sorted(set(partitions)))
+        written[target] = rows
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Derive station_day, city_hour and city_day from station data.")
+    parser.add_argument("targets", nargs="*", help=f"rollups to run: {', '.join(TARGETS)} (default: all)")
+    parser.add_argument("--start", help="only re-aggregate days from this date on (incremental)")
+    parser.add_argument("--end", help="only re-aggregate days before this date (incremental)")
+    args = parser.parse_args(argv)
+    unknown = sorted(set(args.targets) - set(TARGETS))
+    if unknown:
+        parser.error(f"unknown rollup(s): {', '.join(unknown)}")
+    targets = args.targets or TARGETS
+
+    if args.start or args.end:
+        rows = load("station_hour", start=args.start, end=args.end, columns=["City"] + config.DATE_COLUMNS)
+        days = touched_days(rows)
+        print(f"Re-aggregating {len(days)} city-days...")
+        for target, count in refresh(days, targets).items():
+            print(f"Updated {target}: {count} rows")
+        return
+
+    for spec in ROLLUPS:
+        if spec["target"] not in targets:
+            continue
+        if not processed_store.dataset_exists(source_name(spec)):
+            print(f"Skipping {spec['target']}: {source_name(spec)} is not in the store")
+            continue
+        print(f"Rolling up {source_name(spec)} -> {output_name(spec['target'])}...")
+        print("Saved:", build(spec))
+
+if __name__ == "__main__":
+    start_run()
+    main()
@@ -1,25 +1,47 @@
+# I use this script to run the whole analysis in one go.
+# The stages and the files they read and write are declared in pipeline.py.
+# Stages whose inputs have not changed since their last successful run are
+# skipped, and independent stages run in parallel on a process pool.
+
+import argparse
 import os
-import subprocess
-
-scripts = [
-    "clean_data.py",
-    "analyze_data.py",
-    "analyze_stations.py"
-    "seasonal_trends.py",
-    "city_year_analysis.py",
-    "city_comparison_dashboard.py",
-    "city_pollution_over_years.py"
-    "top_polluted_cities.py",
-    "missing_values_report.py",
-    "generate_report.py"
-]
-
-print("🚀 Running All Scripts...\n")
-
-for script in scripts:
-    print(f"▶ Running {script}...")
-    path = os.path.join(os.getcwd(), script)
-    subprocess.run(["python", path])
-    print(f"✔ Done: {script}\n")
-
-print("\n🎉 ALL SCRIPTS COMPLETED SUCCESSFULLY! 🎉")
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from scripts.instrument import start_run
+from scripts.pipeline import STAGES, run_pipeline
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the air quality pipeline.")
+    parser.add_argument("stages", nargs="*", metavar="STAGE",
+                        help="only run these stages (and what they depend on): "
+                             + ", ".join(s["name"] for s in STAGES))
+    parser.add_argument("-j", "--jobs", type=int, default=config.PIPELINE_JOBS,
+                        help="number of worker processes (default: %(default)s)")
+    parser.add_argument("--in-process", action="store_true",
+                        help="run stages one by one in this process, sharing one dataset cache")
+    parser.add_argument("--force", action="store_true", help="re-run stages even if their inputs are unchanged")
+    parser.add_argument("--dry-run", action="store_true", help="only show which stages would run")
+    args = parser.parse_args(argv)
+
+    print("🚀 Running pipeline...\n")
+    results = run_pipeline(jobs=0 if args.in_process else args.jobs, force=args.force,
+                           only=args.stages or None, dry_run=args.dry_run)
+
+    print("\nStage               Status      Seconds")
+    for name, status, seconds in results:
+        print(f"{name:<19} {status:<11} {seconds:7.1f}")
+
+    failed = [name for name, status, _ in results if status in ("failed", "blocked")]
+    if failed:
+        print(f"\n⚠ {len(failed)} stage(s) did not complete: {', '.join(failed)}")
+        return 1
+
+    print("\n🎉 PIPELINE COMPLETED SUCCESSFULLY! 🎉")
+    return 0
+
+if __name__ == "__main__":
+    start_run()
+    sys.exit(main())
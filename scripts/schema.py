@@ -0,0 +1,210 @@
+# I wrote this module so every frame in the project uses the same compact
+# dtypes: category for the repeated text keys, float32 for concentrations,
+# datetime64 for dates and the smallest integer type for calendar fields.
+# The cleaner, the processed store and the loaders all call apply_schema(), so
+# a frame looks the same whether it came from a raw CSV, a chunk or the store.
+#
+# The date column is resolved once from config.DATE_COLUMNS (find_date_col).
+# Its format is sniffed from a sample, pinned for the column, and every
+# distinct string is parsed once with that explicit format. Whole raw files
+# are read with pyarrow's CSV reader, which parses the timestamps natively.
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+import config
+
+# Pollutant concentrations and AQI (float32 keeps ~7 significant digits,
+# far more than the instruments report)
+FLOAT_COLUMNS = config.POLLUTANTS + ["AQI"]
+
+# Repeated text keys
+CATEGORICAL_COLUMNS = ["City", "Station", "StationId", "StationName", "State", "Status", "AQI_Bucket", "season"]
+
+# dtype= argument for pd.read_csv: text keys are read straight into categories
+# (AQI_Bucket gets its fixed categories afterwards). Missing columns are ignored.
+CSV_DTYPES = {col: "category" for col in CATEGORICAL_COLUMNS if col != "AQI_Bucket"}
+
+# Calendar fields: numpy ints, or the nullable version when values are missing
+INTEGER_COLUMNS = {"year": "int16", "month": "int8", "day": "int8", "hour": "int8"}
+
+# AQI buckets in severity order, from config.AQI_CATEGORIES
+AQI_BUCKETS = sorted(config.AQI_CATEGORIES, key=lambda name: config.AQI_CATEGORIES[name]["range"][0])
+
+# Formats tried, in order, when sniffing a date column
+DATE_FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M",
+                "%d-%m-%Y %H:%M", "%d-%m-%Y", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y"]
+ISO_FORMATS = {"%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M"}
+# Distinct values checked when sniffing
+SNIFF_VALUES = 1000
+# Format that parsed the last sample of each date column
+_pinned_formats = {}
+
+# Cube statistics (see aggregate_cube.py): counts fit in int32 and min/max come
+# from float32 values; sums and sums of squares stay float64 for precision
+CUBE_STAT_DTYPES = {"count": "int32", "min": "float32", "max": "float32"}
+
+
+def find_date_col(df):
+    """Return the first configured date column in a frame (or list of column names), if any."""
+    columns = df.columns if hasattr(df, "columns") else df
+    for col in config.DATE_COLUMNS:
+        if col in columns:
+            return col
+    return None
+
+
+def _parses(sample, fmt):
+    return pd.to_datetime(sample, format=fmt, errors="coerce").notna().all()
+
+
+def sniff_date_format(values, col=None):
+    """
+    Explicit format that parses a sample of distinct `values`, or None if
+    no format in DATE_FORMATS fits. The format found for `col` is pinned and
+    tried first next time.
+    """
+    head = pd.Series(values)[:SNIFF_VALUES * 10].dropna()
+    sample = pd.Series(pd.unique(head.astype(str)))[:SNIFF_VALUES]
+    if sample.empty:
+        return _pinned_formats.get(col)
+    pinned = _pinned_formats.get(col)
+    for fmt in ([pinned] if pinned else []) + DATE_FORMATS:
+        if _parses(sample, fmt):
+            _pinned_formats[col] = fmt
+            return fmt
+    return None
+
+
+def parse_dates(values, col=None):
+    """
+    Parse a date column: each distinct value is parsed once with the sniffed
+    format (mixed-format inference only if no format fits). Returns the
+    datetime64[ns] series and the number of non-empty values that did not parse.
+    """
+    values = pd.Series(values)
+    if values.dtype.kind == "M":
+        return values.astype("datetime64[ns]"), 0
+    codes, uniques = pd.factorize(values)
+    if not len(uniques):
+        return pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]"), 0
+    fmt = sniff_date_format(uniques, col)
+    parsed = pd.to_datetime(uniques.astype(str), format=fmt or "mixed", errors="coerce")
+    parsed = np.append(parsed.to_numpy().astype("datetime64[ns]"), np.datetime64("NaT", "ns"))
+    # factorize marks missing values with -1, which picks the NaT appended above
+    result = pd.Series(parsed[codes], index=values.index)
+    failures = int(np.isnat(parsed[codes[codes >= 0]]).sum())
+    return result, failures
+
+
+def _arrow_parser(fmt):
+    """pyarrow's built-in ISO 8601 parser for ISO formats (much faster than strptime), else the format."""
+    return pacsv.ISO8601 if fmt in ISO_FORMATS else fmt
+
+
+def read_csv(path):
+    """
+    Read a whole raw CSV with pyarrow's CSV reader: the date column is parsed
+    natively with its sniffed format and text keys are dictionary-encoded
+    straight into categories. If some dates do not match the format, the
+    column is read as text and parsed (and counted) later by parse_dates().
+    """
+    columns = list(pd.read_csv(path, nrows=0).columns)
+    date_col = find_date_col(columns)
+    types = {c: pa.dictionary(pa.int32(), pa.string()) for c in CSV_DTYPES if c in columns}
+    if date_col is not None:
+        fmt = sniff_date_format(pd.read_csv(path, usecols=[date_col], nrows=SNIFF_VALUES * 10)[date_col], date_col)
+        if fmt is not None:
+            try:
+                table = pacsv.read_csv(path, convert_options=pacsv.ConvertOptions(
+                    column_types={**types, date_col: pa.timestamp("ns")}, timestamp_parsers=[_arrow_parser(fmt)],
+                    strings_can_be_null=True))
+                return _sorted_categories(table.to_pandas())
+            except pa.ArrowInvalid:
+                pass
+        types[date_col] = pa.string()
+    table = pacsv.read_csv(path, convert_options=pacsv.ConvertOptions(column_types=types, strings_can_be_null=True))
+    return _sorted_categories(table.to_pandas())
+
+
+def _sorted_categories(df):
+    """Sort dictionary-encoded categories like pd.read_csv does (pyarrow keeps them in order of appearance)."""
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].cat.reorder_categories(sorted(df[col].cat.categories))
+    return df
+
+
+def column_dtype(col):
+    """Schema dtype for a column name, or None if the schema does not cover it."""
+    if col in FLOAT_COLUMNS:
+        return "float32"
+    if col in CATEGORICAL_COLUMNS:
+        return "category"
+    if col in INTEGER_COLUMNS:
+        return INTEGER_COLUMNS[col]
+    if col in config.DATE_COLUMNS:
+        return "datetime64[ns]"
+    if "__" in col:
+        return CUBE_STAT_DTYPES.get(col.rsplit("__", 1)[1])
+    return None
+
+
+def _bucket_categorical(values):
+    """AQI_Bucket with the configured buckets as fixed categories (so chunks concatenate)."""
+    extra = sorted(set(values.dropna().astype(str).unique()) - set(AQI_BUCKETS))
+    return pd.Categorical(values.astype("object").where(values.notna()), categories=AQI_BUCKETS + extra)
+
+
+def apply_schema(df):
+    """Cast the columns of `df` to their schema dtypes (in place) and return it."""
+    for col in df.columns:
+        dtype = column_dtype(col)
+        if dtype is None:
+            continue
+        if col == "AQI_Bucket":
+            current = df[col].dtype
+            if not (isinstance(current, pd.CategoricalDtype) and list(current.categories[:len(AQI_BUCKETS)]) == AQI_BUCKETS):
+                df[col] = _bucket_categorical(df[col])
+        elif df[col].dtype == dtype:
+            continue
+        elif dtype == "category":
+            df[col] = df[col].astype("category")
+        elif dtype == "datetime64[ns]":
+            df[col] = parse_dates(df[col], col)[0]
+        elif dtype.startswith("int"):
+            values = pd.to_numeric(df[col], errors="coerce")
+            df[col] = values.astype(dtype.capitalize() if values.isna().any() else dtype)
+        else:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
+    return df
+
+
+def _baseline_bytes(series):
+    """Bytes the column would take as object strings / float64 / int64."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return int(series.astype("object").memory_usage(deep=True, index=False))
+    if series.dtype.kind in "fiu" or isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+        return len(series) * 8
+    return int(series.memory_usage(deep=True, index=False))
+
+
+def memory_report(df):
+    """
+    Per-column dtype and memory use of a frame, next to what the same column
+    costs with pandas' default dtypes (object strings, float64, int64).
+    """
+    rows = []
+    for col in df.columns:
+        rows.append({
+            "column": col,
+            "dtype": str(df[col].dtype),
+            "bytes": int(df[col].memory_usage(deep=True, index=False)),
+            "default_bytes": _baseline_bytes(df[col]),
+        })
+    report = pd.DataFrame(rows)
+    report["saving"] = np.where(report["default_bytes"] > 0,
+                                1 - report["bytes"] / report["default_bytes"].clip(lower=1), 0.0)
+    return report
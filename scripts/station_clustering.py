@@ -0,0 +1,210 @@
+# scripts/station_clustering.py
+# I wrote this script to cluster monitoring stations by the shape of their
+# pollution, not just its level. Every station gets a feature vector of
+# log mean concentrations, a 12-month seasonal profile (from the station_day
+# cube) and a 24-hour diurnal profile (streamed from station_hour). The vectors
+# are imputed, scaled, reduced with PCA and clustered with MiniBatchKMeans;
+# K is picked by a silhouette sweep over a sample, run on a process pool.
+# The fitted pipeline is saved so new stations can be assigned without refitting.
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import config
+from scripts import processed_store
+from scripts.aggregate_cube import load_cube, summarize, value_columns
+from scripts.calendar_features import calendar_features
+from scripts.instrument import start_run
+from scripts.render import plot_job, render_jobs
+
+OUTPUT = os.path.join(config.OUTPUT_DIR, "")
+VISUALS = os.path.join(config.VISUALS_DIR, "")
+os.makedirs(OUTPUT, exist_ok=True)
+os.makedirs(VISUALS, exist_ok=True)
+
+LEVEL_POLLUTANTS = ["PM2.5", "PM10", "NO2", "SO2", "O3", "CO"]
+SEASONAL_POLLUTANTS = ["PM2.5", "PM10", "NO2", "O3"]
+DIURNAL_POLLUTANTS = ["PM2.5", "NO2", "O3"]
+KEYS = ["City", "Station"]
+
+
+def seasonal_features(cube):
+    """Log mean level and 12-month profile (monthly mean / annual mean) per station."""
+    cols = [c for c in LEVEL_POLLUTANTS if c in value_columns(cube)]
+    levels = summarize(cube, KEYS, cols)
+    features = np.log1p(levels.clip(lower=0)).add_prefix("log_mean_")
+
+    monthly = summarize(cube, KEYS + ["month"], [c for c in SEASONAL_POLLUTANTS if c in cols])
+    profiles = []
+    for col in monthly.columns:
+        shape = monthly[col].unstack("month").reindex(columns=range(1, 13))
+        shape = shape.div(levels[col].reindex(shape.index), axis=0)
+        shape.columns = [f"{col}_month_{m:02d}" for m in shape.columns]
+        profiles.append(shape)
+    return features.join(profiles)
+
+
+def diurnal_features(name="station_hour"):
+    """24-hour profile (hourly mean / daily mean) per station, streamed batch by batch."""
+    if not processed_store.dataset_exists(name):
+        return None
+    available = processed_store.read_metadata(name)["columns"]
+    cols = [c for c in DIURNAL_POLLUTANTS if c in available]
+    date_col = processed_store.read_metadata(name)["date_col"]
+    if not cols or date_col is None or "Station" not in available:
+        return None
+
+    sums, counts = None, None
+    for batch in processed_store.iter_batches(name, KEYS + [date_col] + cols):
+        batch["hour"] = calendar_features(batch[date_col], ["hour"])["hour"]
+        grouped = batch.groupby(KEYS + ["hour"], observed=True)[cols]
+        s, n = grouped.sum(), grouped.count()
+        sums = s if sums is None else sums.add(s, fill_value=0)
+        counts = n if counts is None else counts.add(n, fill_value=0)
+    if sums is None:
+        return None
+
+    hourly = sums / counts.where(counts > 0)
+    daily = hourly.groupby(level=KEYS, observed=True).mean()
+    profiles = []
+    for col in cols:
+        shape = hourly[col].unstack("hour").reindex(columns=range(24))
+        shape = shape.div(daily[col].reindex(shape.index), axis=0)
+        shape.columns = [f"{col}_hour_{h:02d}" for h in shape.columns]
+        profiles.append(shape)
+    return pd.concat(profiles, axis=1)
+
+
+def station_features(cube_name="station_day", hourly_name="station_hour"):
+    """One feature row per (City, Station)."""
+    features = seasonal_features(load_cube(cube_name))
+    diurnal = diurnal_features(hourly_name)
+    if diurnal is not None:
+        features = features.join(diurnal, how="left")
+    # Drop features no station has
+    return features.dropna(axis=1, how="all")
+
+
+def _fit_k(args):
+    """Fit MiniBatchKMeans for one K on the sample; returns (k, silhouette, inertia)."""
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.metrics import silhouette_score
+    X, k, seed = args
+    model = MiniBatchKMeans(n_clusters=k, random_state=seed, n_init=3,
+                            batch_size=min(len(X), config.CLUSTER_BATCH_SIZE))
+    labels = model.fit_predict(X)
+    if len(set(labels)) < 2:
+        return k, np.nan, model.inertia_
+    return k, silhouette_score(X, labels), model.inertia_
+
+
+def choose_k(X, k_range=None, sample_size=None, workers=None, seed=42):
+    """
+    Silhouette sweep over K on a random sample of the rows, one K per worker.
+    Returns (best K, sweep frame with k, silhouette and inertia).
+    """
+    k_min, k_max = k_range or config.CLUSTER_K_RANGE
+    sample_size = sample_size or config.CLUSTER_SAMPLE_SIZE
+    workers = workers or config.CLUSTER_WORKERS
+    rng = np.random.default_rng(seed)
+    sample = X[rng.choice(len(X), sample_size, replace=False)] if len(X) > sample_size else X
+
+    ks = list(range(k_min, min(k_max, len(sample) - 1) + 1))
+    if not ks:
+        raise ValueError(f"Need at least {k_min + 1} rows to choose K, got {len(sample)}")
+    jobs = [(sample, k, seed) for k in ks]
+    if workers > 1 and len(ks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(ks))) as pool:
+            results = list(pool.map(_fit_k, jobs))
+    else:
+        results = [_fit_k(job) for job in jobs]
+
+    sweep = pd.DataFrame(results, columns=["k", "silhouette", "inertia"])
+    best = sweep.dropna(subset=["silhouette"])
+    k = int(best.loc[best["silhouette"].idxmax(), "k"]) if len(best) else ks[0]
+    return k, sweep
+
+
+def fit(features, k=None, seed=42):
+    """Fit imputer, scaler, PCA and MiniBatchKMeans; returns the model dict."""
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.decomposition import PCA
+    from sklearn.impute import SimpleImputer
+    from sklearn.preprocessing import StandardScaler
+    imputer = SimpleImputer(strategy="median")
+    scaler = StandardScaler()
+    X = scaler.fit_transform(imputer.fit_transform(features))
+    pca = PCA(n_components=config.CLUSTER_PCA_VARIANCE, svd_solver="full", random_state=seed)
+    Z = pca.fit_transform(X)
+
+    sweep = None
+    if k is None:
+        k, sweep = choose_k(Z, seed=seed)
+    kmeans = MiniBatchKMeans(n_clusters=k, random_state=seed, n_init=10,
+                             batch_size=min(len(Z), config.CLUSTER_BATCH_SIZE)).fit(Z)
+    return {"features": list(features.columns), "imputer": imputer, "scaler": scaler, "pca": pca,
+            "kmeans": kmeans, "k": k, "sweep": sweep}
+
+
+def save_model(model, path=None):
+    path = path or config.CLUSTER_MODEL_FILE
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    import joblib
+    joblib.dump(model, path)
+    return path
+
+
+def load_model(path=None):
+    import joblib
+    return joblib.load(path or config.CLUSTER_MODEL_FILE)
+
+
+def transform(model, features):
+    """Project feature rows into the fitted PCA space (missing features become NaN and are imputed)."""
+    X = features.reindex(columns=model["features"])
+    return model["pca"].transform(model["scaler"].transform(model["imputer"].transform(X)))
+
+
+def assign(features, model=None):
+    """Cluster labels for (new) stations using a saved model, without refitting."""
+    model = model or load_model()
+    return pd.Series(model["kmeans"].predict(transform(model, features)), index=features.index, name="cluster")
+
+
+def main():
+    print("Building station features from station_day (cube) and station_hour...")
+    features = station_features()
+    print(f"Stations: {len(features)}, features: {features.shape[1]}")
+    if len(features) < 3:
+        print("Not enough stations to cluster.")
+        return
+
+    model = fit(features)
+    print("Clustering with K =", model["k"])
+    path = save_model(model)
+    print("Saved model:", path)
+    if model["sweep"] is not None:
+        model["sweep"].to_csv(OUTPUT + "station_cluster_k_sweep.csv", index=False)
+        print("Saved K sweep:", OUTPUT + "station_cluster_k_sweep.csv")
+
+    labels = assign(features, model)
+    result = features.join(labels)
+    result.to_csv(OUTPUT + "station_clusters.csv")
+    print("Saved cluster assignment:", OUTPUT + "station_clusters.csv")
+
+    # 2-D view: first two principal components coloured by cluster
+    coords = transform(model, features)
+    points = pd.DataFrame({"PC1": coords[:, 0], "PC2": coords[:, 1] if coords.shape[1] > 1 else 0.0,
+                           "cluster": labels.to_numpy()})
+    render_jobs([plot_job("scatter", points, VISUALS + "station_clusters.png",
+                          title=f"Station clusters (K={model['k']}, seasonal and diurnal profiles)",
+                          figsize=(10, 7), dpi=200, palette="tab10", s=60)])
+
+if __name__ == "__main__":
+    start_run()
+    main()
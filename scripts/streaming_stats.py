@@ -0,0 +1,254 @@
+# I wrote these helpers for processing files in chunks without holding the
+# whole file in memory: a set of row-key hashes for de-duplication, a
+# mergeable quantile sketch so medians can be computed in one pass (and a
+# grouped variant for per-group quantiles), and a mergeable co-moment
+# accumulator for correlation matrices.
+
+import numpy as np
+import pandas as pd
+
+
+class KeySet:
+    """
+    Remember which row keys have been seen, stored as a sorted array of 64-bit
+    hashes (8 bytes per unique key instead of full rows or Python objects).
+    """
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.uint64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def first_seen(self, frame):
+        """
+        Hash the rows of `frame` and return a boolean mask marking rows whose
+        key has not been seen before (in earlier chunks or earlier in this one).
+        The new keys are added to the set.
+        """
+        hashes = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+        return self.first_seen_hashes(hashes)
+
+    def first_seen_hashes(self, hashes):
+        uniq, first_idx = np.unique(hashes, return_index=True)
+        pos = np.searchsorted(self.keys, uniq)
+        known = np.zeros(len(uniq), dtype=bool)
+        inside = pos < len(self.keys)
+        known[inside] = self.keys[pos[inside]] == uniq[inside]
+
+        mask = np.zeros(len(hashes), dtype=bool)
+        mask[first_idx[~known]] = True
+
+        new_keys = uniq[~known]
+        if len(new_keys):
+            merged = np.concatenate([self.keys, new_keys])
+            merged.sort(kind="mergesort")
+            self.keys = merged
+        return mask
+
+
+class QuantileSketch:
+    """
+    Streaming quantile sketch with logarithmic buckets (in the style of DDSketch).
+    Every quantile is within `relative_accuracy` of a true value, memory is a
+    few thousand counters regardless of how many values are added, and two
+    sketches can be merged by adding their counters.
+    """
+
+    def __init__(self, relative_accuracy=0.005, min_value=1e-6, max_value=1e7):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = np.log(self.gamma)
+        self.offset = int(np.floor(np.log(min_value) / self.log_gamma))
+        size = int(np.ceil(np.log(max_value) / self.log_gamma)) - self.offset + 1
+        self.positive = np.zeros(size, dtype=np.int64)
+        self.negative = np.zeros(size, dtype=np.int64)
+        self.zeros = 0
+
+    @property
+    def count(self):
+        return int(self.positive.sum() + self.negative.sum() + self.zeros)
+
+    def _bucket(self, values):
+        idx = np.ceil(np.log(values) / self.log_gamma).astype(np.int64) - self.offset
+        return np.clip(idx, 0, len(self.positive) - 1)
+
+    def add(self, values):
+        """Add an array of values; NaNs are ignored."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        pos = values[values > 0]
+        neg = -values[values < 0]
+        self.zeros += int((values == 0).sum())
+        if len(pos):
+            self.positive += np.bincount(self._bucket(pos), minlength=len(self.positive))
+        if len(neg):
+            self.negative += np.bincount(self._bucket(neg), minlength=len(self.negative))
+
+    def merge(self, other):
+        """Fold another sketch with the same parameters into this one."""
+        self.positive += other.positive
+        self.negative += other.negative
+        self.zeros += other.zeros
+        return self
+
+    def _value(self, bucket):
+        return 2 * self.gamma ** (bucket + self.offset) / (self.gamma + 1)
+
+    def quantile(self, q):
+        """Approximate q-quantile, or NaN if the sketch is empty."""
+        total = self.count
+        if total == 0:
+            return np.nan
+        rank = q * (total - 1)
+
+        # Walk buckets from the most negative value upwards
+        neg_cum = np.cumsum(self.negative[::-1])
+        if rank < neg_cum[-1]:
+            i = int(np.searchsorted(neg_cum, rank, side="right"))
+            return -self._value(len(self.negative) - 1 - i)
+        rank -= neg_cum[-1]
+        if rank < self.zeros:
+            return 0.0
+        rank -= self.zeros
+        pos_cum = np.cumsum(self.positive)
+        i = int(np.searchsorted(pos_cum, rank, side="right"))
+        return self._value(min(i, len(self.positive) - 1))
+
+    def median(self):
+        return self.quantile(0.5)
+
+
+class GroupedQuantileSketch:
+    """
+    Logarithmic-bucket quantile sketches for many groups at once, one row of
+    counters per group (e.g. per Station and month). Values are added with
+    their group keys in one bincount per chunk, so memory depends on the number
+    of groups and buckets, not on the number of rows. Meant for non-negative
+    concentrations: values at or below `min_value` are counted as zero.
+    """
+
+    def __init__(self, names=None, relative_accuracy=0.05, min_value=1e-3, max_value=1e5):
+        self.names = names
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = np.log(self.gamma)
+        self.offset = int(np.floor(np.log(min_value) / self.log_gamma))
+        # Bucket 0 holds zeros, bucket i > 0 the values around gamma ** (i - 1 + offset)
+        self.size = int(np.ceil(np.log(max_value) / self.log_gamma)) - self.offset + 2
+        self.min_value = min_value
+        self.groups = {}
+        self.counts = np.zeros((0, self.size), dtype=np.int32)
+
+    def _rows(self, keys):
+        """Counter row of every key tuple, adding rows for new groups."""
+        codes, uniques = pd.MultiIndex.from_frame(keys).factorize()
+        rows = np.array([self.groups.setdefault(u, len(self.groups)) for u in uniques], dtype=np.int64)
+        if len(self.groups) > len(self.counts):
+            grown = np.zeros((len(self.groups), self.size), dtype=np.int32)
+            grown[:len(self.counts)] = self.counts
+            self.counts = grown
+        return rows[codes]
+
+    def add(self, keys, values):
+        """Add `values` (array) for the groups in `keys` (frame of key columns); NaNs are ignored."""
+        values = np.asarray(values, dtype=np.float64)
+        valid = ~np.isnan(values)
+        if not valid.any():
+            return
+        rows = self._rows(keys[valid])
+        values = values[valid]
+        buckets = np.zeros(len(values), dtype=np.int64)
+        pos = values > self.min_value
+        buckets[pos] = np.clip(np.ceil(np.log(values[pos]) / self.log_gamma).astype(np.int64) - self.offset + 1,
+                               1, self.size - 1)
+        flat = np.bincount(rows * self.size + buckets, minlength=self.counts.size)
+        self.counts += flat.reshape(self.counts.shape).astype(np.int32)
+
+    def merge(self, other):
+        """Fold another sketch with the same parameters into this one."""
+        for key, row in other.groups.items():
+            self.groups.setdefault(key, len(self.groups))
+        merged = np.zeros((len(self.groups), self.size), dtype=np.int32)
+        merged[:len(self.counts)] = self.counts
+        rows = np.array([self.groups[key] for key in other.groups], dtype=np.int64)
+        merged[rows] += other.counts[list(other.groups.values())]
+        self.counts = merged
+        return self
+
+    def quantiles(self, qs):
+        """
+        Frame of approximate quantiles, one row per group (MultiIndex of the
+        key tuples, levels named `names`) and one column per q, plus the count `n`.
+        """
+        index = pd.MultiIndex.from_tuples(list(self.groups), names=self.names)
+        totals = self.counts.sum(axis=1)
+        cum = np.cumsum(self.counts, axis=1)
+        values = np.r_[0.0, 2 * self.gamma ** (np.arange(1, self.size) - 1 + self.offset) / (self.gamma + 1)]
+        result = pd.DataFrame(index=index)
+        for q in qs:
+            rank = q * (totals - 1)
+            bucket = (cum > rank[:, None]).argmax(axis=1)
+            result[q] = np.where(totals > 0, values[bucket], np.nan)
+        result["n"] = totals
+        return result
+
+
+class CorrelationAccumulator:
+    """
+    Pairwise-complete Pearson correlations built up chunk by chunk.
+    For every pair of columns it keeps the count of rows where both are
+    present, the two means and the centred (co-)moments over those rows.
+    Chunks are combined with the parallel update of Chan et al., so
+    accumulators from different workers can be merged in any order.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        p = len(self.columns)
+        self.n = np.zeros((p, p))
+        self.mean = np.zeros((p, p))    # mean[i, j]: mean of column i where i and j are present
+        self.m2 = np.zeros((p, p))      # m2[i, j]: sum of squared deviations of column i, same rows
+        self.comoment = np.zeros((p, p))
+
+    def add(self, frame):
+        """Add the rows of a frame (or 2-D array) holding `columns`; NaNs are skipped pairwise."""
+        values = np.asarray(frame[self.columns] if hasattr(frame, "columns") else frame, dtype=np.float64)
+        if not len(values):
+            return self
+        valid = ~np.isnan(values)
+        w = valid.astype(np.float64)
+
+        # Centre on the chunk means first to keep the sums well conditioned
+        # (columns that are empty in this chunk get a shift of 0)
+        shift = np.nanmean(np.where(valid.any(axis=0), values, 0.0), axis=0)
+        x = np.where(valid, values - shift, 0.0)
+
+        n = w.T @ w
+        sums = x.T @ w                  # sums[i, j]: sum of column i where j is present too
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.where(n > 0, sums / n, 0.0)
+            m2 = np.where(n > 0, (x * x).T @ w - sums * mean, 0.0)
+            comoment = np.where(n > 0, x.T @ x - sums * sums.T / n, 0.0)
+
+        other = CorrelationAccumulator(self.columns)
+        other.n, other.mean, other.m2, other.comoment = n, mean + shift[:, None], m2, comoment
+        return self.merge(other)
+
+    def merge(self, other):
+        """Fold another accumulator over the same columns into this one."""
+        n = self.n + other.n
+        with np.errstate(divide="ignore", invalid="ignore"):
+            weight = np.where(n > 0, self.n * other.n / n, 0.0)
+            delta = other.mean - self.mean
+            self.mean = np.where(n > 0, self.mean + delta * other.n / n, 0.0)
+        self.m2 = self.m2 + other.m2 + delta ** 2 * weight
+        self.comoment = self.comoment + other.comoment + delta * delta.T * weight
+        self.n = n
+        return self
+
+    def corr(self, min_periods=2):
+        """Pearson correlation matrix as a DataFrame (NaN where too few pairs)."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = self.comoment / np.sqrt(self.m2 * self.m2.T)
+        r = np.where(self.n >= min_periods, np.clip(r, -1, 1), np.nan)
+        np.fill_diagonal(r, np.where(np.diag(self.n) >= min_periods, 1.0, np.nan))
+        return pd.DataFrame(r, index=self.columns, columns=self.columns)
@@ -0,0 +1,113 @@
+# scripts/synthetic_data.py
+# I wrote this script to generate station_hour.csv files of any size for the
+# benchmarks (see benchmark.py), since the sample in data/raw is far smaller
+# than the real network. Rows follow the raw schema: City, Datetime, Station,
+# the 12 pollutants, AQI and AQI_Bucket.
+#
+# Every series is a city baseline times a yearly cycle (winter peak), a daily
+# cycle (night and rush-hour peaks) and log-normal noise, with missing readings
+# and occasional sensor spikes so the cleaning steps have work to do. The
+# output only depends on the seed. Stations are written in batches, so the
+# generator's memory does not grow with the number of rows.
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import config
+from scripts.aqi import aqi_bucket, sub_index
+
+CITIES = ["Delhi", "Mumbai", "Kolkata", "Chennai", "Bengaluru", "Hyderabad", "Ahmedabad", "Lucknow",
+          "Patna", "Jaipur", "Gurugram", "Amritsar", "Visakhapatnam", "Thiruvananthapuram", "Guwahati",
+          "Bhopal", "Chandigarh", "Coimbatore", "Ernakulam", "Jorapokhar", "Kochi", "Shillong",
+          "Talcher", "Amaravati", "Brajrajnagar", "Aizawl"]
+# Typical hourly concentration of each pollutant (µg/m³, CO in mg/m³)
+BASE_LEVELS = {"PM2.5": 60.0, "PM10": 110.0, "NO": 15.0, "NO2": 28.0, "NOx": 32.0, "NH3": 22.0, "CO": 1.2,
+               "SO2": 13.0, "O3": 33.0, "Benzene": 3.0, "Toluene": 8.0, "Xylene": 3.0}
+MISSING_SHARE = 0.08
+SPIKE_SHARE = 0.0005
+STATIONS_PER_BATCH = 20
+
+# stations, days
+SCALES = {
+    "tiny": (10, 30),
+    "small": (30, 180),
+    "medium": (100, 365),
+    "large": (250, 1461),
+    "xlarge": (500, 3653),
+}
+
+
+def station_names(n_stations, n_cities=None):
+    """(City, Station) of n stations spread round-robin over the cities."""
+    # About four stations per city, as in the real network
+    cities = CITIES[:n_cities or min(len(CITIES), n_stations, max(5, n_stations // 4))]
+    counts = {}
+    stations = []
+    for i in range(n_stations):
+        city = cities[i % len(cities)]
+        counts[city] = counts.get(city, 0) + 1
+        stations.append((city, f"{city[:3].upper()}{counts[city]:03d}"))
+    return stations
+
+
+def station_frame(rng, city, station, hours, city_level):
+    """All hourly rows of one station."""
+    n = len(hours)
+    day_of_year = hours.dayofyear.to_numpy()
+    hour = hours.hour.to_numpy()
+    yearly = 1 + 0.45 * np.cos(2 * np.pi * (day_of_year - 15) / 365.25)
+    daily = 1 + 0.25 * np.cos(2 * np.pi * (hour - 22) / 24) + 0.15 * np.exp(-((hour - 9) ** 2) / 4)
+    frame = {"City": np.full(n, city), "Datetime": hours, "Station": np.full(n, station)}
+    for pollutant, base in BASE_LEVELS.items():
+        cycle = yearly * daily if pollutant != "O3" else (2 - yearly) * (2 - daily)
+        values = base * city_level * rng.uniform(0.7, 1.3) * cycle * rng.lognormal(0, 0.35, n)
+        values[rng.random(n) < SPIKE_SHARE] *= rng.uniform(8, 20)
+        values[rng.random(n) < MISSING_SHARE] = np.nan
+        frame[pollutant] = np.round(values, 2)
+    df = pd.DataFrame(frame)
+    # Raw AQI is the PM2.5 sub-index of the hourly value, as rough as the real raw column
+    df["AQI"] = np.round(sub_index("PM2.5", df["PM2.5"].to_numpy()), 1)
+    df["AQI_Bucket"] = aqi_bucket(df["AQI"].to_numpy())
+    return df
+
+
+def generate(path, n_stations, days, start="2015-01-01", seed=0, n_cities=None):
+    """Write a synthetic station_hour CSV. Returns the number of rows."""
+    rng = np.random.default_rng(seed)
+    hours = pd.date_range(start, periods=days * 24, freq="h")
+    stations = station_names(n_stations, n_cities)
+    city_levels = {city: rng.uniform(0.4, 2.0) for city in dict.fromkeys(c for c, _ in stations)}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    rows = 0
+    for i in range(0, len(stations), STATIONS_PER_BATCH):
+        batch = [station_frame(rng, city, station, hours, city_levels[city])
+                 for city, station in stations[i:i + STATIONS_PER_BATCH]]
+        df = pd.concat(batch, ignore_index=True)
+        df.to_csv(path, index=False, mode="w" if i == 0 else "a", header=i == 0,
+                  date_format="%Y-%m-%d %H:%M:%S")
+        rows += len(df)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic station_hour.csv.")
+    parser.add_argument("--scale", choices=SCALES, default="small",
+                        help="preset number of stations and days (default: %(default)s)")
+    parser.add_argument("--stations", type=int, help="number of stations (overrides --scale)")
+    parser.add_argument("--days", type=int, help="number of days (overrides --scale)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: %(default)s)")
+    parser.add_argument("--out", default=os.path.join(config.RAW_DATA_DIR, "station_hour.csv"),
+                        help="output CSV (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    n_stations, days = SCALES[args.scale]
+    rows = generate(args.out, args.stations or n_stations, args.days or days, seed=args.seed)
+    print(f"Saved {rows} rows: {args.out}")
+
+if __name__ == "__main__":
+    main()
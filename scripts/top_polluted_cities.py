@@ -1,38 +1,51 @@
-import pandas as pd
-import matplotlib.pyplot as plt
+# Cities are ranked by the mean number of days per year above a NAAQS limit
+# (see exceedance.py), or with --by aqi by their average AQI.
+import argparse
 import os
+import sys
 
-PROCESSED_PATH = "../data/processed/"
-OUTPUT_PATH = "../output/"
-VISUALS_PATH = "../visuals/"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from scripts.aggregate_cube import load_cube, summarize, value_columns
+from scripts.exceedance import rank_cities
+from scripts.instrument import start_run
+from scripts.render import plot_job, render_jobs
+
+OUTPUT_PATH = os.path.join(config.OUTPUT_DIR, "")
+VISUALS_PATH = os.path.join(config.VISUALS_DIR, "")
 
 # Ensure folders exist
 os.makedirs(OUTPUT_PATH, exist_ok=True)
 os.makedirs(VISUALS_PATH, exist_ok=True)
 
-def top_polluted_cities_report():
-    file_path = PROCESSED_PATH + "city_day_cleaned.csv"
-    print(f"📌 Loading {file_path}")
-
-    df = pd.read_csv(file_path)
-
-    # Ensure AQI column exists
-    if "AQI" not in df.columns:
-        print("❌ AQI column not found in city_day_cleaned.csv")
-        return
+def aqi_ranking():
+    """Average AQI per city from the city_day cube, or None without an AQI column."""
+    cube = load_cube("city_day")
+    if "AQI" not in value_columns(cube):
+        return None
+    # Missing AQI values are not counted
+    return summarize(cube, "City", ["AQI"])["AQI"].dropna().sort_values(ascending=False)
 
-    # Drop rows missing AQI
-    df = df.dropna(subset=["AQI"])
-
-    # Convert AQI to numeric (clean bad data)
-    df["AQI"] = pd.to_numeric(df["AQI"], errors="coerce")
-    df = df.dropna(subset=["AQI"])
-
-    # Compute average AQI per city
-    top_cities = df.groupby("City")["AQI"].mean().sort_values(ascending=False)
+def top_polluted_cities_report(by="exceedance"):
+    ranking = rank_cities() if by == "exceedance" else None
+    if ranking is not None:
+        print("📌 Ranking cities by NAAQS exceedance days (city_exceedance_days)")
+        title = "Top 10 Most Polluted Cities in India (Days per Year Above a NAAQS Limit)"
+        ylabel = "Exceedance days per year"
+    else:
+        if by == "exceedance":
+            print("⚠️ city_exceedance_days not found (run exceedance.py), ranking by average AQI")
+        print("📌 Loading city_day cube")
+        ranking = aqi_ranking()
+        if ranking is None:
+            print("❌ AQI column not found in city_day")
+            return
+        title = "Top 10 Most Polluted Cities in India (Avg AQI 2015–2024)"
+        ylabel = "Average AQI"
 
     # Get top 10 most polluted
-    top10 = top_cities.head(10)
+    top10 = ranking.head(10)
 
     # Save to CSV
     csv_path = OUTPUT_PATH + "top_polluted_cities.csv"
@@ -40,21 +53,18 @@ def top_polluted_cities_report():
     print(f"✅ Saved CSV report: {csv_path}")
 
     # Plot and save chart
-    plt.figure(figsize=(12, 6))
-    top10.plot(kind="bar", edgecolor="black")
-    plt.title("Top 10 Most Polluted Cities in India (Avg AQI 2015–2024)")
-    plt.xlabel("City")
-    plt.ylabel("Average AQI")
-    plt.tight_layout()
-
     img_path = VISUALS_PATH + "top_polluted_cities.png"
-    plt.savefig(img_path)
+    render_jobs([plot_job("bar", top10, img_path, title=title, xlabel="City", ylabel=ylabel,
+                          figsize=(12, 6), xtick_rotation=90, edgecolor="black")])
     print(f"📊 Saved visual: {img_path}")
 
-    plt.close()
-
-def main():
-    top_polluted_cities_report()
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank the most polluted cities.")
+    parser.add_argument("--by", choices=["exceedance", "aqi"], default="exceedance",
+                        help="days above NAAQS limits per year or average AQI (default: %(default)s)")
+    args = parser.parse_args(argv)
+    top_polluted_cities_report(args.by)
 
 if __name__ == "__main__":
+    start_run()
     main()